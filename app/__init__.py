@@ -1,69 +1,112 @@
 import os
-import time
 from flask import Flask
 from flask_wtf.csrf import CSRFProtect
 from flask_login import LoginManager
-from sqlalchemy import create_engine
 from sqlalchemy.orm import scoped_session, sessionmaker
-from .models import Base, User
+from .cache import load_session_user
+from .compression import CompressionMiddleware
+from . import metrics, sqlinspect, templating
+from .shards import MAIN, ShardMap, shard_urls, bind_user
+from .replicas import ReplicaSet, RoutingSession, replica_urls, init_app as replicas_init_app
+from .pool import PoolStats, create_pool_engine, database_url, pool_stats
 
 csrf = CSRFProtect()
 login_manager = LoginManager()
 login_manager.login_view = "core.login"
 
-def create_app():
+def create_app(check_schema: bool = True):
+    """
+    check_schema=False skips the schema version check, for running
+    `flask --app "app:create_app(check_schema=False)" db upgrade` on an
+    outdated database.
+    """
     app = Flask(__name__, static_folder="static", template_folder="templates")
     app.config["SECRET_KEY"] = os.getenv("FLASK_SECRET_KEY", "dev-secret")
 
-    database_url = os.getenv("DATABASE_URL")
-    if not database_url:
-        # Fallback for local dev
-        database_url = "sqlite:///budget.db"
-
-    # Lazy retry (helps when DB finishes booting a hair after app)
-    engine = None
-    for _ in range(30):
-        try:
-            engine = create_engine(database_url, pool_pre_ping=True, future=True)
-            with engine.connect() as conn:
-                conn.execute("SELECT 1")
-            break
-        except Exception:
-            time.sleep(1)
-    if engine is None:
-        raise RuntimeError("Could not connect to database.")
-
-    session_factory = sessionmaker(bind=engine, autoflush=False, autocommit=False, future=True)
-    db_session = scoped_session(session_factory)
+    url = database_url()
+
+    # Pool sizing/recycling from DB_POOL_* env vars, timed for /stats/pool (see app.pool)
+    engine = create_pool_engine(url, pool_stats)
+
+    # Optional shards for user data; the main database keeps the user directory (see app.shards)
+    engines, shard_stats = {MAIN: engine}, {MAIN: pool_stats}
+    for name, shard_url in shard_urls().items():
+        shard_stats[name] = PoolStats()
+        engines[name] = create_pool_engine(shard_url, shard_stats[name])
+
+    # Schema changes run once via `flask db upgrade` before workers start; workers
+    # only confirm the version (one query per shard) so boot takes milliseconds.
+    if check_schema:
+        from .migrations import require_current_schema
+        for shard_engine in engines.values():
+            require_current_schema(shard_engine)
 
-    # Create tables if needed — serialized across workers with a MySQL advisory lock.
-    # Falls back gracefully on SQLite/other dialects.
-    try:
-        with engine.connect() as conn:
-            try:
-                # Wait up to 30s for the lock; prevents concurrent DDL from multiple workers
-                conn.exec_driver_sql("SELECT GET_LOCK('bt_schema_lock', 30)")
-                Base.metadata.create_all(engine)
-            finally:
-                conn.exec_driver_sql("SELECT RELEASE_LOCK('bt_schema_lock')")
-    except Exception:
-        # If the dialect doesn't support GET_LOCK/RELEASE_LOCK, just attempt create_all
-        Base.metadata.create_all(engine)
+    # Optional read replicas for @read_only views (see app.replicas)
+    replicas = None
+    if replica_urls():
+        stats = [PoolStats() for _ in replica_urls()]
+        replicas = ReplicaSet([create_pool_engine(u, st) for u, st in zip(replica_urls(), stats)], stats)
+
+    session_factory = sessionmaker(bind=engine, class_=RoutingSession, autoflush=False, autocommit=False, future=True)
+    db_session = scoped_session(session_factory)
 
     # Attach to app
     app.engine = engine
     app.db_session = db_session
+    app.shards = ShardMap(engines, shard_stats)
 
+    replicas_init_app(app, replicas)
     csrf.init_app(app)
     login_manager.init_app(app)
 
     @login_manager.user_loader
     def load_user(user_id):
-        return db_session.get(User, int(user_id))
+        # Route the session to the user's shard first, then serve the identity
+        # from a per-process TTL cache; see app.cache.load_session_user
+        uid = str(user_id).partition(":")[0]
+        if uid.isdigit():
+            bind_user(int(uid))
+        return load_session_user(db_session, user_id)
 
     # Register routes
     from .routes import bp
+    from .api import api_bp
+    from .assets import assets_bp, asset_url, asset_srcset, asset_width, MIME_TYPES
     app.register_blueprint(bp)
+    app.register_blueprint(api_bp)
+    app.register_blueprint(assets_bp)
+    csrf.exempt(api_bp)  # bearer-token auth, no cookies
+    app.jinja_env.globals.update(
+        asset_url=asset_url,
+        asset_srcset=asset_srcset,
+        asset_width=asset_width,
+        asset_mime_types=MIME_TYPES,
+    )
+    # Shared bytecode cache + {% cache %} fragments (see app.templating)
+    templating.init_app(app)
+
+    from .rollups import rollups_cli
+    from .importer import transactions_cli
+    from .assets import assets_cli
+    from .migrations import db_cli
+    from .shards import shards_cli
+    app.cli.add_command(db_cli)
+    app.cli.add_command(shards_cli)
+    app.cli.add_command(rollups_cli)
+    app.cli.add_command(transactions_cli)
+    app.cli.add_command(assets_cli)
+
+    # gzip/brotli for HTML/JSON/CSV responses; levels are tunable (see bench/compression.py)
+    app.wsgi_app = CompressionMiddleware(
+        app.wsgi_app,
+        level=int(os.getenv("COMPRESS_LEVEL", "6")),
+        brotli_level=int(os.getenv("COMPRESS_BR_LEVEL", "4")),
+        min_size=int(os.getenv("COMPRESS_MIN_SIZE", "1024")),
+    )
+    # Prometheus /metrics; installed last so its middleware sees compressed sizes
+    metrics.init_app(app)
+    # Per-request SQL log, N+1 and slow-query EXPLAIN; debug mode or SQL_INSPECTOR=1 only
+    sqlinspect.init_app(app)
 
     @app.teardown_appcontext
     def shutdown_session(exception=None):
@@ -0,0 +1,35 @@
+"""
+Analytics series: per-month income, expenses, budgeted total and running savings.
+Shared by the analytics page and the JSON API.
+"""
+from decimal import Decimal
+from .budgeting import effective_budgets
+from .savings import balance_series
+
+
+def analytics_series(db, user_id: int) -> dict:
+    """
+    {"months": [...], "income": [...], "expenses": [...], "budgeted": [...], "savings": [...]}
+    One entry per month that has transactions or a starting-savings seed, oldest first.
+    """
+    # Materialized by app.savings, so no history scan or running sum here
+    rows = balance_series(db, user_id)
+
+    months = [r[0] for r in rows]
+    income = [float(r[1] or 0) for r in rows]
+    expenses = [float(r[2] or 0) for r in rows]
+    savings = [float(r[3] or 0) for r in rows]
+
+    # Budget in force in each month (not today's budgets projected backwards)
+    budgeted = []
+    if months:
+        by_month = effective_budgets(db, user_id, months[0], months[-1])
+        budgeted = [round(float(sum(by_month[m].values(), Decimal("0"))), 2) for m in months]
+
+    return {
+        "months": months,
+        "income": income,
+        "expenses": expenses,
+        "budgeted": budgeted,
+        "savings": savings,
+    }
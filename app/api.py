@@ -0,0 +1,336 @@
+"""
+Versioned JSON API (/api/v1) for the mobile app.
+
+Auth is a signed bearer token from POST /api/v1/auth/token. Resolving it loads
+the user's data_version in the same query, so collection endpoints can answer
+a matching If-None-Match with 304 before doing any aggregation or
+serialization. Money is serialized as fixed two-decimal strings ("12.50") so
+Numeric values round-trip exactly; bodies use compact separators.
+"""
+import hashlib
+import json
+import os
+from datetime import date
+from decimal import Decimal
+from functools import wraps
+from flask import Blueprint, current_app, request, g
+from itsdangerous import URLSafeTimedSerializer, BadSignature, SignatureExpired
+from sqlalchemy import select, and_
+from werkzeug.datastructures import MultiDict
+from .models import User, Category, Transaction, Budget, password_fingerprint
+from .forms import TransactionForm, MAX_BATCH_ROWS, validate_transaction_rows
+from .utils import current_month_str, normalize_month, parse_month
+from .cache import dashboard_cache, bump_data_version, get_data_version
+from .importer import insert_batch
+from .dashboard import dashboard_summary
+from .analytics import analytics_series
+from .pagination import keyset_page, PAGE_SIZE
+from .shards import bind_user, bind_email, UserMoving
+from . import rollups, savings
+
+api_bp = Blueprint("api_v1", __name__, url_prefix="/api/v1")
+
+TOKEN_MAX_AGE = int(os.getenv("API_TOKEN_MAX_AGE", str(30 * 24 * 3600)))
+MAX_PAGE_SIZE = 200
+
+# -------------------- serialization --------------------
+
+
+def _json_default(o):
+    if isinstance(o, Decimal):
+        return f"{o:.2f}"
+    if isinstance(o, date):
+        return o.isoformat()
+    raise TypeError(f"{type(o).__name__} is not JSON serializable")
+
+
+def api_response(payload, status: int = 200, headers: dict | None = None):
+    body = json.dumps(payload, separators=(",", ":"), default=_json_default)
+    return current_app.response_class(body, status=status, headers=headers, mimetype="application/json")
+
+
+def api_error(message: str, status: int, **extra):
+    return api_response({"error": message, **extra}, status)
+
+
+def _txn_json(t: Transaction, c: Category) -> dict:
+    return {
+        "id": t.id,
+        "date": t.date,
+        "type": t.type,
+        "amount": Decimal(str(t.amount)),
+        "description": t.description or "",
+        "category": {"id": c.id, "name": c.name, "icon": c.icon},
+    }
+
+# -------------------- auth --------------------
+
+
+def _serializer():
+    return URLSafeTimedSerializer(current_app.config["SECRET_KEY"], salt="api-token")
+
+
+def issue_token(user: User) -> str:
+    # Changing the password changes the fingerprint, which invalidates outstanding tokens
+    return _serializer().dumps({"uid": user.id, "pw": password_fingerprint(user.password_hash)})
+
+
+def token_required(view):
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        scheme, _, token = request.headers.get("Authorization", "").partition(" ")
+        if scheme.lower() != "bearer" or not token:
+            return api_error("Missing bearer token.", 401)
+        try:
+            claims = _serializer().loads(token, max_age=TOKEN_MAX_AGE)
+        except SignatureExpired:
+            return api_error("Token expired.", 401)
+        except BadSignature:
+            return api_error("Invalid token.", 401)
+
+        try:
+            bind_user(claims.get("uid"))
+        except UserMoving:
+            return api_error("Account is being moved; retry shortly.", 503)
+        except (TypeError, ValueError):
+            return api_error("Invalid token.", 401)
+        db = current_app.db_session
+        row = db.execute(
+            select(User.id, User.password_hash, User.data_version).where(User.id == claims.get("uid"))
+        ).first()
+        if not row or password_fingerprint(row.password_hash) != claims.get("pw"):
+            return api_error("Invalid token.", 401)
+        g.api_user_id = row.id
+        g.api_data_version = row.data_version or 0
+        return view(*args, **kwargs)
+    return wrapper
+
+
+def etagged(view):
+    """
+    Strong ETag derived from (user, data_version, endpoint, query args, current month).
+    Anything that changes the user's data bumps data_version, so a matching
+    If-None-Match can be answered with 304 without running the view.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        key = "|".join([
+            "v1",
+            str(g.api_user_id),
+            str(g.api_data_version),
+            request.endpoint or "",
+            json.dumps(sorted(request.args.items(multi=True))),
+            json.dumps(sorted(kwargs.items())),
+            current_month_str(),  # default month for endpoints that take one
+        ])
+        etag = hashlib.sha256(key.encode()).hexdigest()[:32]
+        headers = {"ETag": f'"{etag}"', "Cache-Control": "private, no-cache"}
+        # Weak comparison: the compression middleware weakens ETags on encoded bodies
+        if request.if_none_match.contains_weak(etag):
+            return current_app.response_class(status=304, headers=headers)
+        resp = view(*args, **kwargs)
+        if resp.status_code == 200:  # never hand out a validator for an error
+            resp.headers.update(headers)
+        return resp
+    return wrapper
+
+
+@api_bp.route("/auth/token", methods=["POST"])
+def auth_token():
+    data = request.get_json(silent=True) or {}
+    email = str(data.get("email") or "").strip().lower()
+    password = str(data.get("password") or "")
+    db = current_app.db_session
+    try:
+        user_id = bind_email(email) if email else None
+    except UserMoving:
+        return api_error("Account is being moved; retry shortly.", 503)
+    user = db.get(User, user_id) if user_id is not None else None
+    if not user or not user.check_password(password):
+        return api_error("Invalid credentials.", 401)
+    return api_response({"token": issue_token(user), "expires_in": TOKEN_MAX_AGE})
+
+# -------------------- resources --------------------
+
+
+@api_bp.route("/categories")
+@token_required
+@etagged
+def categories():
+    db = current_app.db_session
+    cats = db.execute(
+        select(Category).where(Category.user_id == g.api_user_id).order_by(Category.name)
+    ).scalars()
+    return api_response({"categories": [{"id": c.id, "name": c.name, "icon": c.icon} for c in cats]})
+
+
+@api_bp.route("/budgets")
+@token_required
+@etagged
+def budgets():
+    db = current_app.db_session
+    rows = db.execute(
+        select(Budget, Category)
+        .join(Category, Budget.category_id == Category.id)
+        .where(Budget.user_id == g.api_user_id)
+        .order_by(Category.name, Budget.month)
+    ).all()
+    return api_response({"budgets": [
+        {
+            "id": b.id,
+            "category": {"id": c.id, "name": c.name},
+            "month": normalize_month(b.month),
+            "amount": Decimal(str(b.amount)),
+            "recurrence": b.recurrence,
+        }
+        for b, c in rows
+    ]})
+
+
+@api_bp.route("/transactions")
+@token_required
+@etagged
+def transactions():
+    """Keyset-paginated, newest first; follow `next` as ?after=."""
+    db = current_app.db_session
+    # Clamped to 1..MAX_PAGE_SIZE; a missing, zero or non-numeric limit means PAGE_SIZE
+    limit = max(1, min(request.args.get("limit", PAGE_SIZE, type=int) or PAGE_SIZE, MAX_PAGE_SIZE))
+    stmt = (
+        select(Transaction, Category)
+        .join(Category, Transaction.category_id == Category.id)
+        .where(Transaction.user_id == g.api_user_id)
+    )
+    rows, next_cursor = keyset_page(db, stmt, request.args.get("after"), page_size=limit)
+    return api_response({"transactions": [_txn_json(t, c) for t, c in rows], "next": next_cursor})
+
+
+@api_bp.route("/transactions", methods=["POST"])
+@token_required
+def transactions_create():
+    db = current_app.db_session
+    payload = request.get_json(silent=True)
+    if not isinstance(payload, dict):
+        return api_error("Expected a JSON object.", 400)
+
+    cats = db.execute(
+        select(Category.id, Category.name).where(Category.user_id == g.api_user_id)
+    ).all()
+    # Values go through the same form validation as the web UI (no CSRF for bearer auth)
+    formdata = MultiDict({k: str(v) for k, v in payload.items() if v is not None})
+    form = TransactionForm(formdata=formdata, meta={"csrf": False})
+    form.category_id.choices = [(cid, name) for cid, name in cats]
+    if not form.validate():
+        return api_error("Validation failed.", 400, fields=form.errors)
+
+    txn = Transaction(
+        user_id=g.api_user_id,
+        category_id=form.category_id.data,
+        amount=form.amount.data,
+        date=form.date.data,
+        description=form.description.data or "",
+        type=form.type.data,
+    )
+    db.add(txn)
+    rollups.add_transaction(db, txn)
+    savings.refresh_from(db, g.api_user_id, rollups.month_of(txn.date))
+    bump_data_version(db, g.api_user_id)
+    db.commit()
+    cat = db.get(Category, txn.category_id)
+    return api_response({"transaction": _txn_json(txn, cat)}, 201)
+
+
+@api_bp.route("/transactions/batch", methods=["POST"])
+@token_required
+def transactions_batch():
+    """
+    {"transactions": [{...}, ...]}, each shaped like POST /transactions.
+    All rows are validated first; any error is a 400 with per-row field errors
+    and nothing saved. Otherwise one bulk insert and commit, answered with the
+    count and the updated current-month dashboard.
+    """
+    db = current_app.db_session
+    payload = request.get_json(silent=True)
+    records = payload.get("transactions") if isinstance(payload, dict) else None
+    if not isinstance(records, list) or not all(isinstance(r, dict) for r in records):
+        return api_error('Expected {"transactions": [{...}, ...]}.', 400)
+    if not records:
+        return api_error("No transactions given.", 400)
+    if len(records) > MAX_BATCH_ROWS:
+        return api_error(f"At most {MAX_BATCH_ROWS} transactions per request.", 400)
+
+    cats = db.execute(
+        select(Category.id, Category.name).where(Category.user_id == g.api_user_id)
+    ).all()
+    rows, errors = validate_transaction_rows(records, [(cid, name) for cid, name in cats])
+    if errors:
+        return api_error("Validation failed.", 400, rows=[
+            {"index": i, "fields": fields} for i, fields in errors.items()
+        ])
+
+    for row in rows:
+        row["user_id"] = g.api_user_id
+    inserted = insert_batch(db, g.api_user_id, rows)
+    db.commit()
+    month = current_month_str()
+    data = _dashboard_data(db, g.api_user_id, month, get_data_version(db, g.api_user_id))
+    return api_response({"inserted": inserted, "dashboard": _dashboard_json(month, data)}, 201)
+
+
+def _dashboard_data(db, user_id: int, month: str, data_version: int) -> dict:
+    cache_key = (user_id, month, data_version)
+    data = dashboard_cache.get(cache_key)
+    if data is None:
+        data = dashboard_summary(db, user_id, month)
+        dashboard_cache.set(cache_key, data)
+    return data
+
+
+@api_bp.route("/dashboard")
+@token_required
+@etagged
+def dashboard():
+    db = current_app.db_session
+    month = parse_month(request.args.get("month") or current_month_str())
+    if month is None:
+        return api_error("month must be YYYY-MM.", 400)
+    data = _dashboard_data(db, g.api_user_id, month, g.api_data_version)
+    return api_response(_dashboard_json(month, data))
+
+
+def _dashboard_json(month: str, data: dict) -> dict:
+    return {
+        "month": month,
+        "cards": [
+            {
+                "category_id": card["category_id"],
+                "category": card["category"],
+                "budget": card["amount"],
+                "spent": card["spent"],
+                "percent": round(card["percent"], 1),
+            }
+            for card in data["cards"]
+        ],
+        "income": Decimal(str(data["income_bar"]["income"])),
+        "expenses": Decimal(str(data["income_bar"]["expenses"])),
+        "income_used_percent": round(data["income_bar"]["percent"], 1),
+        "unbudgeted": data["unbudgeted_spent"],
+        "recent": [
+            {
+                "id": t["id"],
+                "date": t["date"],
+                "type": t["type"],
+                "amount": Decimal(str(t["amount"])),
+                "description": t["description"] or "",
+                "category": c,
+            }
+            for t, c in data["txns"]
+        ],
+    }
+
+
+@api_bp.route("/analytics")
+@token_required
+@etagged
+def analytics():
+    db = current_app.db_session
+    return api_response(analytics_series(db, g.api_user_id))
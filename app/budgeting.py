@@ -0,0 +1,120 @@
+"""
+Effective-budget resolution over a range of months.
+
+All views that need "the budget for category C in month M" go through here.
+Precedence, per (month, category):
+  1. A one-time budget for exactly that month. A one-time budget with a
+     blank month (legacy rows) counts as one-time for every month, but a
+     dated one wins over it.
+  2. Otherwise the monthly budget with the latest start month on or before
+     that month. A newer monthly budget replaces an older one from its start
+     month on, and a monthly budget never applies before its start. A blank
+     start month means "since forever".
+  3. Otherwise there is no budget.
+One query loads the relevant budgets. The rest is a walk over
+months × categories.
+
+effective_budget_column() states the same precedence for a single month in
+SQL, so a query over categories (the dashboard's) can carry each category's
+effective budget without a separate round trip.
+"""
+from decimal import Decimal
+from sqlalchemy import select, and_, or_, case, func
+from .models import Budget
+from .utils import normalize_month, month_span
+
+
+def effective_budgets(db, user_id: int, first_month: str, last_month: str) -> dict[str, dict[int, Decimal]]:
+    """
+    {month: {category_id: amount}} for every month in [first_month, last_month].
+    Months without any budget map to {}.
+    """
+    months = month_span(first_month, last_month)
+    result: dict[str, dict[int, Decimal]] = {m: {} for m in months}
+    if not months:
+        return result
+
+    rows = db.execute(
+        select(Budget.category_id, Budget.month, Budget.amount, Budget.recurrence).where(
+            and_(
+                Budget.user_id == user_id,
+                or_(
+                    and_(Budget.recurrence == "monthly", or_(Budget.month.is_(None), Budget.month <= last_month)),
+                    and_(
+                        Budget.recurrence != "monthly",
+                        or_(
+                            Budget.month.is_(None),
+                            Budget.month == "",
+                            and_(Budget.month >= first_month, Budget.month <= last_month),
+                        ),
+                    ),
+                ),
+            )
+        )
+    ).all()
+
+    monthly: dict[int, list[tuple[str, Decimal]]] = {}
+    one_time: dict[tuple[str, int], Decimal] = {}
+    undated: dict[int, Decimal] = {}
+    for cid, b_month, amount, recurrence in rows:
+        amount = Decimal(str(amount or 0))
+        m = normalize_month(b_month)
+        if recurrence == "monthly":
+            monthly.setdefault(cid, []).append((m or "", amount))
+        elif m:
+            one_time[(m, cid)] = amount
+        else:
+            undated[cid] = amount
+
+    # Recurring: walk each category's plans in start order alongside the months
+    for cid, plans in monthly.items():
+        plans.sort(key=lambda p: p[0])
+        idx = -1
+        for m in months:
+            while idx + 1 < len(plans) and plans[idx + 1][0] <= m:
+                idx += 1
+            if idx >= 0:
+                result[m][cid] = plans[idx][1]
+
+    # One-time overrides
+    for cid, amount in undated.items():
+        for m in months:
+            result[m][cid] = amount
+    for (m, cid), amount in one_time.items():
+        if m in result:
+            result[m][cid] = amount
+
+    return result
+
+
+def budgets_for_month(db, user_id: int, month: str) -> dict[int, Decimal]:
+    """{category_id: amount} effective in one month."""
+    return effective_budgets(db, user_id, month, month)[month]
+
+
+def effective_budget_column(user_id: int, month: str, category_id):
+    """
+    Correlated scalar subquery: the budget amount in force for category_id in
+    month, or NULL. Same precedence as effective_budgets(); among equals the
+    newest row (highest id) wins, as it does there.
+    """
+    one_time = Budget.recurrence != "monthly"
+    undated = or_(Budget.month.is_(None), Budget.month == "")
+    rank = case((and_(one_time, Budget.month == month), 0), (one_time, 1), else_=2)
+    return (
+        select(Budget.amount)
+        .where(
+            and_(
+                Budget.user_id == user_id,
+                Budget.category_id == category_id,
+                or_(
+                    and_(one_time, or_(undated, Budget.month == month)),
+                    and_(~one_time, or_(undated, Budget.month <= month)),
+                ),
+            )
+        )
+        .order_by(rank, func.coalesce(Budget.month, "").desc(), Budget.id.desc())
+        .limit(1)
+        .correlate_except(Budget)
+        .scalar_subquery()
+    )
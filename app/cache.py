@@ -0,0 +1,163 @@
+"""
+In-process caches for per-user computed views and login identities.
+
+View entries are keyed by the user's `data_version`, a counter every write
+route bumps in the same DB transaction as the change. A stale entry is
+therefore never read again; it just ages out of the LRU. Each gunicorn worker
+has its own cache, and the version lives in the DB, so workers never disagree.
+The version is read at most once per request (it's kept on flask.g until the
+next bump), however many caches key on it.
+
+Login identities can't be keyed that way (finding the version would cost the
+very query we're trying to save), so they expire after USER_CACHE_TTL seconds
+instead and are dropped explicitly on logout and password change.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from flask import g, has_app_context
+from flask_login import UserMixin
+from sqlalchemy import select, update, event
+from .models import User, password_fingerprint
+
+
+class LRUCache:
+    """Small thread-safe LRU with hit/miss counters and an optional TTL (seconds)."""
+
+    def __init__(self, maxsize: int = 512, ttl: float | None = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                value, expires = self._data[key]
+            except KeyError:
+                self.misses += 1
+                return default
+            if expires is not None and expires <= time.monotonic():
+                del self._data[key]
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        expires = time.monotonic() + self.ttl if self.ttl else None
+        with self._lock:
+            self._data[key] = (value, expires)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def pop(self, key):
+        with self._lock:
+            entry = self._data.pop(key, None)
+        return entry[0] if entry else None
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+dashboard_cache = LRUCache(maxsize=int(os.getenv("DASHBOARD_CACHE_SIZE", "512")))
+user_cache = LRUCache(
+    maxsize=int(os.getenv("USER_CACHE_SIZE", "1024")),
+    ttl=float(os.getenv("USER_CACHE_TTL", "60")),
+)
+
+# -------------------- data version --------------------
+
+
+def _known_versions() -> dict:
+    return g.setdefault("data_versions", {}) if has_app_context() else {}
+
+
+def get_data_version(db, user_id: int) -> int:
+    versions = _known_versions()
+    if user_id not in versions:
+        versions[user_id] = db.scalar(select(User.data_version).where(User.id == user_id)) or 0
+    return versions[user_id]
+
+
+def bump_data_version(db, user_id: int):
+    """Call from every write route, before commit."""
+    db.execute(
+        update(User)
+        .where(User.id == user_id)
+        .values(data_version=User.data_version + 1)
+        .execution_options(synchronize_session=False)
+    )
+    _known_versions().pop(user_id, None)
+
+# -------------------- login identities --------------------
+
+
+class SessionUser(UserMixin):
+    """
+    What Flask-Login hands out as current_user: the id and email, nothing lazy.
+    Routes only ever read current_user.id; anything else loads the User row.
+    """
+
+    def __init__(self, id: int, email: str, fingerprint: str):
+        self.id = id
+        self.email = email
+        self.fingerprint = fingerprint
+
+    def get_id(self) -> str:
+        return f"{self.id}:{self.fingerprint}"
+
+
+def load_session_user(db, session_id: str):
+    """
+    Flask-Login user_loader. session_id is "<user id>:<password fingerprint>"
+    (see User.get_id); ids without a matching fingerprint are rejected, so
+    sessions from before a password change stop working.
+    """
+    uid, _, fingerprint = str(session_id).partition(":")
+    if not uid.isdigit() or not fingerprint:
+        return None
+    uid = int(uid)
+
+    user = user_cache.get(uid)
+    if user is not None and user.fingerprint == fingerprint:
+        return user
+
+    row = db.execute(select(User.id, User.email, User.password_hash).where(User.id == uid)).first()
+    if not row:
+        return None
+    user = SessionUser(row.id, row.email, password_fingerprint(row.password_hash))
+    user_cache.set(uid, user)
+    return user if user.fingerprint == fingerprint else None
+
+
+def forget_user(user_id: int):
+    """Drop a cached identity (logout, password change, account removal)."""
+    user_cache.pop(int(user_id))
+
+
+@event.listens_for(User.password_hash, "set")
+def _password_changed(target, value, oldvalue, initiator):
+    if target.id is not None:
+        forget_user(target.id)
@@ -0,0 +1,245 @@
+"""
+WSGI response compression (brotli or gzip, negotiated on Accept-Encoding).
+
+Wraps app.wsgi_app, so it sees every response Flask produces. A response is
+compressed when its Content-Type is in the allowlist, it isn't already
+encoded (e.g. precompressed /assets/ files, the gzip CSV export) and it is at
+least `min_size` bytes. Buffered bodies are compressed in one go with a new
+Content-Length; streamed bodies (the CSV export) are compressed chunk by
+chunk without buffering.
+
+Every eligible response gets Vary: Accept-Encoding, compressed or not, so
+shared caches keep the variants apart. Strong ETags become weak when the
+body is re-encoded; If-None-Match uses weak comparison, so 304s keep working.
+"""
+import zlib
+
+try:
+    import brotli
+except ImportError:  # gzip only
+    brotli = None
+
+DEFAULT_MIMETYPES = frozenset({
+    "text/html",
+    "text/css",
+    "text/plain",
+    "text/csv",
+    "text/javascript",
+    "application/javascript",
+    "application/json",
+    "application/xml",
+    "image/svg+xml",
+})
+
+
+def parse_accept_encoding(header: str) -> dict:
+    """{coding: q} from an Accept-Encoding header (q defaults to 1)."""
+    codings = {}
+    for part in (header or "").split(","):
+        coding, _, params = part.strip().partition(";")
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        q = 1.0
+        for param in params.split(";"):
+            name, _, value = param.strip().partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        codings[coding] = q
+    return codings
+
+
+def choose_encoding(header: str, brotli_available: bool = brotli is not None) -> str | None:
+    codings = parse_accept_encoding(header)
+    star = codings.get("*", 0.0)
+    candidates = (["br"] if brotli_available else []) + ["gzip"]
+    best, best_q = None, 0.0
+    for coding in candidates:  # ties go to the earlier (smaller) coding
+        q = codings.get(coding, star)
+        if q > best_q:
+            best, best_q = coding, q
+    return best
+
+
+class _Encoder:
+    def __init__(self, encoding: str, level: int, brotli_level: int):
+        if encoding == "br":
+            self._c = brotli.Compressor(quality=brotli_level)
+            self._process, self._finish = self._c.process, self._c.finish
+        else:
+            self._c = zlib.compressobj(level, zlib.DEFLATED, 31)  # wbits=31 -> gzip container
+            self._process, self._finish = self._c.compress, self._c.flush
+
+    def compress(self, data: bytes) -> bytes:
+        return self._process(data)
+
+    def finish(self) -> bytes:
+        return self._finish()
+
+
+def compress(data: bytes, encoding: str, level: int = 6, brotli_level: int = 4) -> bytes:
+    enc = _Encoder(encoding, level, brotli_level)
+    return enc.compress(data) + enc.finish()
+
+
+class CompressionMiddleware:
+    """
+    level: gzip level (1-9); brotli_level: brotli quality (0-11);
+    min_size: smallest body, in bytes, worth compressing;
+    mimetypes: Content-Types (without parameters) eligible for compression.
+    """
+
+    def __init__(self, app, level: int = 6, brotli_level: int = 4, min_size: int = 1024,
+                 mimetypes=DEFAULT_MIMETYPES):
+        self.app = app
+        self.level = level
+        self.brotli_level = brotli_level
+        self.min_size = min_size
+        self.mimetypes = frozenset(mimetypes)
+
+    def __call__(self, environ, start_response):
+        encoding = choose_encoding(environ.get("HTTP_ACCEPT_ENCODING", ""))
+        captured = {}
+        buffered = []
+
+        def capture(status, headers, exc_info=None):
+            if exc_info and captured.get("sent"):
+                raise exc_info[1].with_traceback(exc_info[2])
+            captured["status"], captured["headers"], captured["exc_info"] = status, headers, exc_info
+            return buffered.append  # legacy write() callable
+
+        app_iter = self.app(environ, capture)
+        status, headers = captured["status"], captured["headers"]
+
+        if not self._eligible(environ, status, headers):
+            captured["sent"] = True
+            start_response(status, headers, captured["exc_info"])
+            return self._chain(buffered, app_iter)
+
+        _add_vary(headers)
+        length = _header(headers, "Content-Length")
+        if encoding is None or (length is not None and length.isdigit() and int(length) < self.min_size):
+            captured["sent"] = True
+            start_response(status, headers, captured["exc_info"])
+            return self._chain(buffered, app_iter)
+
+        return self._compressed(encoding, status, headers, captured, buffered, app_iter, start_response,
+                                known_length=length is not None)
+
+    # -------------------- helpers --------------------
+
+    def _eligible(self, environ, status: str, headers) -> bool:
+        code = int(status.split(" ", 1)[0])
+        if code < 200 or code in (204, 206, 304) or environ.get("REQUEST_METHOD") == "HEAD":
+            return False
+        if _header(headers, "Content-Encoding") or _header(headers, "Content-Range"):
+            return False
+        if "no-transform" in (_header(headers, "Cache-Control") or "").lower():
+            return False
+        mimetype = (_header(headers, "Content-Type") or "").split(";", 1)[0].strip().lower()
+        return mimetype in self.mimetypes
+
+    def _chain(self, buffered, app_iter):
+        if not buffered:
+            return app_iter
+        return _ClosingIterator(self._iter_all(buffered, app_iter), app_iter)
+
+    @staticmethod
+    def _iter_all(buffered, app_iter):
+        yield from buffered
+        yield from app_iter
+
+    def _compressed(self, encoding, status, headers, captured, buffered, app_iter, start_response,
+                    known_length: bool):
+        def finalize_headers(compressed_length=None):
+            out = [(k, v) for k, v in headers if k.lower() not in ("content-length", "content-md5")]
+            out.append(("Content-Encoding", encoding))
+            etag = _header(headers, "ETag")
+            if etag and not etag.startswith("W/"):
+                out = [(k, f"W/{v}" if k.lower() == "etag" else v) for k, v in out]
+            if compressed_length is not None:
+                out.append(("Content-Length", str(compressed_length)))
+            return out
+
+        if known_length:
+            # Body already in memory (typical Flask response): compress it whole
+            try:
+                body = b"".join(buffered) + b"".join(app_iter)
+            finally:
+                if hasattr(app_iter, "close"):
+                    app_iter.close()
+            data = compress(body, encoding, self.level, self.brotli_level)
+            captured["sent"] = True
+            start_response(status, finalize_headers(len(data)), captured["exc_info"])
+            return [data]
+
+        return _ClosingIterator(
+            self._stream(encoding, status, captured, buffered, app_iter, start_response, finalize_headers),
+            app_iter,
+        )
+
+    def _stream(self, encoding, status, captured, buffered, app_iter, start_response, finalize_headers):
+        # Hold back the first min_size bytes to decide whether compression pays off
+        chunks = iter(self._iter_all(buffered, app_iter))
+        head, size = [], 0
+        for chunk in chunks:
+            head.append(chunk)
+            size += len(chunk)
+            if size >= self.min_size:
+                break
+        else:
+            captured["sent"] = True
+            start_response(status, captured["headers"], captured["exc_info"])
+            yield b"".join(head)
+            return
+
+        enc = _Encoder(encoding, self.level, self.brotli_level)
+        captured["sent"] = True
+        start_response(status, finalize_headers(), captured["exc_info"])
+        out = enc.compress(b"".join(head))
+        if out:
+            yield out
+        for chunk in chunks:
+            out = enc.compress(chunk)
+            if out:
+                yield out
+        yield enc.finish()
+
+
+class _ClosingIterator:
+    """Iterate `iterable`, then close the wrapped app iterator (PEP 3333)."""
+
+    def __init__(self, iterable, app_iter):
+        self._iter = iter(iterable)
+        self._app_iter = app_iter
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return next(self._iter)
+
+    def close(self):
+        if hasattr(self._app_iter, "close"):
+            self._app_iter.close()
+
+
+def _header(headers, name: str):
+    name = name.lower()
+    for k, v in headers:
+        if k.lower() == name:
+            return v
+    return None
+
+
+def _add_vary(headers):
+    for i, (k, v) in enumerate(headers):
+        if k.lower() == "vary":
+            values = [x.strip() for x in v.split(",")]
+            if "*" not in values and "accept-encoding" not in (x.lower() for x in values):
+                headers[i] = (k, f"{v}, Accept-Encoding")
+            return
+    headers.append(("Vary", "Accept-Encoding"))
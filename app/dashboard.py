@@ -0,0 +1,139 @@
+"""
+Dashboard data service.
+
+Builds everything the dashboard shows from two statements:
+  1. categories LEFT JOIN the month's rollups, with expense/income split by
+     conditional aggregation and each category's effective budget resolved
+     in the same query (app.budgeting)
+  2. the ten most recent transactions
+The result is plain dicts/tuples so it can sit in dashboard_cache.
+"""
+from decimal import Decimal
+from sqlalchemy import select, func, and_, case
+from .models import Category, Transaction, MonthlyCategoryTotal as MCT
+from .budgeting import effective_budget_column
+
+RECENT_LIMIT = 10
+
+
+def _category_month_stmt(user_id: int, month: str):
+    spend = (
+        select(
+            MCT.category_id,
+            func.sum(case((MCT.type == "expense", MCT.total), else_=0)).label("expense"),
+            func.sum(case((MCT.type == "income", MCT.total), else_=0)).label("income"),
+        )
+        .where(and_(MCT.user_id == user_id, MCT.month == month))
+        .group_by(MCT.category_id)
+        .subquery()
+    )
+    return (
+        select(
+            Category.id,
+            Category.name,
+            Category.icon,
+            effective_budget_column(user_id, month, Category.id).label("budget"),
+            spend.c.expense,
+            spend.c.income,
+        )
+        .outerjoin(spend, spend.c.category_id == Category.id)
+        .where(Category.user_id == user_id)
+        .order_by(Category.name)
+    )
+
+
+def dashboard_summary(db, user_id: int, month: str) -> dict:
+    """
+    Cards, income bar, unbudgeted total, recent transactions and the category
+    list (for the quick-add grid) for one user and month.
+    """
+    cats = []
+    budget_by_cat: dict[int, Decimal] = {}
+    expenses_by_cat: dict[int, Decimal] = {}
+    income_by_cat: dict[int, Decimal] = {}
+    for cid, name, icon, budget, expense, income in db.execute(_category_month_stmt(user_id, month)):
+        cats.append({"id": cid, "name": name, "icon": icon})
+        if budget is not None:
+            budget_by_cat[cid] = Decimal(str(budget))
+        expenses_by_cat[cid] = Decimal(str(expense or 0))
+        income_by_cat[cid] = Decimal(str(income or 0))
+    cat_name = {c["id"]: c["name"] for c in cats}
+
+    # ---------- Budget cards (net spend = expenses minus refunds recorded as income) ----------
+    cards = []
+    for cid, budget_amt in budget_by_cat.items():
+        spent_net = expenses_by_cat[cid] - income_by_cat[cid]
+        if spent_net < 0:
+            spent_net = Decimal("0")  # don't go negative on the bar
+        pct = float((spent_net / budget_amt) * 100) if budget_amt > 0 else 0.0
+        pct = min(pct, 999.0)
+        cards.append({
+            "category_id": cid,
+            "category": cat_name.get(cid, "Unknown"),
+            "amount": f"{budget_amt:.2f}",
+            "spent": f"{spent_net:.2f}",
+            "percent": pct,
+        })
+    # Sort cards by category name for a stable display
+    cards.sort(key=lambda x: x["category"].lower())
+
+    # ---------- Unbudgeted expenses (net) ----------
+    # Anything with net spend > 0 in a category that has NO effective budget this month
+    unbudgeted_total = Decimal("0")
+    for cid, exp_total in expenses_by_cat.items():
+        if cid not in budget_by_cat:
+            net = exp_total - income_by_cat[cid]
+            if net > 0:
+                unbudgeted_total += net
+
+    # ---------- Income progress (Income vs Expenses) ----------
+    total_income = sum(income_by_cat.values(), Decimal("0"))
+    total_expense = sum(expenses_by_cat.values(), Decimal("0"))
+    if total_income > 0:
+        income_use_pct = float((total_expense / total_income) * 100)
+    else:
+        income_use_pct = 0.0
+    income_use_pct = min(income_use_pct, 999.0)
+
+    income_bar = {
+        "income": float(total_income),
+        "expenses": float(total_expense),
+        "percent": income_use_pct,
+        "over": income_use_pct > 102.0,
+    }
+
+    return {
+        "cards": cards,
+        "txns": recent_transactions(db, user_id),
+        "cats": cats,
+        "unbudgeted_spent": f"{unbudgeted_total:.2f}",
+        "income_bar": income_bar,
+        "total_income": float(total_income),  # kept for template convenience
+    }
+
+
+def recent_transactions(db, user_id: int, limit: int = RECENT_LIMIT):
+    """[(txn_dict, category_dict)], newest first."""
+    rows = db.execute(
+        select(
+            Transaction.id,
+            Transaction.date,
+            Transaction.type,
+            Transaction.amount,
+            Transaction.description,
+            Category.id,
+            Category.name,
+            Category.icon,
+        )
+        .join(Category, Transaction.category_id == Category.id)
+        .where(Transaction.user_id == user_id)
+        .order_by(Transaction.date.desc(), Transaction.id.desc())
+        .limit(limit)
+    ).all()
+    return [
+        (
+            {"id": tid, "date": d, "type": t_type, "amount": amount, "description": desc},
+            {"id": cid, "name": name, "icon": icon},
+        )
+        for tid, d, t_type, amount, desc, cid, name, icon in rows
+    ]
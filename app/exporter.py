@@ -0,0 +1,66 @@
+"""
+Streaming CSV export of a user's transactions.
+
+Selects plain columns (no ORM entities, so nothing lands in the identity map)
+with yield_per, which turns on server-side cursors (stream_results) for
+MySQL. Rows are encoded and flushed in small chunks, optionally through an
+incremental gzip compressor, so worker memory stays flat at any row count.
+"""
+import csv
+import io
+import zlib
+from sqlalchemy import select, and_
+from .models import Transaction, Category
+
+YIELD_PER = 1000
+FLUSH_BYTES = 64 * 1024
+
+HEADER = ["date", "type", "category", "amount", "description"]
+
+
+def export_query(user_id: int, start=None, end=None, category_id: int | None = None):
+    filters = [Transaction.user_id == user_id]
+    if start:
+        filters.append(Transaction.date >= start)
+    if end:
+        filters.append(Transaction.date <= end)
+    if category_id:
+        filters.append(Transaction.category_id == category_id)
+    return (
+        select(
+            Transaction.date,
+            Transaction.type,
+            Category.name,
+            Transaction.amount,
+            Transaction.description,
+        )
+        .join(Category, Transaction.category_id == Category.id)
+        .where(and_(*filters))
+        .order_by(Transaction.date, Transaction.id)
+        .execution_options(yield_per=YIELD_PER)
+    )
+
+
+def iter_csv_rows(db, stmt):
+    """Yield the CSV as UTF-8 byte chunks of roughly FLUSH_BYTES."""
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(HEADER)
+    for d, txn_type, cat_name, amount, description in db.execute(stmt):
+        writer.writerow([d.isoformat(), txn_type, cat_name, f"{amount:.2f}", description or ""])
+        if buf.tell() >= FLUSH_BYTES:
+            yield buf.getvalue().encode("utf-8")
+            buf.seek(0)
+            buf.truncate()
+    if buf.tell():
+        yield buf.getvalue().encode("utf-8")
+
+
+def gzip_chunks(chunks, level: int = 6):
+    """Wrap a byte-chunk iterator in a gzip stream without buffering it."""
+    z = zlib.compressobj(level, zlib.DEFLATED, 31)  # wbits=31 -> gzip container
+    for chunk in chunks:
+        out = z.compress(chunk)
+        if out:
+            yield out
+    yield z.flush()
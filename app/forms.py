@@ -1,7 +1,9 @@
 from datetime import date
-from wtforms import StringField, PasswordField, DecimalField, SelectField, DateField, TextAreaField, SubmitField
-from wtforms.validators import DataRequired, Email, Length, EqualTo, NumberRange
+from werkzeug.datastructures import MultiDict
+from wtforms import StringField, PasswordField, DecimalField, SelectField, DateField, TextAreaField, SubmitField, BooleanField
+from wtforms.validators import DataRequired, Email, Length, EqualTo, NumberRange, Optional
 from flask_wtf import FlaskForm
+from flask_wtf.file import FileField, FileRequired, FileAllowed
 
 class RegisterForm(FlaskForm):
     email = StringField("Email", validators=[DataRequired(), Email(), Length(max=255)])
@@ -88,8 +90,49 @@ class TransactionForm(FlaskForm):
     description = TextAreaField("Description", validators=[Length(max=255)])
     submit = SubmitField("Add Transaction")
 
+# Rows per batch quick-add request (web and API)
+MAX_BATCH_ROWS = 100
+
+
+def validate_transaction_rows(records: list[dict], category_choices: list) -> tuple[list[dict], dict]:
+    """
+    Validate many {field: value} transaction records with TransactionForm.
+    CSRF is the request's business, not each row's. Returns (rows ready for
+    importer.insert_batch once user_id is added, {row index: field errors}).
+    """
+    rows, errors = [], {}
+    for i, record in enumerate(records):
+        formdata = MultiDict({k: str(v) for k, v in record.items() if v is not None})
+        form = TransactionForm(formdata=formdata, meta={"csrf": False})
+        form.category_id.choices = category_choices
+        if not form.validate():
+            errors[i] = form.errors
+            continue
+        rows.append({
+            "category_id": form.category_id.data,
+            "amount": form.amount.data,
+            "date": form.date.data,
+            "description": form.description.data or "",
+            "type": form.type.data,
+        })
+    return rows, errors
+
 class SavingsStartForm(FlaskForm):
     month = StringField("Month (YYYY-MM)", validators=[DataRequired(), Length(min=7, max=7)])
     amount = DecimalField("Starting Savings", places=2, validators=[DataRequired(), NumberRange(min=0)])
     submit = SubmitField("Save Starting Savings")
 
+
+class ImportForm(FlaskForm):
+    file = FileField("Bank export (CSV or OFX)", validators=[FileRequired(), FileAllowed(["csv", "txt", "ofx", "qfx"])])
+    format = SelectField("Format", choices=[("auto", "Detect"), ("csv", "CSV"), ("ofx", "OFX/QFX")], default="auto")
+    default_category_id = SelectField("Category for unmatched rows", coerce=int, validators=[DataRequired()])
+    create_categories = BooleanField("Create categories named in the file")
+    # CSV column mapping; blank = guess from the header
+    date_column = StringField("Date column", validators=[Optional(), Length(max=64)])
+    amount_column = StringField("Amount column", validators=[Optional(), Length(max=64)])
+    description_column = StringField("Description column", validators=[Optional(), Length(max=64)])
+    category_column = StringField("Category column", validators=[Optional(), Length(max=64)])
+    date_format = StringField("Date format", validators=[Optional(), Length(max=32)])
+    positive_is_expense = BooleanField("Positive amounts are expenses")
+    submit = SubmitField("Import")
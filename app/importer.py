@@ -0,0 +1,428 @@
+"""
+Streaming bulk import of bank exports (CSV or OFX).
+
+Rows are parsed one at a time from the upload stream, so memory stays flat
+regardless of file size. Each row gets a content hash (or the bank's FITID for
+OFX); rows whose hash already exists for the user are skipped, which makes
+re-importing an overlapping export safe. New rows go in as multi-row INSERTs,
+BATCH_SIZE at a time. The rollups and data_version are updated and committed
+with each batch.
+
+CSV lines are decoded as UTF-8 where they can be and as Windows-1252
+(Latin-1 as the last resort) where they can't, since many banks still export
+in their Windows code page. OFX is read as Latin-1 throughout.
+"""
+import codecs
+import csv
+import hashlib
+import io
+import itertools
+import re
+import time
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from sqlalchemy import select, insert, and_
+from .models import User, Category, Transaction
+from .cache import bump_data_version
+from .shards import bind_email
+from . import rollups, savings
+
+BATCH_SIZE = 1000
+MAX_REPORTED_ERRORS = 20
+
+DATE_FORMATS = ["%Y-%m-%d", "%m/%d/%Y", "%m/%d/%y", "%d.%m.%Y", "%Y/%m/%d"]
+
+# Header names tried (case-insensitive) when a column isn't mapped explicitly
+GUESS_COLUMNS = {
+    "date": ["date", "posted date", "posting date", "transaction date", "trans. date"],
+    "amount": ["amount", "transaction amount", "amt"],
+    "description": ["description", "payee", "name", "memo", "details"],
+    "category": ["category"],
+    "type": ["type", "transaction type"],
+    "debit": ["debit", "withdrawal", "withdrawals"],
+    "credit": ["credit", "deposit", "deposits"],
+}
+
+
+class ImportFormatError(ValueError):
+    """The file can't be imported at all (missing columns, unknown format)."""
+
+# -------------------- parsing --------------------
+
+
+def parse_amount(raw: str | None) -> Decimal | None:
+    """'$1,234.56', '-12.00', '(12.00)' -> Decimal; blank -> None."""
+    if raw is None:
+        return None
+    s = str(raw).strip()
+    if not s:
+        return None
+    negative = s.startswith("(") and s.endswith(")")
+    s = re.sub(r"[^\d.\-]", "", s)
+    try:
+        value = Decimal(s)
+    except InvalidOperation:
+        raise ValueError(f"bad amount {raw!r}")
+    return -value if negative else value
+
+
+def parse_date(raw: str, fmt: str | None = None):
+    raw = (raw or "").strip()
+    for f in ([fmt] if fmt else DATE_FORMATS):
+        try:
+            return datetime.strptime(raw, f).date()
+        except ValueError:
+            continue
+    raise ValueError(f"bad date {raw!r}")
+
+
+def _resolve_columns(fieldnames, mapping: dict) -> dict:
+    by_lower = {(name or "").strip().lower(): name for name in fieldnames or []}
+    cols = {}
+    for key, candidates in GUESS_COLUMNS.items():
+        wanted = (mapping.get(key) or "").strip()
+        if wanted:
+            if wanted.lower() not in by_lower:
+                raise ImportFormatError(f"Column '{wanted}' not found in file header.")
+            cols[key] = by_lower[wanted.lower()]
+            continue
+        for cand in candidates:
+            if cand in by_lower:
+                cols[key] = by_lower[cand]
+                break
+    if "date" not in cols:
+        raise ImportFormatError("Could not find a date column; map it explicitly.")
+    if "amount" not in cols and not ("debit" in cols or "credit" in cols):
+        raise ImportFormatError("Could not find an amount (or debit/credit) column; map it explicitly.")
+    return cols
+
+
+def _cell(row: dict, cols: dict, key: str) -> str:
+    col = cols.get(key)
+    return (row.get(col) or "") if col else ""
+
+
+def iter_csv(stream, mapping: dict, date_format: str | None = None):
+    """
+    Yield (line_no, record | ValueError) from a binary CSV stream.
+    Records are dicts with date, amount (signed), description, category, type.
+    """
+    reader = csv.DictReader(_decoded_lines(stream))
+    rows = _checked_rows(reader)
+    first = next(rows, None)  # reads the header too, so a broken one is reported here
+    cols = _resolve_columns(reader.fieldnames, mapping)
+    if first is None:
+        return
+    for line_no, row in itertools.chain([first], rows):
+        try:
+            if "amount" in cols:
+                amount = parse_amount(_cell(row, cols, "amount"))
+            else:
+                debit = parse_amount(_cell(row, cols, "debit")) or Decimal("0")
+                credit = parse_amount(_cell(row, cols, "credit")) or Decimal("0")
+                amount = credit - abs(debit)
+            if amount is None:
+                raise ValueError("missing amount")
+            yield line_no, {
+                "date": parse_date(_cell(row, cols, "date"), date_format),
+                "amount": amount,
+                "description": _cell(row, cols, "description").strip(),
+                "category": _cell(row, cols, "category").strip(),
+                "type": _cell(row, cols, "type").strip().lower(),
+                "fitid": None,
+            }
+        except ValueError as e:
+            yield line_no, e
+
+
+def _checked_rows(reader):
+    """(line_no, row) from a csv reader; a csv.Error ends the import as an ImportFormatError."""
+    try:
+        for row in reader:
+            yield reader.line_num, row
+    except csv.Error as e:
+        # DictReader.line_num lags behind a failed row; the inner reader's doesn't
+        raise ImportFormatError(f"Unreadable CSV at row {reader.reader.line_num}: {e}.") from e
+
+
+def _decoded_lines(stream):
+    """Text lines of a binary stream, each decoded on its own (see module docstring)."""
+    for i, raw in enumerate(stream):
+        if i == 0 and raw.startswith(codecs.BOM_UTF8):
+            raw = raw[len(codecs.BOM_UTF8):]
+        try:
+            yield raw.decode("utf-8")
+        except UnicodeDecodeError:
+            try:
+                yield raw.decode("cp1252")
+            except UnicodeDecodeError:
+                yield raw.decode("latin-1")
+
+
+_OFX_TAG = re.compile(r"<(/?)([A-Za-z0-9.]+)>([^<]*)")
+
+
+def iter_ofx(stream, chunk_size: int = 64 * 1024):
+    """
+    Yield (n, record | ValueError) for each <STMTTRN> in an OFX 1.x (SGML) or
+    2.x (XML) file, reading the stream in chunks.
+    """
+    buf = ""
+    current = None
+    n = 0
+    decoder = io.TextIOWrapper(stream, encoding="latin-1", newline="")
+    while True:
+        chunk = decoder.read(chunk_size)
+        buf += chunk
+        if chunk:
+            # Only tokenize up to the last '<' so a tag split across chunks waits for the rest
+            cut = buf.rfind("<")
+            if cut == -1:
+                buf = ""  # header lines, no tags yet
+                continue
+            if cut == 0:
+                continue
+        else:
+            cut = len(buf)
+        for m in _OFX_TAG.finditer(buf[:cut]):
+            closing, tag, value = m.group(1), m.group(2).upper(), m.group(3).strip()
+            if tag == "STMTTRN":
+                if not closing:
+                    current = {}
+                    continue
+                if current is not None:
+                    n += 1
+                    yield n, _ofx_record(current)
+                current = None
+            elif current is not None and not closing and value:
+                current[tag] = value
+        buf = buf[cut:]
+        if not chunk:
+            break
+
+
+def _ofx_record(fields: dict):
+    try:
+        amount = parse_amount(fields.get("TRNAMT"))
+        if amount is None:
+            raise ValueError("missing TRNAMT")
+        posted = (fields.get("DTPOSTED") or "")[:8]
+        return {
+            "date": parse_date(posted, "%Y%m%d"),
+            "amount": amount,
+            "description": (fields.get("NAME") or fields.get("MEMO") or "").strip(),
+            "category": "",
+            "type": "",
+            "fitid": fields.get("FITID"),
+        }
+    except ValueError as e:
+        return e
+
+
+def detect_format(filename: str | None, declared: str | None = None) -> str:
+    if declared in ("csv", "ofx"):
+        return declared
+    name = (filename or "").lower()
+    if name.endswith((".ofx", ".qfx")):
+        return "ofx"
+    return "csv"
+
+# -------------------- importing --------------------
+
+
+def row_hash(user_id: int, rec: dict, occurrence: int) -> str:
+    """
+    Stable identity of an imported row. OFX rows use the bank's FITID; CSV rows
+    hash their content plus how many identical rows preceded them in the file,
+    so two genuine same-day coffees both survive.
+    """
+    if rec.get("fitid"):
+        key = f"{user_id}|fitid|{rec['fitid']}"
+    else:
+        key = "|".join([
+            str(user_id),
+            rec["date"].isoformat(),
+            f"{rec['amount']:.2f}",
+            rec["description"],
+            str(occurrence),
+        ])
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+
+def insert_batch(db, user_id: int, rows: list[dict]) -> int:
+    """
+    Bulk-insert prepared transaction dicts (those whose import_hash already
+    exists are dropped), fold them into the rollups and bump the user's data
+    version, then refresh the savings series. Does not commit. Returns the
+    number inserted.
+    """
+    hashes = [r["import_hash"] for r in rows if r.get("import_hash")]
+    if hashes:
+        existing = set(db.scalars(
+            select(Transaction.import_hash).where(
+                and_(Transaction.user_id == user_id, Transaction.import_hash.in_(hashes))
+            )
+        ))
+        rows = [r for r in rows if r.get("import_hash") not in existing]
+    if not rows:
+        return 0
+
+    db.execute(insert(Transaction), rows)
+
+    deltas: dict[tuple, list] = {}
+    for r in rows:
+        key = (rollups.month_of(r["date"]), r["category_id"], r["type"])
+        acc = deltas.setdefault(key, [Decimal("0"), 0])
+        acc[0] += r["amount"]
+        acc[1] += 1
+    for (month, cid, txn_type), (amount, count) in deltas.items():
+        rollups.apply_delta(db, user_id, month, cid, txn_type, amount, count)
+    savings.refresh_from(db, user_id, *{month for month, _, _ in deltas})
+    bump_data_version(db, user_id)
+    return len(rows)
+
+
+def import_transactions(db, user_id: int, records, default_category_id: int,
+                        negative_is_expense: bool = True, create_categories: bool = False,
+                        batch_size: int = BATCH_SIZE, progress=None) -> dict:
+    """
+    Run import_batches() to the end and return the final stats.
+    `progress(stats)` is called after each batch.
+    """
+    for stats in import_batches(db, user_id, records, default_category_id, negative_is_expense,
+                                create_categories, batch_size):
+        if progress:
+            progress(stats)
+    return stats
+
+
+def import_batches(db, user_id: int, records, default_category_id: int,
+                   negative_is_expense: bool = True, create_categories: bool = False,
+                   batch_size: int = BATCH_SIZE):
+    """
+    Consume (line_no, record | ValueError) pairs from iter_csv/iter_ofx and
+    insert them in committed batches, yielding the running stats after each
+    one (the last yield is the final total).
+    """
+    categories = {
+        c.name.lower(): c.id
+        for c in db.scalars(select(Category).where(Category.user_id == user_id))
+    }
+    stats = {"rows": 0, "inserted": 0, "duplicates": 0, "invalid": 0, "errors": [], "seconds": 0.0}
+    seen: dict[tuple, int] = {}
+    batch: list[dict] = []
+    started = time.perf_counter()
+
+    def flush():
+        inserted = insert_batch(db, user_id, batch)
+        db.commit()
+        stats["inserted"] += inserted
+        stats["duplicates"] += len(batch) - inserted
+        stats["seconds"] = time.perf_counter() - started
+        batch.clear()
+
+    for line_no, rec in records:
+        stats["rows"] += 1
+        if isinstance(rec, Exception):
+            stats["invalid"] += 1
+            if len(stats["errors"]) < MAX_REPORTED_ERRORS:
+                stats["errors"].append(f"row {line_no}: {rec}")
+            continue
+
+        txn_type = rec["type"]
+        if txn_type in ("credit", "deposit"):
+            txn_type = "income"
+        elif txn_type in ("debit", "withdrawal"):
+            txn_type = "expense"
+        if txn_type not in ("income", "expense"):
+            is_negative = rec["amount"] < 0
+            txn_type = "expense" if is_negative == negative_is_expense else "income"
+
+        cat_name = rec["category"]
+        cid = categories.get(cat_name.lower()) if cat_name else None
+        if cid is None and cat_name and create_categories:
+            cat = Category(name=cat_name[:64], icon="tag", user_id=user_id)
+            db.add(cat)
+            db.flush()
+            cid = categories[cat_name.lower()] = cat.id
+        if cid is None:
+            cid = default_category_id
+
+        ident = (rec["date"], rec["amount"], rec["description"], rec.get("fitid"))
+        occurrence = seen[ident] = seen.get(ident, 0) + 1
+        batch.append({
+            "user_id": user_id,
+            "category_id": cid,
+            "amount": abs(rec["amount"]),
+            "date": rec["date"],
+            "description": rec["description"][:255],
+            "type": txn_type,
+            "import_hash": row_hash(user_id, rec, occurrence),
+        })
+        if len(batch) >= batch_size:
+            flush()
+            yield stats
+
+    flush()
+    yield stats
+
+# -------------------- CLI --------------------
+
+
+transactions_cli = AppGroup("transactions", help="Bulk transaction tools.")
+
+
+@transactions_cli.command("import")
+@click.argument("path", type=click.Path(exists=True, dir_okay=False))
+@click.option("--email", required=True, help="Owner of the imported rows.")
+@click.option("--format", "fmt", type=click.Choice(["auto", "csv", "ofx"]), default="auto")
+@click.option("--category", "default_category", default="General", show_default=True,
+              help="Category for rows whose category is blank or unknown.")
+@click.option("--create-categories", is_flag=True, help="Create categories named in the file.")
+@click.option("--date-format", default=None, help="strptime format for CSV dates (default: guess).")
+@click.option("--positive-is-expense", is_flag=True, help="Bank exports debits as positive numbers.")
+@click.option("--batch-size", type=int, default=BATCH_SIZE, show_default=True)
+def import_command(path, email, fmt, default_category, create_categories, date_format,
+                   positive_is_expense, batch_size):
+    """Import a CSV or OFX bank export for one user."""
+    db = current_app.db_session
+    user_id = bind_email(email.lower())
+    user = db.get(User, user_id) if user_id is not None else None
+    if not user:
+        raise click.ClickException(f"No user {email}.")
+    cat_id = db.scalar(select(Category.id).where(
+        and_(Category.user_id == user.id, Category.name == default_category)
+    ))
+    if cat_id is None:
+        raise click.ClickException(f"{email} has no category '{default_category}'.")
+
+    def report(stats):
+        rate = stats["rows"] / stats["seconds"] if stats["seconds"] else 0
+        click.echo(
+            f"\r{stats['rows']} rows · {stats['inserted']} new · {stats['duplicates']} duplicate · "
+            f"{stats['invalid']} invalid · {rate:,.0f} rows/s",
+            nl=False,
+        )
+
+    with open(path, "rb") as fh:
+        if detect_format(path, fmt) == "ofx":
+            records = iter_ofx(fh)
+        else:
+            records = iter_csv(fh, {}, date_format)
+        try:
+            stats = import_transactions(
+                db, user.id, records, cat_id,
+                negative_is_expense=not positive_is_expense,
+                create_categories=create_categories,
+                batch_size=batch_size,
+                progress=report,
+            )
+        except ImportFormatError as e:
+            click.echo()  # end the progress line
+            raise click.ClickException(str(e))
+    click.echo()
+    for err in stats["errors"]:
+        click.echo(f"  {err}", err=True)
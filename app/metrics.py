@@ -0,0 +1,223 @@
+"""
+Prometheus metrics: per-endpoint request latency, response size, errors and
+SQL statements / DB time per request, plus connection pool gauges, exposed on
+/metrics in the Prometheus text format.
+
+Under gunicorn every worker is a separate process, so the metrics live in
+files under PROMETHEUS_MULTIPROC_DIR (gunicorn.conf.py sets and empties it
+at startup and marks exited workers dead) and /metrics aggregates all of
+them, whichever worker serves the scrape. Without that variable (flask run,
+scripts) the in-process default registry is used.
+
+MetricsMiddleware wraps the whole WSGI stack, outside compression, so
+latency includes streaming the body and sizes are bytes on the wire.
+Endpoint labels are Flask endpoint names (core.dashboard, api_v1.transactions,
+...), which keeps the label set bounded; unmatched URLs count as "unmatched".
+
+Set METRICS_TOKEN to require `Authorization: Bearer <token>` on /metrics.
+"""
+import hmac
+import os
+import time
+from flask import Blueprint, Response, abort, has_request_context, request
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+)
+from prometheus_client import multiprocess
+from sqlalchemy import event
+
+ENVIRON_KEY = "intellidollar.metrics"
+UNMATCHED = "unmatched"
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds", "Request latency, including streaming the body.",
+    ["endpoint", "method"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+REQUESTS = Counter("http_requests", "Requests served.", ["endpoint", "method", "status"])
+RESPONSE_SIZE = Histogram(
+    "http_response_size_bytes", "Response body bytes sent (after compression).",
+    ["endpoint"],
+    buckets=(256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304),
+)
+ERRORS = Counter("http_request_errors", "Responses with a 5xx status or an unhandled exception.", ["endpoint"])
+SQL_STATEMENTS = Histogram(
+    "db_statements_per_request", "SQL statements executed per request.",
+    ["endpoint"],
+    buckets=(0, 1, 2, 5, 10, 20, 50, 100, 200),
+)
+SQL_TIME = Histogram(
+    "db_time_per_request_seconds", "Total time spent in SQL statements per request.",
+    ["endpoint"],
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5),
+)
+POOL_IN_USE = Gauge("db_pool_connections_in_use", "Connections checked out.", ["engine"],
+                    multiprocess_mode="livesum")
+POOL_SIZE = Gauge("db_pool_size", "Configured pool size (excluding overflow).", ["engine"],
+                  multiprocess_mode="livesum")
+
+
+class RequestMetrics:
+    __slots__ = ("endpoint", "statements", "db_time")
+
+    def __init__(self):
+        self.endpoint = UNMATCHED
+        self.statements = 0
+        self.db_time = 0.0
+
+
+def _current() -> RequestMetrics | None:
+    if not has_request_context():
+        return None
+    return request.environ.get(ENVIRON_KEY)
+
+
+def instrument_engine(engine, name: str):
+    """
+    Count statements and DB time against the request that ran them; track
+    pool gauges labelled engine=`name`.
+    """
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("metrics_started", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["metrics_started"].pop()
+        current = _current()
+        if current is not None:
+            current.statements += 1
+            current.db_time += elapsed
+
+    @event.listens_for(engine, "handle_error")
+    def _error(context):
+        stack = context.connection.info.get("metrics_started") if context.connection else None
+        if stack:
+            stack.pop()
+
+    pool = engine.pool
+    if hasattr(pool, "checkedout"):
+        in_use = POOL_IN_USE.labels(engine=name)
+        POOL_SIZE.labels(engine=name).set(pool.size())
+
+        def _update_pool(*args):
+            in_use.set(pool.checkedout())
+
+        event.listen(engine, "checkout", _update_pool)
+        event.listen(engine, "checkin", _update_pool)
+
+
+def init_app(app):
+    """Label requests with their endpoint and serve /metrics."""
+
+    @app.before_request
+    def _label_endpoint():
+        current = request.environ.get(ENVIRON_KEY)
+        if current is not None:
+            current.endpoint = request.endpoint or UNMATCHED
+
+    app.register_blueprint(metrics_bp)
+    instrument_engine(app.engine, "primary")
+    for i, replica in enumerate(app.replicas.engines if app.replicas else []):
+        instrument_engine(replica, f"replica{i}")
+    for name, shard in app.shards.others().items():
+        instrument_engine(shard, f"shard-{name}")
+    app.wsgi_app = MetricsMiddleware(app.wsgi_app)
+
+# -------------------- WSGI --------------------
+
+
+class MetricsMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    def __call__(self, environ, start_response):
+        current = environ[ENVIRON_KEY] = RequestMetrics()
+        started = time.perf_counter()
+        status = {}
+
+        def capture(status_line, headers, exc_info=None):
+            status["code"] = status_line.split(" ", 1)[0]
+            return start_response(status_line, headers, exc_info)
+
+        try:
+            app_iter = self.app(environ, capture)
+        except Exception:
+            _observe(environ, current, started, "500", 0, failed=True)
+            raise
+        return _CountingIterator(app_iter, lambda sent, failed: _observe(
+            environ, current, started, status.get("code", "500"), sent, failed,
+        ))
+
+
+class _CountingIterator:
+    """Pass the body through, counting bytes; report once when the server closes it."""
+
+    def __init__(self, app_iter, on_close):
+        self._app_iter = app_iter
+        self._iter = iter(app_iter)
+        self._on_close = on_close
+        self._sent = 0
+        self._failed = False
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        try:
+            chunk = next(self._iter)
+        except StopIteration:
+            raise
+        except Exception:
+            self._failed = True
+            raise
+        self._sent += len(chunk)
+        return chunk
+
+    def close(self):
+        try:
+            if hasattr(self._app_iter, "close"):
+                self._app_iter.close()
+        finally:
+            self._on_close(self._sent, self._failed)
+
+
+def _observe(environ, current: RequestMetrics, started: float, code: str, sent: int, failed: bool):
+    endpoint, method = current.endpoint, environ.get("REQUEST_METHOD", "GET")
+    REQUEST_LATENCY.labels(endpoint, method).observe(time.perf_counter() - started)
+    REQUESTS.labels(endpoint, method, code).inc()
+    RESPONSE_SIZE.labels(endpoint).observe(sent)
+    SQL_STATEMENTS.labels(endpoint).observe(current.statements)
+    SQL_TIME.labels(endpoint).observe(current.db_time)
+    if failed or code.startswith("5"):
+        ERRORS.labels(endpoint).inc()
+
+# -------------------- endpoint --------------------
+
+
+metrics_bp = Blueprint("metrics", __name__)
+
+
+def _registry():
+    if not os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        return REGISTRY
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return registry
+
+
+@metrics_bp.route("/metrics")
+def metrics():
+    token = os.getenv("METRICS_TOKEN")
+    if token:
+        supplied = request.headers.get("Authorization", "").removeprefix("Bearer ").strip()
+        if not hmac.compare_digest(supplied.encode(), token.encode()):
+            abort(401)
+    return Response(generate_latest(_registry()), content_type=CONTENT_TYPE_LATEST)
@@ -0,0 +1,312 @@
+"""
+Versioned schema migrations.
+
+MIGRATIONS is an ordered list of (version, step). `flask db upgrade` (or
+`python -m app.migrations upgrade`, which doesn't build the app) runs every
+step above the version recorded in schema_version, each in its own
+transaction, once, before the web workers start. Workers only compare the
+recorded version with HEAD at boot (require_current_schema) and refuse to
+start on an outdated schema instead of altering it themselves.
+
+Steps inspect the live schema before changing it, so databases created by
+older releases (tables present, no schema_version yet) upgrade cleanly from
+version 0. To ship a schema change, append a step with the next version.
+With DATABASE_SHARD_URLS set, every shard is upgraded, main first.
+"""
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from sqlalchemy import (
+    create_engine, inspect, insert, literal, select, func, exc,
+    MetaData, Table, Column, Index, ForeignKey, UniqueConstraint,
+    Integer, String, Boolean, Date, Numeric,
+)
+from .models import SchemaVersion, Transaction, User, MonthlyCategoryTotal, MonthlySavingsBalance
+from . import rollups, savings
+
+
+def _existing_tables(conn, *names) -> MetaData:
+    """MetaData holding the named live tables, for foreign keys from new ones."""
+    metadata = MetaData()
+    metadata.reflect(conn, only=list(names))
+    return metadata
+
+
+def _ensure_index(conn, table_name: str, name: str, *columns: str, unique: bool = False):
+    if name in {ix["name"] for ix in inspect(conn).get_indexes(table_name)}:
+        return
+    table = Table(table_name, MetaData(), autoload_with=conn)
+    Index(name, *(table.c[c] for c in columns), unique=unique).create(conn)
+
+
+def _ensure_column(conn, table_name: str, column: Column):
+    existing = {c["name"] for c in inspect(conn).get_columns(table_name)}
+    if column.name in existing:
+        return
+    col_type = column.type.compile(dialect=conn.dialect)
+    ddl = f"ALTER TABLE {table_name} ADD COLUMN {column.name} {col_type}"
+    if column.server_default is not None:
+        ddl += f" DEFAULT {column.server_default.arg}"
+        # NOT NULL is only safe on a populated table when there is a default to backfill with
+        if not column.nullable:
+            ddl += " NOT NULL"
+    conn.exec_driver_sql(ddl)
+
+
+# -------------------- steps --------------------
+# Each step spells out its own DDL instead of reading app.models, so what a
+# version means never changes when a model does. A model change needs a new
+# step; tests/test_migrations.py fails until the migrated schema matches.
+
+
+def create_base_schema(conn):
+    """The schema as it was before versioned migrations (tables that exist are left alone)."""
+    metadata = MetaData()
+    Table(
+        "users", metadata,
+        Column("id", Integer, primary_key=True),
+        Column("email", String(255), unique=True, nullable=False),
+        Column("password_hash", String(255), nullable=False),
+    )
+    Table(
+        "categories", metadata,
+        Column("id", Integer, primary_key=True),
+        Column("name", String(64), nullable=False),
+        Column("icon", String(64), nullable=False),
+        Column("user_id", Integer, ForeignKey("users.id"), nullable=False),
+        UniqueConstraint("user_id", "name", name="uix_user_category"),
+    )
+    Table(
+        "transactions", metadata,
+        Column("id", Integer, primary_key=True),
+        Column("user_id", Integer, ForeignKey("users.id"), nullable=False),
+        Column("category_id", Integer, ForeignKey("categories.id"), nullable=False),
+        Column("amount", Numeric(10, 2), nullable=False),
+        Column("date", Date, nullable=False),
+        Column("description", String(255), nullable=True),
+        Column("type", String(10), nullable=False),
+    )
+    Table(
+        "budgets", metadata,
+        Column("id", Integer, primary_key=True),
+        Column("user_id", Integer, ForeignKey("users.id"), nullable=False),
+        Column("category_id", Integer, ForeignKey("categories.id"), nullable=False),
+        Column("month", String(7), nullable=True),
+        Column("amount", Numeric(10, 2), nullable=False),
+        Column("recurrence", String(16), nullable=False),
+        UniqueConstraint("user_id", "category_id", "month", name="uix_user_cat_month"),
+    )
+    Table(
+        "savings_start", metadata,
+        Column("id", Integer, primary_key=True),
+        Column("user_id", Integer, ForeignKey("users.id"), nullable=False),
+        Column("month", String(7), nullable=False),
+        Column("amount", Numeric(12, 2), nullable=False),
+        UniqueConstraint("user_id", "month", name="uix_user_month_savings"),
+    )
+    metadata.create_all(conn)
+
+
+def add_transaction_date_indexes(conn):
+    """(user_id, date) and (user_id, category_id, date) for month range scans."""
+    _ensure_index(conn, "transactions", "ix_transactions_user_date", "user_id", "date")
+    _ensure_index(conn, "transactions", "ix_transactions_user_cat_date", "user_id", "category_id", "date")
+
+
+def add_user_data_version(conn):
+    """users.data_version, the cache-busting counter for per-user views."""
+    _ensure_column(conn, "users", Column("data_version", Integer, nullable=False, server_default="0"))
+
+
+def add_transaction_import_hash(conn):
+    """transactions.import_hash plus its (user_id, import_hash) unique index."""
+    _ensure_column(conn, "transactions", Column("import_hash", String(64), nullable=True))
+    _ensure_index(conn, "transactions", "uix_transactions_user_import_hash", "user_id", "import_hash", unique=True)
+
+
+def backfill_rollups_and_savings(conn):
+    """The rollup and savings-series tables, populated for data that predates them."""
+    metadata = _existing_tables(conn, "users", "categories")
+    Table(
+        "monthly_category_totals", metadata,
+        Column("id", Integer, primary_key=True),
+        Column("user_id", Integer, ForeignKey("users.id"), nullable=False),
+        Column("month", String(7), nullable=False),
+        Column("category_id", Integer, ForeignKey("categories.id"), nullable=False),
+        Column("type", String(10), nullable=False),
+        Column("total", Numeric(14, 2), nullable=False),
+        Column("count", Integer, nullable=False),
+        UniqueConstraint("user_id", "month", "category_id", "type", name="uix_user_month_cat_type"),
+    )
+    Table(
+        "monthly_savings_balances", metadata,
+        Column("id", Integer, primary_key=True),
+        Column("user_id", Integer, ForeignKey("users.id"), nullable=False),
+        Column("month", String(7), nullable=False),
+        Column("income", Numeric(14, 2), nullable=False),
+        Column("expense", Numeric(14, 2), nullable=False),
+        Column("balance", Numeric(14, 2), nullable=False),
+        UniqueConstraint("user_id", "month", name="uix_user_month_balance"),
+    )
+    metadata.create_all(conn)
+
+    has_txns = conn.execute(select(Transaction.id).limit(1)).first()
+    if has_txns and not conn.execute(select(MonthlyCategoryTotal.id).limit(1)).first():
+        rollups.rebuild(conn)
+    if has_txns and not conn.execute(select(MonthlySavingsBalance.id).limit(1)).first():
+        for uid in conn.scalars(select(User.id)).all():
+            savings.rebuild(conn, uid)
+
+
+def add_user_directory(conn):
+    """user_directory (see app.shards), listing the existing users on the main shard."""
+    directory = Table(
+        "user_directory", MetaData(),
+        Column("user_id", Integer, primary_key=True),
+        Column("email", String(255), unique=True, nullable=False),
+        Column("shard", String(32), nullable=False, server_default="main", index=True),
+        Column("moving", Boolean, nullable=False, server_default="0"),
+    )
+    directory.create(conn, checkfirst=True)
+    if not conn.execute(select(directory.c.user_id).limit(1)).first():
+        conn.execute(insert(directory).from_select(
+            ["user_id", "email", "shard"], select(User.id, User.email, literal("main")),
+        ))
+
+
+MIGRATIONS = [
+    (1, create_base_schema),
+    (2, add_transaction_date_indexes),
+    (3, add_user_data_version),
+    (4, add_transaction_import_hash),
+    (5, backfill_rollups_and_savings),
+    (6, add_user_directory),
+]
+HEAD = MIGRATIONS[-1][0]
+
+# -------------------- runner --------------------
+
+
+def current_version(conn) -> int:
+    """Highest applied version; 0 when schema_version doesn't exist yet."""
+    if not inspect(conn).has_table(SchemaVersion.__tablename__):
+        return 0
+    return conn.scalar(select(func.max(SchemaVersion.version))) or 0
+
+
+@contextmanager
+def _migration_lock(engine):
+    """MySQL advisory lock so two concurrent upgrades can't interleave; no-op elsewhere."""
+    if engine.dialect.name != "mysql":
+        yield
+        return
+    with engine.connect() as conn:
+        if conn.exec_driver_sql("SELECT GET_LOCK('bt_schema_lock', 300)").scalar() != 1:
+            raise RuntimeError("Timed out waiting for another migration to finish.")
+        try:
+            yield
+        finally:
+            conn.exec_driver_sql("SELECT RELEASE_LOCK('bt_schema_lock')")
+
+
+def upgrade(engine, target: int = HEAD, log=print) -> int:
+    """Apply pending steps up to `target`; returns how many ran."""
+    with engine.begin() as conn:
+        SchemaVersion.__table__.create(conn, checkfirst=True)
+    applied = 0
+    with _migration_lock(engine):
+        with engine.connect() as conn:
+            current = current_version(conn)
+        for version, step in MIGRATIONS:
+            if version <= current or version > target:
+                continue
+            started = time.perf_counter()
+            with engine.begin() as conn:
+                step(conn)
+                conn.execute(insert(SchemaVersion).values(
+                    version=version, name=step.__name__, applied_at=datetime.now(timezone.utc),
+                ))
+            applied += 1
+            log(f"  {version:>3} {step.__name__} ({time.perf_counter() - started:.2f}s)")
+    return applied
+
+
+def require_current_schema(engine):
+    """Boot-time check for workers: one query, no DDL."""
+    with engine.connect() as conn:
+        version = current_version(conn)
+    if version < HEAD:
+        raise RuntimeError(
+            f"Database schema is at version {version}, this code needs {HEAD}. "
+            "Run `flask db upgrade` (or `python -m app.migrations upgrade`) first."
+        )
+
+
+def wait_for_database(engine, timeout: float = 60):
+    """Retry connecting while the database container is still starting."""
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            with engine.connect():
+                return
+        except exc.OperationalError:
+            if time.monotonic() >= deadline:
+                raise
+            time.sleep(1)
+
+# -------------------- CLI --------------------
+
+
+db_cli = AppGroup("db", help="Schema migrations.")
+
+
+@db_cli.command("upgrade")
+@click.option("--to", "target", type=int, default=HEAD, show_default=True, help="Stop at this version.")
+def upgrade_command(target):
+    """Apply pending migrations (every shard)."""
+    for name, engine in current_app.shards.engines.items():
+        if len(current_app.shards.engines) > 1:
+            click.echo(f"[{name}]")
+        _upgrade(engine, target)
+
+
+@db_cli.command("current")
+def current_command():
+    """Print the applied and latest schema versions."""
+    for name, engine in current_app.shards.engines.items():
+        with engine.connect() as conn:
+            click.echo(f"{name}: current: {current_version(conn)}  head: {HEAD}")
+
+
+def _upgrade(engine, target: int = HEAD, log=click.echo):
+    wait_for_database(engine)
+    with engine.connect() as conn:
+        before = current_version(conn)
+    log(f"Schema at version {before}, upgrading to {target}...")
+    n = upgrade(engine, target, log=log)
+    log(f"Applied {n} migration(s)." if n else "Already up to date.")
+
+
+if __name__ == "__main__":
+    # Pre-start step for containers: needs no app, just DATABASE_URL (and DATABASE_SHARD_URLS)
+    import sys
+    from .pool import database_url
+    from .shards import MAIN, shard_urls
+
+    if sys.argv[1:] not in (["upgrade"], ["current"]):
+        sys.exit("usage: python -m app.migrations upgrade|current")
+    urls = {MAIN: database_url(), **shard_urls()}
+    for name, url in urls.items():
+        engine = create_engine(url, future=True)
+        if sys.argv[1] == "upgrade":
+            if len(urls) > 1:
+                print(f"[{name}]")
+            _upgrade(engine)
+        else:
+            wait_for_database(engine)
+            with engine.connect() as conn:
+                print(f"{name}: current: {current_version(conn)}  head: {HEAD}")
+        engine.dispose()
@@ -1,12 +1,16 @@
+import hashlib
 from datetime import date
 from sqlalchemy import (
     Column,
     Integer,
     String,
+    Boolean,
     Date,
+    DateTime,
     Numeric,
     ForeignKey,
     UniqueConstraint,
+    Index,
 )
 from sqlalchemy.orm import declarative_base, relationship
 from werkzeug.security import generate_password_hash, check_password_hash
@@ -14,11 +18,18 @@ from flask_login import UserMixin
 
 Base = declarative_base()
 
+
+def password_fingerprint(password_hash: str) -> str:
+    """Short digest of the password hash; changes whenever the password does."""
+    return hashlib.sha256(password_hash.encode()).hexdigest()[:16]
+
 class User(Base, UserMixin):
     __tablename__ = "users"
     id = Column(Integer, primary_key=True)
     email = Column(String(255), unique=True, nullable=False)
     password_hash = Column(String(255), nullable=False)
+    # Bumped by every write route; cached per-user views are keyed by it (see app.cache)
+    data_version = Column(Integer, nullable=False, default=0, server_default="0")
 
     categories = relationship("Category", back_populates="user", cascade="all, delete-orphan")
     transactions = relationship("Transaction", back_populates="user", cascade="all, delete-orphan")
@@ -31,6 +42,10 @@ class User(Base, UserMixin):
     def check_password(self, password: str) -> bool:
         return check_password_hash(self.password_hash, password)
 
+    def get_id(self) -> str:
+        # Session ids carry the password fingerprint, so a password change logs out other sessions
+        return f"{self.id}:{password_fingerprint(self.password_hash)}"
+
 class Category(Base):
     __tablename__ = "categories"
     id = Column(Integer, primary_key=True)
@@ -55,10 +70,20 @@ class Transaction(Base):
     date = Column(Date, nullable=False, default=date.today)
     description = Column(String(255), nullable=True)
     type = Column(String(10), nullable=False, default="expense")  # "expense" or "income"
+    # sha256 identity of rows that came from a bank import (NULL for manual entries)
+    import_hash = Column(String(64), nullable=True)
 
     user = relationship("User", back_populates="transactions")
     category = relationship("Category", back_populates="transactions")
 
+    __table_args__ = (
+        # Month views filter on a date range per user (and per category)
+        Index("ix_transactions_user_date", "user_id", "date"),
+        Index("ix_transactions_user_cat_date", "user_id", "category_id", "date"),
+        # Import dedupe lookups; NULLs (manual entries) don't collide
+        Index("uix_transactions_user_import_hash", "user_id", "import_hash", unique=True),
+    )
+
 class Budget(Base):
     __tablename__ = "budgets"
     id = Column(Integer, primary_key=True)
@@ -89,3 +114,57 @@ class SavingsStart(Base):
         UniqueConstraint("user_id", "month", name="uix_user_month_savings"),
     )
 
+
+class MonthlyCategoryTotal(Base):
+    """
+    Pre-summed transactions per (user, month, category, type).
+    Kept in step with `transactions` by app.rollups on every write.
+    """
+    __tablename__ = "monthly_category_totals"
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    month = Column(String(7), nullable=False)  # YYYY-MM
+    category_id = Column(Integer, ForeignKey("categories.id"), nullable=False)
+    type = Column(String(10), nullable=False)  # "expense" or "income"
+    total = Column(Numeric(14, 2), nullable=False, default=0)
+    count = Column(Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        UniqueConstraint("user_id", "month", "category_id", "type", name="uix_user_month_cat_type"),
+    )
+
+class MonthlySavingsBalance(Base):
+    """
+    Running savings balance at the end of each month, maintained by app.savings.
+    A SavingsStart in a month resets the balance to its amount before that month's net.
+    """
+    __tablename__ = "monthly_savings_balances"
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    month = Column(String(7), nullable=False)  # YYYY-MM
+    income = Column(Numeric(14, 2), nullable=False, default=0)
+    expense = Column(Numeric(14, 2), nullable=False, default=0)
+    balance = Column(Numeric(14, 2), nullable=False, default=0)
+
+    __table_args__ = (
+        UniqueConstraint("user_id", "month", name="uix_user_month_balance"),
+    )
+
+class SchemaVersion(Base):
+    """One row per applied migration (see app.migrations)."""
+    __tablename__ = "schema_version"
+    version = Column(Integer, primary_key=True, autoincrement=False)
+    name = Column(String(128), nullable=False)
+    applied_at = Column(DateTime, nullable=False)
+
+class UserDirectory(Base):
+    """
+    Global email -> (user id, shard) map, read from the main database only
+    (see app.shards). User ids are allocated here so they are unique across shards.
+    """
+    __tablename__ = "user_directory"
+    user_id = Column(Integer, primary_key=True)
+    email = Column(String(255), unique=True, nullable=False)
+    shard = Column(String(32), nullable=False, default="main", server_default="main", index=True)
+    # Set by `flask shards move/rebalance` while the user's rows are copied
+    moving = Column(Boolean, nullable=False, default=False, server_default="0")
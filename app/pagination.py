@@ -0,0 +1,58 @@
+"""
+Keyset pagination for transaction lists ordered by (date DESC, id DESC).
+
+The cursor is the (date, id) of the last row on a page, base64url-encoded so
+clients treat it as opaque. Each page is a bounded index range scan, so page
+500 costs the same as page 1 (no OFFSET).
+"""
+import base64
+import binascii
+from datetime import date
+from sqlalchemy import and_, or_
+from .models import Transaction
+
+PAGE_SIZE = 50
+
+
+def encode_cursor(d: date, txn_id: int) -> str:
+    raw = f"{d.isoformat()}:{txn_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str | None) -> tuple[date, int] | None:
+    """Returns None for a missing or malformed cursor (treated as 'first page')."""
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        d, txn_id = raw.split(":", 1)
+        return date.fromisoformat(d), int(txn_id)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        return None
+
+
+def keyset_page(db, stmt, after: str | None = None, page_size: int = PAGE_SIZE):
+    """
+    Run `stmt` (a select whose first entity is Transaction) one page at a time.
+    Returns (rows, next_cursor); next_cursor is None on the last page.
+    """
+    pos = decode_cursor(after)
+    if pos:
+        d, txn_id = pos
+        stmt = stmt.where(
+            or_(
+                Transaction.date < d,
+                and_(Transaction.date == d, Transaction.id < txn_id),
+            )
+        )
+    # Fetch one extra row to learn whether another page exists
+    rows = db.execute(
+        stmt.order_by(Transaction.date.desc(), Transaction.id.desc()).limit(page_size + 1)
+    ).all()
+
+    next_cursor = None
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        last = rows[-1][0]
+        next_cursor = encode_cursor(last.date, last.id)
+    return rows, next_cursor
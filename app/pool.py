@@ -0,0 +1,235 @@
+"""
+SQLAlchemy engine/pool configuration and per-worker pool metrics.
+
+DATABASE_URL picks the database (SQLite file budget.db when unset). Pool
+settings come from the environment:
+
+    DB_POOL_SIZE       connections kept open (default: one per request a
+                       worker can run at once, see worker_pool_size())
+    DB_MAX_OVERFLOW    extra connections allowed under burst (default 10)
+    DB_POOL_TIMEOUT    seconds to wait for a free connection (default 30)
+    DB_POOL_RECYCLE    close connections older than this many seconds
+                       (default 1800, below MySQL's wait_timeout)
+    DB_POOL_PRE_PING   "1" (default): ping on checkout, pessimistic;
+                       "0": optimistic, rely on recycle + invalidate-on-error
+
+PoolStats separates time spent *getting* a connection (queue wait, connect,
+pre-ping) from time spent *running* statements, so a latency spike can be
+attributed to pool starvation or to slow queries. Numbers are per process
+and per engine (primary, each replica); /stats/pool shows the worker that
+served the request.
+"""
+import os
+import threading
+import time
+from collections import deque
+from sqlalchemy import create_engine, event, exc
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import QueuePool
+
+# Greenlets queue for a connection cooperatively; one per greenlet would swamp MySQL
+GEVENT_POOL_CAP = 10
+SAMPLES = 2048
+
+
+def database_url() -> str:
+    # Fallback for local dev
+    return os.getenv("DATABASE_URL") or "sqlite:///budget.db"
+
+
+def worker_pool_size() -> int | None:
+    """
+    DB connections one worker process needs: one per request it can run at
+    once. gunicorn.conf.py exports the resolved worker settings; None (the
+    SQLAlchemy default) outside gunicorn.
+    """
+    worker_class = os.getenv("GUNICORN_WORKER_CLASS")
+    if worker_class == "gthread":
+        return int(os.getenv("GUNICORN_THREADS", "1"))
+    if worker_class == "gevent":
+        return min(int(os.getenv("GUNICORN_WORKER_CONNECTIONS", "100")), GEVENT_POOL_CAP)
+    if worker_class == "sync":
+        return 1
+    return None
+
+
+def _flag(name: str, default: bool) -> bool:
+    raw = os.getenv(name)
+    if raw is None or raw == "":
+        return default
+    return raw.strip().lower() in ("1", "true", "yes", "on")
+
+
+def pool_config(database_url: str) -> dict:
+    """create_engine() kwargs for the configured pool ({} for in-memory SQLite)."""
+    url = make_url(database_url)
+    if url.get_backend_name() == "sqlite" and url.database in (None, "", ":memory:"):
+        return {}
+    size = os.getenv("DB_POOL_SIZE")
+    return {
+        "pool_size": int(size) if size else (worker_pool_size() or 5),
+        "max_overflow": int(os.getenv("DB_MAX_OVERFLOW", "10")),
+        "pool_timeout": float(os.getenv("DB_POOL_TIMEOUT", "30")),
+        "pool_recycle": int(os.getenv("DB_POOL_RECYCLE", "1800")),
+        "pool_pre_ping": _flag("DB_POOL_PRE_PING", True),
+    }
+
+# -------------------- metrics --------------------
+
+
+class Timings:
+    """Count/total/max plus a ring of recent samples for percentiles."""
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.recent = deque(maxlen=SAMPLES)
+
+    def add(self, seconds: float):
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+        self.recent.append(seconds)
+
+    def summary(self) -> dict:
+        ordered = sorted(self.recent)
+
+        def pct(p):
+            return round(ordered[min(len(ordered) - 1, int(p * len(ordered)))] * 1000, 3) if ordered else 0.0
+
+        return {
+            "count": self.count,
+            "total_ms": round(self.total * 1000, 3),
+            "avg_ms": round(self.total * 1000 / self.count, 3) if self.count else 0.0,
+            "max_ms": round(self.max * 1000, 3),
+            "p50_ms": pct(0.50),
+            "p95_ms": pct(0.95),
+            "p99_ms": pct(0.99),
+        }
+
+
+class PoolStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkout_wait = Timings()
+        self.queries = Timings()
+        self.timeouts = 0
+        self.connects = 0
+        self.closes = 0
+        self.invalidations = 0
+        self.soft_invalidations = 0
+        self.peak_in_use = 0
+        self.peak_overflow = 0
+
+    def record_checkout(self, seconds: float, in_use: int, overflow: int):
+        with self._lock:
+            self.checkout_wait.add(seconds)
+            self.peak_in_use = max(self.peak_in_use, in_use)
+            self.peak_overflow = max(self.peak_overflow, overflow)
+
+    def record_query(self, seconds: float):
+        with self._lock:
+            self.queries.add(seconds)
+
+    def incr(self, counter: str):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def snapshot(self, pool=None) -> dict:
+        with self._lock:
+            data = {
+                "checkout_wait": self.checkout_wait.summary(),
+                "queries": self.queries.summary(),
+                "timeouts": self.timeouts,
+                "connects": self.connects,
+                "closes": self.closes,
+                "invalidations": self.invalidations,
+                "soft_invalidations": self.soft_invalidations,
+                "peak_in_use": self.peak_in_use,
+                "peak_overflow": self.peak_overflow,
+            }
+        if isinstance(pool, QueuePool):
+            data.update({
+                "size": pool.size(),
+                "in_use": pool.checkedout(),
+                "idle": pool.checkedin(),
+                "overflow": max(pool.overflow(), 0),
+                "max_overflow": pool._max_overflow,
+                "timeout": pool.timeout(),
+            })
+        data["pid"] = os.getpid()
+        return data
+
+
+class InstrumentedQueuePool(QueuePool):
+    """
+    QueuePool that times connect(): queue wait + opening a connection +
+    pre-ping, i.e. everything before a statement can run. Subclassed per
+    engine by instrumented_pool_class(), which binds the engine's PoolStats
+    as a class attribute so the stats survive pool recreation.
+    """
+    stats: PoolStats = None
+
+    def connect(self):
+        started = time.perf_counter()
+        try:
+            conn = super().connect()
+        except exc.TimeoutError:
+            self.stats.incr("timeouts")
+            raise
+        self.stats.record_checkout(time.perf_counter() - started, self.checkedout(), max(self.overflow(), 0))
+        return conn
+
+
+def instrumented_pool_class(stats: PoolStats):
+    return type("InstrumentedQueuePool", (InstrumentedQueuePool,), {"stats": stats})
+
+
+def instrument_engine(engine, stats: PoolStats):
+    """Pool lifecycle counters and statement timing for one engine."""
+
+    @event.listens_for(engine, "connect")
+    def _connect(dbapi_conn, record):
+        stats.incr("connects")
+
+    @event.listens_for(engine, "close")
+    def _close(dbapi_conn, record):
+        stats.incr("closes")
+
+    @event.listens_for(engine, "invalidate")
+    def _invalidate(dbapi_conn, record, exception):
+        stats.incr("invalidations")
+
+    @event.listens_for(engine, "soft_invalidate")
+    def _soft_invalidate(dbapi_conn, record, exception):
+        stats.incr("soft_invalidations")
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info["query_started"].pop()
+        stats.record_query(time.perf_counter() - started)
+
+    @event.listens_for(engine, "handle_error")
+    def _error(context):
+        stack = context.connection.info.get("query_started") if context.connection else None
+        if stack:
+            stack.pop()
+
+
+def create_pool_engine(url: str, stats: PoolStats):
+    """create_engine() with the configured pool, its checkouts and statements timed into `stats`."""
+    kwargs = pool_config(url)
+    if kwargs:
+        kwargs["poolclass"] = instrumented_pool_class(stats)
+    engine = create_engine(url, future=True, **kwargs)
+    instrument_engine(engine, stats)
+    return engine
+
+
+pool_stats = PoolStats()
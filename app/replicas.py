@@ -0,0 +1,143 @@
+"""
+Read-replica routing.
+
+Set DATABASE_REPLICA_URLS (comma-separated SQLAlchemy URLs) to send the reads
+of views marked @read_only to a replica. Everything else stays on
+the primary DATABASE_URL:
+  - any request that isn't a GET/HEAD to a @read_only view;
+  - flushes and INSERT/UPDATE/DELETE statements, whichever view runs them;
+  - every request from a browser session for REPLICA_PIN_SECONDS (default 5)
+    after it wrote something, so the redirect after a quick-add, and the
+    pages right after it, read the user's own writes even if the replicas
+    lag behind.
+
+Each request sticks to one replica, picked round-robin among the healthy
+ones. A replica is probed with SELECT 1 at most every
+REPLICA_CHECK_SECONDS (default 5) when picked; one that fails is skipped
+for REPLICA_RETRY_SECONDS (default 30), and with none healthy the request
+reads from the primary. Without DATABASE_REPLICA_URLS the session behaves
+exactly like a plain Session bound to the primary.
+
+Replicas belong to the main database. A request whose user lives on another
+shard (see app.shards) sends everything to that shard.
+"""
+import os
+import threading
+import time
+from functools import wraps
+from flask import current_app, g, has_app_context, has_request_context, request, session
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.orm import Session
+
+PIN_KEY = "db_primary_until"
+PIN_SECONDS = float(os.getenv("REPLICA_PIN_SECONDS", "5"))
+CHECK_SECONDS = float(os.getenv("REPLICA_CHECK_SECONDS", "5"))
+RETRY_SECONDS = float(os.getenv("REPLICA_RETRY_SECONDS", "30"))
+
+
+def replica_urls() -> list[str]:
+    return [u.strip() for u in os.getenv("DATABASE_REPLICA_URLS", "").split(",") if u.strip()]
+
+
+def read_only(view):
+    """Mark a view as safe to serve from a replica on GET/HEAD."""
+    view.db_read_only = True
+    return view
+
+
+class ReplicaSet:
+    def __init__(self, engines: list, stats: list | None = None):
+        self.engines = engines
+        self.stats = stats or [None] * len(engines)  # app.pool.PoolStats per engine
+        self._lock = threading.Lock()
+        self._next = 0
+        self._checked = [0.0] * len(engines)
+        self._down_until = [0.0] * len(engines)
+        self.failures = [0] * len(engines)
+
+    def pick(self):
+        """Next healthy replica engine, round-robin; None when none is usable."""
+        for _ in range(len(self.engines)):
+            with self._lock:
+                i = self._next
+                self._next = (self._next + 1) % len(self.engines)
+                now = time.monotonic()
+                if self._down_until[i] > now:
+                    continue
+                probe = now - self._checked[i] >= CHECK_SECONDS
+                if probe:
+                    self._checked[i] = now
+            if probe and not self._healthy(i):
+                continue
+            return self.engines[i]
+        return None
+
+    def _healthy(self, i: int) -> bool:
+        try:
+            with self.engines[i].connect() as conn:
+                conn.execute(text("SELECT 1"))
+            return True
+        except DBAPIError:
+            with self._lock:
+                self._down_until[i] = time.monotonic() + RETRY_SECONDS
+                self.failures[i] += 1
+            return False
+
+    def status(self) -> list[dict]:
+        now = time.monotonic()
+        with self._lock:
+            status = [
+                {
+                    "url": engine.url.render_as_string(hide_password=True),
+                    "healthy": self._down_until[i] <= now,
+                    "failures": self.failures[i],
+                }
+                for i, engine in enumerate(self.engines)
+            ]
+        for entry, engine, stats in zip(status, self.engines, self.stats):
+            if stats is not None:
+                entry["pool"] = stats.snapshot(engine.pool)
+        return status
+
+
+class RoutingSession(Session):
+    """
+    Session bound to the shard of the request's user (g.db_shard, set by
+    app.shards.bind), whose reads go to the replica chosen for the request, if any.
+    """
+
+    def get_bind(self, mapper=None, clause=None, **kw):
+        shard = g.get("db_shard") if has_app_context() else None
+        if self._flushing or (clause is not None and getattr(clause, "is_dml", False)):
+            self.info["wrote"] = True
+            return shard if shard is not None else super().get_bind(mapper, clause=clause, **kw)
+        if shard is not None:
+            return shard
+        if has_request_context():
+            replica = g.get("db_replica")
+            if replica is not None:
+                return replica
+        return super().get_bind(mapper, clause=clause, **kw)
+
+
+def init_app(app, replicas: ReplicaSet | None):
+    app.replicas = replicas
+    if replicas is None:
+        return
+
+    @app.before_request
+    def _route_reads():
+        view = app.view_functions.get(request.endpoint)
+        if request.method not in ("GET", "HEAD") or not getattr(view, "db_read_only", False):
+            return
+        if session.get(PIN_KEY, 0) > time.time():
+            return  # read-your-writes: this browser wrote moments ago
+        g.db_replica = replicas.pick()
+
+    @app.after_request
+    def _pin_after_write(response):
+        db_session = current_app.db_session
+        if db_session.registry.has() and db_session().info.pop("wrote", False):
+            session[PIN_KEY] = time.time() + PIN_SECONDS
+        return response
@@ -0,0 +1,177 @@
+"""
+Monthly per-category rollups of the transactions table.
+
+Every route that inserts, edits or deletes a Transaction applies the matching
+delta here *before* it commits, so the rollup and the row change land in the
+same DB transaction. Read paths (dashboard, analytics, unbudgeted view) then
+sum a handful of rows instead of scanning a user's whole history.
+"""
+from decimal import Decimal
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from sqlalchemy import select, insert, update, delete, func, extract, and_
+from sqlalchemy.exc import IntegrityError
+from .models import User, Transaction, MonthlyCategoryTotal
+from .shards import bind, bind_user
+from .cache import bump_data_version
+from . import savings
+
+MCT = MonthlyCategoryTotal
+
+# -------------------- writes --------------------
+
+
+def month_of(d) -> str:
+    return d.strftime("%Y-%m")
+
+
+def _key(user_id: int, month: str, category_id: int, txn_type: str):
+    return and_(
+        MCT.user_id == user_id,
+        MCT.month == month,
+        MCT.category_id == category_id,
+        MCT.type == txn_type,
+    )
+
+
+def apply_delta(db, user_id: int, month: str, category_id: int, txn_type: str,
+                amount: Decimal, count: int):
+    """
+    Add (amount, count) to one rollup row, creating it if needed.
+    Rows whose count drops to zero are removed so empty months don't linger.
+    """
+    key = _key(user_id, month, category_id, txn_type)
+    bump = (
+        update(MCT)
+        .where(key)
+        .values(total=MCT.total + amount, count=MCT.count + count)
+        .execution_options(synchronize_session=False)
+    )
+    if db.execute(bump).rowcount == 0:
+        try:
+            # Savepoint so a concurrent insert of the same key doesn't poison the outer txn
+            with db.begin_nested():
+                db.execute(insert(MCT).values(
+                    user_id=user_id,
+                    month=month,
+                    category_id=category_id,
+                    type=txn_type,
+                    total=amount,
+                    count=count,
+                ))
+        except IntegrityError:
+            db.execute(bump)
+
+    if count < 0:
+        db.execute(
+            delete(MCT)
+            .where(and_(key, MCT.count <= 0))
+            .execution_options(synchronize_session=False)
+        )
+
+
+def add_transaction(db, txn: Transaction, sign: int = 1):
+    """Fold one transaction into the rollups (sign=-1 takes it back out)."""
+    amount = Decimal(str(txn.amount or 0))
+    apply_delta(db, txn.user_id, month_of(txn.date), txn.category_id, txn.type,
+                amount * sign, sign)
+
+
+def remove_transaction(db, txn: Transaction):
+    add_transaction(db, txn, sign=-1)
+
+# -------------------- reads --------------------
+
+
+def category_totals(db, user_id: int, month: str):
+    """
+    Return ({category_id: expense_total}, {category_id: income_total}) for a month.
+    """
+    rows = db.execute(
+        select(MCT.category_id, MCT.type, MCT.total)
+        .where(and_(MCT.user_id == user_id, MCT.month == month))
+    ).all()
+    expenses_by_cat: dict[int, Decimal] = {}
+    income_by_cat: dict[int, Decimal] = {}
+    for cid, txn_type, total in rows:
+        target = income_by_cat if txn_type == "income" else expenses_by_cat
+        target[cid] = target.get(cid, Decimal("0")) + Decimal(str(total or 0))
+    return expenses_by_cat, income_by_cat
+
+
+# -------------------- rebuild --------------------
+
+
+def rebuild(db, user_id: int | None = None) -> int:
+    """
+    Recompute rollups from the transactions table (all users, or just one).
+    Does not commit. Returns the number of rollup rows written.
+    """
+    wipe = delete(MCT).execution_options(synchronize_session=False)
+    if user_id is not None:
+        wipe = wipe.where(MCT.user_id == user_id)
+    db.execute(wipe)
+
+    y = extract("year", Transaction.date)
+    m = extract("month", Transaction.date)
+    stmt = (
+        select(
+            Transaction.user_id,
+            y,
+            m,
+            Transaction.category_id,
+            Transaction.type,
+            func.sum(Transaction.amount),
+            func.count(Transaction.id),
+        )
+        .group_by(Transaction.user_id, y, m, Transaction.category_id, Transaction.type)
+    )
+    if user_id is not None:
+        stmt = stmt.where(Transaction.user_id == user_id)
+
+    rows = [
+        {
+            "user_id": uid,
+            "month": f"{int(yy):04d}-{int(mm):02d}",
+            "category_id": cid,
+            "type": txn_type,
+            "total": Decimal(str(total or 0)),
+            "count": n,
+        }
+        for uid, yy, mm, cid, txn_type, total, n in db.execute(stmt)
+    ]
+    if rows:
+        db.execute(insert(MCT), rows)
+    return len(rows)
+
+
+rollups_cli = AppGroup("rollups", help="Maintain the monthly_category_totals table.")
+
+
+@rollups_cli.command("rebuild")
+@click.option("--user-id", type=int, default=None, help="Only rebuild this user.")
+def rebuild_command(user_id):
+    """
+    Backfill/repair rollups (and the savings series built on them) from the
+    transactions table, then bump each rebuilt user's data_version.
+    """
+    db = current_app.db_session
+    if user_id is not None:
+        bind_user(user_id)
+        engines = [None]
+    else:
+        engines = list(current_app.shards.engines.values())
+    n = users = 0
+    for engine in engines:
+        if engine is not None:
+            bind(engine)
+        n += rebuild(db, user_id)
+        user_ids = [user_id] if user_id is not None else db.scalars(select(User.id)).all()
+        for uid in user_ids:
+            savings.rebuild(db, uid)
+            bump_data_version(db, uid)  # cached dashboards and API ETags were built on the old rows
+        db.commit()
+        db.close()  # row ids repeat across shards; don't carry the identity map over
+        users += len(user_ids)
+    click.echo(f"Rebuilt {n} rollup rows and savings series for {users} user(s).")
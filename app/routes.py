@@ -1,8 +1,9 @@
+import json
 from datetime import date
 from decimal import Decimal
-from flask import Blueprint, render_template, redirect, url_for, flash, request, current_app
+from flask import Blueprint, render_template, redirect, url_for, flash, request, current_app, jsonify, Response, stream_with_context
 from flask_login import login_user, logout_user, login_required, current_user
-from sqlalchemy import select, func, and_, or_, case
+from sqlalchemy import select, func, and_, or_
 from .models import User, Category, Transaction, Budget, SavingsStart
 from .forms import (
     RegisterForm,
@@ -11,40 +12,29 @@ from .forms import (
     BudgetForm,
     CategoryForm,
     SavingsStartForm,
+    ImportForm,
+    MAX_BATCH_ROWS,
+    validate_transaction_rows,
 )
-from .utils import current_month_str
-import re
+from .utils import current_month_str, in_month, normalize_month, parse_month, month_span
+from . import rollups, savings
+from .pagination import keyset_page
+from .pool import pool_stats
+from .replicas import read_only
+from .shards import register_user, bind_email
+from .templating import fragment_cache
+from .cache import dashboard_cache, user_cache, forget_user, get_data_version, bump_data_version
+from .dashboard import dashboard_summary
+from .importer import iter_csv, iter_ofx, detect_format, import_batches, import_transactions, insert_batch, ImportFormatError
+from .exporter import export_query, iter_csv_rows, gzip_chunks
+from .analytics import analytics_series
+from .budgeting import budgets_for_month
 
 bp = Blueprint("core", __name__)
 
 # -------------------- helpers --------------------
 
 
-def normalize_month(m: str | None) -> str | None:
-    """
-    Normalize many representations into 'YYYY-MM':
-      - 'YYYY-M'
-      - 'YYYY-MM'
-      - 'YYYY-MM-DD' (or anything starting with YYYY-MM)
-    Returns None if blank/None.
-    """
-    if m is None:
-        return None
-    m = str(m).strip()
-    if not m:
-        return None
-
-    # If it starts with YYYY-MM, chop to first 7 chars
-    if re.match(r"^\d{4}-\d{2}", m):
-        return m[:7]
-
-    parts = m.split("-")
-    if len(parts) >= 2 and parts[0].isdigit() and parts[1].isdigit():
-        y = int(parts[0])
-        mm = int(parts[1])
-        return f"{y:04d}-{mm:02d}"
-    return m  # fallback (unusual formats)
-
 def make_months_options(start_from: str = "2025-07", months_back: int = 1, months_ahead: int = 12):
     """
     Build a list of YYYY-MM strings from max(start_from, (today - months_back))
@@ -70,53 +60,7 @@ def make_months_options(start_from: str = "2025-07", months_back: int = 1, month
     end = f"{end_y:04d}-{end_m:02d}"
 
     # iterate months from start to end (inclusive)
-    def next_month(ym: str) -> str:
-        yy, mm = int(ym[:4]), int(ym[5:7])
-        mm += 1
-        if mm == 13:
-            yy += 1
-            mm = 1
-        return f"{yy:04d}-{mm:02d}"
-
-    months = []
-    cur_ym = start
-    while cur_ym <= end:
-        months.append(cur_ym)
-        cur_ym = next_month(cur_ym)
-    return months
-
-def applicable_budgets_by_category(db, user_id: int, month: str):
-    """
-    For the given user & month, return a dict:
-      { category_id: (Budget, Category) }
-    Preference:
-      - One-time for the same month wins over recurring
-      - Else recurring
-    Also: if a one-time budget has a NULL/blank month, treat it as the selected month.
-    """
-    rows = db.execute(
-        select(Budget, Category)
-        .join(Category, Budget.category_id == Category.id)
-        .where(Budget.user_id == user_id)
-    ).all()
-
-    chosen: dict[int, tuple[Budget, Category, int]] = {}
-    for b, c in rows:
-        b_month_norm = normalize_month(b.month)
-        # NEW: if one-time and month is empty, treat as the currently selected month
-        assumed_month = b_month_norm or month
-        is_one_time_this_month = (b.recurrence != "monthly" and assumed_month == month)
-        is_recurring = (b.recurrence == "monthly")
-
-        if not (is_one_time_this_month or is_recurring):
-            continue
-
-        score = 2 if is_one_time_this_month else 1
-        prev = chosen.get(c.id)
-        if not prev or score > prev[2]:
-            chosen[c.id] = (b, c, score)
-
-    return {cid: (b, c) for cid, (b, c, _) in chosen.items()}
+    return month_span(start, end)
 
 # -------------------- Auth --------------------
 
@@ -132,19 +76,26 @@ def register():
     form = RegisterForm()
     if form.validate_on_submit():
         db = current_app.db_session
-        existing = db.scalar(select(User).where(User.email == form.email.data.lower()))
-        if existing:
+        email = form.email.data.lower()
+        # The global directory allocates the id and picks the shard (see app.shards)
+        user_id = register_user(email)
+        if user_id is None:
             flash("Email already registered.", "warning")
             return redirect(url_for("core.login"))
 
-        user = User(email=form.email.data.lower())
-        user.set_password(form.password.data)
-        db.add(user)
-        db.commit()
+        try:
+            user = User(id=user_id, email=email)
+            user.set_password(form.password.data)
+            db.add(user)
+            db.commit()
 
-        default_cat = Category(name="General", icon="tag", user_id=user.id)
-        db.add(default_cat)
-        db.commit()
+            default_cat = Category(name="General", icon="tag", user_id=user.id)
+            db.add(default_cat)
+            db.commit()
+        except Exception:
+            db.rollback()
+            current_app.shards.unregister(user_id)
+            raise
 
         flash("Account created. Please log in.", "success")
         return redirect(url_for("core.login"))
@@ -157,7 +108,8 @@ def login():
     form = LoginForm()
     if form.validate_on_submit():
         db = current_app.db_session
-        user = db.scalar(select(User).where(User.email == form.email.data.lower()))
+        user_id = bind_email(form.email.data.lower())
+        user = db.get(User, user_id) if user_id is not None else None
         if user and user.check_password(form.password.data):
             login_user(user)
             flash("Welcome back!", "success")
@@ -169,6 +121,7 @@ def login():
 @bp.route("/logout")
 @login_required
 def logout():
+    forget_user(current_user.id)
     logout_user()
     flash("Logged out.", "info")
     return redirect(url_for("core.login"))
@@ -179,149 +132,58 @@ def logout():
 
 
 @bp.route("/dashboard")
+@read_only
 @login_required
 def dashboard():
     db = current_app.db_session
 
     # month picker
-    month = normalize_month(request.args.get("month") or current_month_str())
+    month = parse_month(request.args.get("month")) or current_month_str()
     months_options = make_months_options(months_back=12, months_ahead=12)
 
-    # ---------- Budgets effective in this month ----------
-    # Monthly budgets always count; one-time count only for matching month
-    monthly_rows = db.execute(
-        select(Budget, Category)
-        .join(Category, Budget.category_id == Category.id)
-        .where(and_(Budget.user_id == current_user.id, Budget.recurrence == "monthly"))
-    ).all()
-
-    one_time_rows = db.execute(
-        select(Budget, Category)
-        .join(Category, Budget.category_id == Category.id)
-        .where(
-            and_(
-                Budget.user_id == current_user.id,
-                Budget.recurrence != "monthly",
-                Budget.month == month,
-            )
-        )
-    ).all()
-
-    # Build effective budget-by-category map (sum in case user sets more than one)
-    budget_by_cat: dict[int, Decimal] = {}
-    cat_name: dict[int, str] = {}
-
-    for b, c in monthly_rows + one_time_rows:
-        cat_name[c.id] = c.name
-        budget_by_cat[c.id] = budget_by_cat.get(c.id, Decimal("0")) + Decimal(str(b.amount or 0))
-
-    # ---------- Per-category net spend (expenses minus refunds recorded as income) ----------
-    # Sum EXPENSES for the month grouped by category
-    exp_rows = db.execute(
-        select(
-            Transaction.category_id,
-            func.coalesce(func.sum(Transaction.amount), 0)
-        ).where(
-            and_(
-                Transaction.user_id == current_user.id,
-                Transaction.type == "expense",
-                func.date_format(Transaction.date, "%Y-%m") == month,
-            )
-        ).group_by(Transaction.category_id)
-    ).all()
-    expenses_by_cat = {cid: Decimal(str(total)) for cid, total in exp_rows}
-
-    # Sum INCOME for the month grouped by category (used as refunds/offsets if same category)
-    inc_rows = db.execute(
-        select(
-            Transaction.category_id,
-            func.coalesce(func.sum(Transaction.amount), 0)
-        ).where(
-            and_(
-                Transaction.user_id == current_user.id,
-                Transaction.type == "income",
-                func.date_format(Transaction.date, "%Y-%m") == month,
-            )
-        ).group_by(Transaction.category_id)
-    ).all()
-    income_by_cat = {cid: Decimal(str(total)) for cid, total in inc_rows}
-
-    # Build dashboard cards for categories that actually have a budget
-    cards = []
-    for cid, budget_amt in budget_by_cat.items():
-        spent_net = expenses_by_cat.get(cid, Decimal("0")) - income_by_cat.get(cid, Decimal("0"))
-        if spent_net < 0:
-            spent_net = Decimal("0")  # don't go negative on the bar
-        pct = float((spent_net / budget_amt) * 100) if budget_amt > 0 else 0.0
-        pct = min(pct, 999.0)
-        cards.append({
-            "category_id": cid,
-            "category": cat_name.get(cid, "Unknown"),
-            "amount": f"{budget_amt:.2f}",
-            "spent": f"{spent_net:.2f}",
-            "percent": pct,
-        })
-    # Sort cards by category name for a stable display
-    cards.sort(key=lambda x: x["category"].lower())
-
-    # ---------- Unbudgeted expenses (net) ----------
-    # Anything with net spend > 0 in a category that has NO effective budget this month
-    unbudgeted_total = Decimal("0")
-    for cid, exp_total in expenses_by_cat.items():
-        if cid not in budget_by_cat:
-            net = exp_total - income_by_cat.get(cid, Decimal("0"))
-            if net > 0:
-                unbudgeted_total += net
-    unbudgeted_spent = f"{unbudgeted_total:.2f}"
-
-    # ---------- Income progress (Income vs Expenses) ----------
-    total_income = Decimal(str(sum(income_by_cat.values())))  # month total income
-    total_expense = Decimal(str(sum(expenses_by_cat.values())))  # month total expenses
-    if total_income > 0:
-        income_use_pct = float((total_expense / total_income) * 100)
-    else:
-        income_use_pct = 0.0
-    income_use_pct = min(income_use_pct, 999.0)
-    income_over = income_use_pct > 102.0
-
-    income_bar = {
-        "income": float(total_income),
-        "expenses": float(total_expense),
-        "percent": income_use_pct,
-        "over": income_over,
-    }
-
-    # ---------- Recent transactions ----------
-    txns = db.execute(
-        select(Transaction, Category)
-        .join(Category, Transaction.category_id == Category.id)
-        .where(Transaction.user_id == current_user.id)
-        .order_by(Transaction.date.desc(), Transaction.id.desc())
-        .limit(10)
-    ).all()
+    # ---------- Cached summary (cards, income bar, recent transactions, categories) ----------
+    cache_key = (current_user.id, month, get_data_version(db, current_user.id))
+    data = dashboard_cache.get(cache_key)
+    if data is None:
+        data = dashboard_summary(db, current_user.id, month)
+        dashboard_cache.set(cache_key, data)
 
-    # ---------- Quick-add form + categories ----------
+    # ---------- Quick-add form ----------
     qa_form = TransactionForm()
-    cats = db.execute(
-        select(Category).where(Category.user_id == current_user.id).order_by(Category.name)
-    ).scalars().all()
-    qa_form.category_id.choices = [(c.id, c.name) for c in cats]
+    qa_form.category_id.choices = [(c["id"], c["name"]) for c in data["cats"]]
 
     return render_template(
         "dashboard.html",
         month=month,
         months_options=months_options,
-        cards=cards,
-        txns=txns,
         qa_form=qa_form,
-        cats=cats,
-        unbudgeted_spent=unbudgeted_spent,
-        income_bar=income_bar,
-        total_income=float(total_income),  # kept for template convenience
+        **data,
     )
+
+@bp.route("/stats/cache")
+@login_required
+def cache_stats():
+    """Per-worker dashboard, login-identity and template fragment cache counters."""
+    return jsonify(dashboard=dashboard_cache.stats(), users=user_cache.stats(), fragments=fragment_cache.stats())
+
+@bp.route("/stats/pool")
+@login_required
+def pool_stats_view():
+    """
+    Per-worker pool state: compare checkout_wait with queries to tell pool
+    starvation (waits grow, in_use pinned at size + overflow) from slow SQL.
+    """
+    data = pool_stats.snapshot(current_app.engine.pool)
+    if current_app.replicas:
+        data["replicas"] = current_app.replicas.status()
+    if current_app.shards.others():
+        data["shards"] = current_app.shards.pool_status()
+    return jsonify(data)
+
 # -------------------- Transactions --------------------
 
 @bp.route("/transactions", methods=["GET", "POST"])
+@read_only
 @login_required
 def transactions():
     db = current_app.db_session
@@ -342,6 +204,9 @@ def transactions():
             type=form.type.data,
         )
         db.add(txn)
+        rollups.add_transaction(db, txn)
+        savings.refresh_from(db, current_user.id, rollups.month_of(txn.date))
+        bump_data_version(db, current_user.id)
         db.commit()
         flash("Transaction saved.", "success")
         referer = request.headers.get("Referer", "")
@@ -349,14 +214,179 @@ def transactions():
             return redirect(url_for("core.dashboard"))
         return redirect(url_for("core.transactions"))
 
-    q = db.execute(
+    # First page server-side; the rest streams in from transactions_page() as you scroll
+    txns, next_cursor = keyset_page(db, _transactions_query(current_user.id))
+
+    return render_template("transactions.html", form=form, txns=txns, next_cursor=next_cursor, cats=cats)
+
+@bp.route("/transactions/batch", methods=["POST"])
+@login_required
+def transactions_batch():
+    """
+    Quick-add several transactions at once. The dashboard modal posts one
+    category_id/amount/date/description/type value per row, in row order.
+    Rows are validated together and bulk-inserted in one commit (one
+    rollup/savings/data_version update), then a single dashboard render
+    follows. If any row is invalid, nothing is saved.
+    """
+    db = current_app.db_session
+    fields = ("category_id", "amount", "date", "description", "type")
+    columns = {f: request.form.getlist(f) for f in fields}
+    count = max(len(values) for values in columns.values())
+    if not count:
+        flash("Nothing to add.", "warning")
+        return redirect(url_for("core.dashboard"))
+    if count > MAX_BATCH_ROWS:
+        flash(f"At most {MAX_BATCH_ROWS} transactions at a time.", "danger")
+        return redirect(url_for("core.dashboard"))
+    records = [
+        {f: columns[f][i] if i < len(columns[f]) else None for f in fields}
+        for i in range(count)
+    ]
+
+    cats = db.execute(
+        select(Category.id, Category.name).where(Category.user_id == current_user.id)
+    ).all()
+    rows, errors = validate_transaction_rows(records, [(cid, name) for cid, name in cats])
+    if errors:
+        for i, field_errors in errors.items():
+            details = "; ".join(f"{field}: {', '.join(msgs)}" for field, msgs in field_errors.items())
+            flash(f"Row {i + 1}: {details}", "danger")
+        flash("Nothing was saved.", "warning")
+        return redirect(url_for("core.dashboard"))
+
+    for row in rows:
+        row["user_id"] = current_user.id
+    inserted = insert_batch(db, current_user.id, rows)
+    db.commit()
+    flash(f"{inserted} transaction{'s' if inserted != 1 else ''} saved.", "success")
+    return redirect(url_for("core.dashboard"))
+
+def _transactions_query(user_id: int):
+    return (
         select(Transaction, Category)
         .join(Category, Transaction.category_id == Category.id)
-        .where(Transaction.user_id == current_user.id)
-        .order_by(Transaction.date.desc(), Transaction.id.desc())
-    ).all()
+        .where(Transaction.user_id == user_id)
+    )
+
+@bp.route("/transactions/page")
+@read_only
+@login_required
+def transactions_page():
+    """
+    Next page of the transactions list for infinite scroll:
+    { "html": "<rendered rows>", "next": "<cursor or null>" }
+    """
+    db = current_app.db_session
+    txns, next_cursor = keyset_page(db, _transactions_query(current_user.id), request.args.get("after"))
+    return jsonify(
+        html=render_template("_transaction_rows.html", txns=txns),
+        next=next_cursor,
+    )
+
+@bp.route("/transactions/import", methods=["GET", "POST"])
+@login_required
+def transactions_import():
+    """
+    Upload form. A plain POST imports and redirects with a flashed summary.
+    The page's script posts with Accept: application/x-ndjson instead and
+    gets one JSON line per committed batch (running stats), then a last line
+    with "done" (or "error"), so it can show progress on large files.
+    """
+    db = current_app.db_session
+    wants_progress = request.accept_mimetypes.best == "application/x-ndjson"
+    cats = db.execute(
+        select(Category).where(Category.user_id == current_user.id).order_by(Category.name)
+    ).scalars().all()
+
+    form = ImportForm()
+    form.default_category_id.choices = [(c.id, c.name) for c in cats]
+
+    if form.validate_on_submit():
+        upload = form.file.data
+        if detect_format(upload.filename, form.format.data) == "ofx":
+            records = iter_ofx(upload.stream)
+        else:
+            mapping = {
+                "date": form.date_column.data,
+                "amount": form.amount_column.data,
+                "description": form.description_column.data,
+                "category": form.category_column.data,
+            }
+            records = iter_csv(upload.stream, mapping, form.date_format.data or None)
+        options = {
+            "negative_is_expense": not form.positive_is_expense.data,
+            "create_categories": form.create_categories.data,
+        }
+
+        if wants_progress:
+            batches = import_batches(db, current_user.id, records, form.default_category_id.data, **options)
+            return Response(stream_with_context(_import_progress(db, batches)), mimetype="application/x-ndjson")
+
+        try:
+            stats = import_transactions(db, current_user.id, records, form.default_category_id.data, **options)
+        except ImportFormatError as e:
+            db.rollback()
+            flash(str(e), "danger")
+            return render_template("transactions_import.html", form=form)
+
+        flash(
+            f"Imported {stats['inserted']} of {stats['rows']} rows in {stats['seconds']:.1f}s "
+            f"({stats['duplicates']} duplicates skipped, {stats['invalid']} invalid).",
+            "success" if not stats["invalid"] else "warning",
+        )
+        for err in stats["errors"]:
+            flash(err, "warning")
+        return redirect(url_for("core.transactions"))
+
+    if wants_progress and request.method == "POST":
+        errors = [err for errs in form.errors.values() for err in errs]
+        return Response(json.dumps({"error": " ".join(errors)}) + "\n", 400, mimetype="application/x-ndjson")
+    return render_template("transactions_import.html", form=form)
+
+
+def _import_progress(db, batches):
+    """NDJSON lines for transactions_import(): stats per batch, then done/error."""
+    stats = None
+    try:
+        for stats in batches:
+            yield json.dumps(stats) + "\n"
+    except ImportFormatError as e:
+        db.rollback()
+        yield json.dumps({"error": str(e)}) + "\n"
+        return
+    yield json.dumps({**stats, "done": True}) + "\n"
+
+@bp.route("/transactions/export.csv")
+@login_required
+def transactions_export():
+    """
+    Stream the user's transactions as CSV. Optional query args:
+    start / end (YYYY-MM-DD, inclusive), category_id, gzip=1.
+    """
+    db = current_app.db_session
+    try:
+        start = date.fromisoformat(request.args["start"]) if request.args.get("start") else None
+        end = date.fromisoformat(request.args["end"]) if request.args.get("end") else None
+    except ValueError:
+        flash("Dates must be YYYY-MM-DD.", "warning")
+        return redirect(url_for("core.transactions"))
+    category_id = request.args.get("category_id", type=int)
+
+    chunks = iter_csv_rows(db, export_query(current_user.id, start, end, category_id))
+    filename = f"transactions-{date.today().isoformat()}.csv"
+    if request.args.get("gzip") in ("1", "true", "on"):
+        chunks = gzip_chunks(chunks)
+        filename += ".gz"
+        mimetype = "application/gzip"
+    else:
+        mimetype = "text/csv"
 
-    return render_template("transactions.html", form=form, txns=q)
+    return Response(
+        stream_with_context(chunks),
+        mimetype=mimetype,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
 
 @bp.route("/transactions/edit/<int:txn_id>", methods=["GET", "POST"])
 @login_required
@@ -382,11 +412,16 @@ def transactions_edit(txn_id: int):
         form.description.data = txn.description or ""
 
     if form.validate_on_submit():
+        rollups.remove_transaction(db, txn)
+        old_month = rollups.month_of(txn.date)
         txn.type = form.type.data
         txn.category_id = form.category_id.data
         txn.amount = form.amount.data
         txn.date = form.date.data
         txn.description = form.description.data or ""
+        rollups.add_transaction(db, txn)
+        savings.refresh_from(db, current_user.id, old_month, rollups.month_of(txn.date))
+        bump_data_version(db, current_user.id)
         db.commit()
         flash("Transaction updated.", "success")
         return redirect(url_for("core.transactions"))
@@ -401,7 +436,10 @@ def transactions_delete(txn_id: int):
     if not txn or txn.user_id != current_user.id:
         flash("Transaction not found.", "warning")
         return redirect(url_for("core.transactions"))
+    rollups.remove_transaction(db, txn)
+    savings.refresh_from(db, current_user.id, rollups.month_of(txn.date))
     db.delete(txn)
+    bump_data_version(db, current_user.id)
     db.commit()
     flash("Transaction deleted.", "info")
     return redirect(url_for("core.transactions"))
@@ -410,6 +448,7 @@ def transactions_delete(txn_id: int):
 
 # ---- Budgets route (replace your existing budgets() with this) ----
 @bp.route("/budgets", methods=["GET", "POST"])
+@read_only
 @login_required
 def budgets():
     db = current_app.db_session
@@ -462,6 +501,7 @@ def budgets():
             db.add(b)
             flash("Budget added.", "success")
 
+        bump_data_version(db, current_user.id)
         db.commit()
         return redirect(url_for("core.budgets"))
 
@@ -527,6 +567,7 @@ def budgets_edit(budget_id: int):
         # Only allow changing month for one-time budgets
         if b.recurrence != "monthly":
             b.month = normalize_month(form.month.data or b.month or current_month_str())
+        bump_data_version(db, current_user.id)
         db.commit()
         flash("Budget updated.", "success")
         return redirect(url_for("core.budgets"))
@@ -547,6 +588,7 @@ def budgets_delete(budget_id: int):
         flash("Budget not found.", "warning")
         return redirect(url_for("core.budgets"))
     db.delete(b)
+    bump_data_version(db, current_user.id)
     db.commit()
     flash("Budget deleted.", "info")
     return redirect(url_for("core.budgets"))
@@ -577,6 +619,7 @@ def categories():
                     user_id=current_user.id,
                 )
             )
+            bump_data_version(db, current_user.id)
             db.commit()
             flash("Category added.", "success")
         return redirect(url_for("core.categories"))
@@ -615,6 +658,7 @@ def categories_edit(cat_id: int):
         else:
             cat.name = form.name.data.strip()
             cat.icon = form.icon.data or "tag"
+            bump_data_version(db, current_user.id)
             db.commit()
             flash("Category updated.", "success")
             return redirect(url_for("core.categories"))
@@ -652,6 +696,7 @@ def categories_delete(cat_id: int):
         return redirect(url_for("core.categories"))
 
     db.delete(cat)
+    bump_data_version(db, current_user.id)
     db.commit()
     flash("Category deleted.", "info")
     return redirect(url_for("core.categories"))
@@ -659,6 +704,7 @@ def categories_delete(cat_id: int):
 # -------------------- Analytics --------------------
 
 @bp.route("/analytics", methods=["GET", "POST"])
+@read_only
 @login_required
 def analytics():
     db = current_app.db_session
@@ -683,74 +729,28 @@ def analytics():
             )
             db.add(s)
             flash("Starting savings set.", "success")
+        db.flush()
+        savings.refresh_from(db, current_user.id, s.month)
+        bump_data_version(db, current_user.id)
         db.commit()
         return redirect(url_for("core.analytics"))
 
-    rows = db.execute(
-        select(
-            func.date_format(Transaction.date, "%Y-%m").label("m"),
-            func.sum(case((Transaction.type == "income", Transaction.amount), else_=0)).label("inc"),
-            func.sum(case((Transaction.type == "expense", Transaction.amount), else_=0)).label("exp"),
-        )
-        .where(Transaction.user_id == current_user.id)
-        .group_by("m")
-        .order_by("m")
-    ).all()
-
-    months = [r[0] for r in rows]
-    income = [float(r[1] or 0) for r in rows]
-    expenses = [float(r[2] or 0) for r in rows]
-
-    one_time_rows = db.execute(
-        select(Budget.month, func.sum(Budget.amount))
-        .where(and_(Budget.user_id == current_user.id, Budget.recurrence != "monthly"))
-        .group_by(Budget.month)
-    ).all()
-    one_time_map = {normalize_month(m): float(total or 0) for m, total in one_time_rows}
-
-    recurring_total = db.scalar(
-        select(func.coalesce(func.sum(Budget.amount), 0)).where(
-            and_(Budget.user_id == current_user.id, Budget.recurrence == "monthly")
-        )
-    )
-    recurring_total = float(recurring_total or 0)
-
-    budgeted = []
-    for m in months:
-        base = one_time_map.get(m, 0.0) + recurring_total
-        budgeted.append(round(base, 2))
-
-    seeds = {
-        normalize_month(s.month): float(s.amount)
-        for s in db.execute(
-            select(SavingsStart).where(SavingsStart.user_id == current_user.id)
-        ).scalars()
-    }
-    savings = []
-    running = 0.0
-    for i, m in enumerate(months):
-        if m in seeds:
-            running = seeds[m]
-        running += (income[i] - expenses[i])
-        savings.append(round(running, 2))
+    series = analytics_series(db, current_user.id)
 
     return render_template(
         "analytics.html",
         form=form,
-        months=months,
-        income=income,
-        expenses=expenses,
-        budgeted=budgeted,
-        savings=savings,
+        **series,
     )
 
 # -------------------- Category & Unbudgeted views --------------------
 
 @bp.route("/categories/<int:cat_id>/transactions")
+@read_only
 @login_required
 def category_transactions(cat_id: int):
     db = current_app.db_session
-    month = normalize_month(request.args.get("month")) or current_month_str()
+    month = parse_month(request.args.get("month")) or current_month_str()
     cat = db.get(Category, cat_id)
     if not cat or cat.user_id != current_user.id:
         flash("Category not found.", "warning")
@@ -762,7 +762,7 @@ def category_transactions(cat_id: int):
             and_(
                 Transaction.user_id == current_user.id,
                 Transaction.category_id == cat.id,
-                func.date_format(Transaction.date, "%Y-%m") == month,
+                in_month(Transaction.date, month),
             )
         )
         .order_by(Transaction.date.desc(), Transaction.id.desc())
@@ -781,30 +781,34 @@ def category_transactions(cat_id: int):
     )
 
 @bp.route("/unbudgeted/transactions")
+@read_only
 @login_required
 def unbudgeted_transactions():
     db = current_app.db_session
-    month = normalize_month(request.args.get("month")) or current_month_str()
+    month = parse_month(request.args.get("month")) or current_month_str()
 
-    by_cat = applicable_budgets_by_category(db, current_user.id, month)
-    budgeted_cat_ids = set(by_cat.keys())
+    budgeted_cat_ids = set(budgets_for_month(db, current_user.id, month))
 
-    filters = [
-        Transaction.user_id == current_user.id,
-        Transaction.type == "expense",
-        func.date_format(Transaction.date, "%Y-%m") == month,
-    ]
-    if budgeted_cat_ids:
-        filters.append(~Transaction.category_id.in_(budgeted_cat_ids))
+    # Which categories had spend this month, straight from the rollups
+    expenses_by_cat, _ = rollups.category_totals(db, current_user.id, month)
+    unbudgeted_cat_ids = [cid for cid in expenses_by_cat if cid not in budgeted_cat_ids]
+    total_unbudgeted = float(sum(expenses_by_cat[cid] for cid in unbudgeted_cat_ids))
 
-    txns = db.execute(
-        select(Transaction, Category)
-        .join(Category, Transaction.category_id == Category.id)
-        .where(and_(*filters))
-        .order_by(Transaction.date.desc(), Transaction.id.desc())
-    ).all()
-
-    total_unbudgeted = sum(float(t.amount) for t, _ in txns)
+    txns = []
+    if unbudgeted_cat_ids:
+        txns = db.execute(
+            select(Transaction, Category)
+            .join(Category, Transaction.category_id == Category.id)
+            .where(
+                and_(
+                    Transaction.user_id == current_user.id,
+                    Transaction.type == "expense",
+                    in_month(Transaction.date, month),
+                    Transaction.category_id.in_(unbudgeted_cat_ids),
+                )
+            )
+            .order_by(Transaction.date.desc(), Transaction.id.desc())
+        ).all()
 
     return render_template(
         "unbudgeted_transactions.html",
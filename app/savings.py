@@ -0,0 +1,107 @@
+"""
+Materialized running savings balance per user and month.
+
+balance(m) = (seed(m) if m has a SavingsStart else balance(previous month))
+             + income(m) - expense(m)
+
+A change in month M can only move balances from M up to the next seed after
+M, because the seed resets the running total. refresh_from() recomputes
+exactly that window from the rollups, so a backdated edit costs at most the
+distance to the next seed, not the user's whole history.
+"""
+from decimal import Decimal
+from sqlalchemy import select, insert, delete, func, and_, case
+from .models import SavingsStart, MonthlyCategoryTotal as MCT, MonthlySavingsBalance as MSB
+
+
+def _series_rows(db, user_id: int, first: str | None, stop: str | None):
+    """Per-month (income, expense) from the rollups and seeds in [first, stop)."""
+    month_filter = [MCT.user_id == user_id]
+    seed_filter = [SavingsStart.user_id == user_id]
+    if first:
+        month_filter.append(MCT.month >= first)
+        seed_filter.append(SavingsStart.month >= first)
+    if stop:
+        month_filter.append(MCT.month < stop)
+        seed_filter.append(SavingsStart.month < stop)
+
+    totals = {
+        m: (Decimal(str(inc or 0)), Decimal(str(exp or 0)))
+        for m, inc, exp in db.execute(
+            select(
+                MCT.month,
+                func.sum(case((MCT.type == "income", MCT.total), else_=0)),
+                func.sum(case((MCT.type == "expense", MCT.total), else_=0)),
+            )
+            .where(and_(*month_filter))
+            .group_by(MCT.month)
+        )
+    }
+    seeds = {
+        m: Decimal(str(amount))
+        for m, amount in db.execute(select(SavingsStart.month, SavingsStart.amount).where(and_(*seed_filter)))
+    }
+    return totals, seeds
+
+
+def _write(db, user_id: int, first: str | None, stop: str | None, opening: Decimal):
+    totals, seeds = _series_rows(db, user_id, first, stop)
+
+    wipe = delete(MSB).where(MSB.user_id == user_id).execution_options(synchronize_session=False)
+    if first:
+        wipe = wipe.where(MSB.month >= first)
+    if stop:
+        wipe = wipe.where(MSB.month < stop)
+    db.execute(wipe)
+
+    rows = []
+    running = opening
+    for m in sorted(set(totals) | set(seeds)):
+        inc, exp = totals.get(m, (Decimal("0"), Decimal("0")))
+        if m in seeds:
+            running = seeds[m]
+        running += inc - exp
+        rows.append({"user_id": user_id, "month": m, "income": inc, "expense": exp, "balance": running})
+    if rows:
+        db.execute(insert(MSB), rows)
+    return len(rows)
+
+
+def refresh_from(db, user_id: int, *months: str):
+    """
+    Recompute the series from each changed month up to (not including) the
+    next seed after it. Pass both months when a transaction moves, since a
+    seed in between would otherwise stop the first window short of the second.
+    Does not commit.
+    """
+    covered_until = None
+    for month in sorted(set(months)):
+        if covered_until is not None and (covered_until is True or month < covered_until):
+            continue  # already inside the previous window
+        next_seed = db.scalar(
+            select(func.min(SavingsStart.month)).where(
+                and_(SavingsStart.user_id == user_id, SavingsStart.month > month)
+            )
+        )
+        opening = db.scalar(
+            select(MSB.balance)
+            .where(and_(MSB.user_id == user_id, MSB.month < month))
+            .order_by(MSB.month.desc())
+            .limit(1)
+        )
+        _write(db, user_id, month, next_seed, Decimal(str(opening or 0)))
+        covered_until = next_seed or True
+
+
+def rebuild(db, user_id: int) -> int:
+    """Recompute a user's whole series. Does not commit."""
+    return _write(db, user_id, None, None, Decimal("0"))
+
+
+def balance_series(db, user_id: int):
+    """[(month, income, expense, balance)], oldest first."""
+    return db.execute(
+        select(MSB.month, MSB.income, MSB.expense, MSB.balance)
+        .where(MSB.user_id == user_id)
+        .order_by(MSB.month)
+    ).all()
@@ -0,0 +1,374 @@
+"""
+Horizontal sharding by user.
+
+Every table is keyed by user_id and no query spans two users, so each user's
+rows can live on a different database. DATABASE_SHARD_URLS adds shards as
+comma-separated name=url pairs:
+
+    DATABASE_SHARD_URLS="s2=mysql+pymysql://u:p@db2/budget,s3=mysql+pymysql://u:p@db3/budget"
+
+The DATABASE_URL database is always the shard named "main". It also holds
+user_directory, the global email -> (user id, shard) map:
+
+  - registration inserts the directory row first. That allocates the user id,
+    unique across shards, and records the shard a consistent-hash ring over
+    the shard names picks for the email; the users row and everything else
+    then go to that shard;
+  - login and API token requests find the email in the directory, then check
+    the password against the users row on the user's shard;
+  - requests from a logged-in user (session or bearer token) send every
+    statement of current_app.db_session to the shard that owns the user id.
+    Directory lookups are cached per process for SHARD_CACHE_TTL seconds
+    (default 10).
+
+The directory row decides where a user lives, not the ring, so adding a shard
+moves nobody until `flask shards rebalance` moves the users the ring now
+places elsewhere (`flask shards move USER_ID SHARD` moves one). A move marks
+the users as moving, waits SHARD_CACHE_TTL so no worker still routes to the
+old shard, copies each user's rows in one transaction on the new shard,
+points the directory at it and deletes the old rows. Requests for a user
+being moved get a 503 with Retry-After. Only user ids are global: moved
+categories, transactions and budgets get new ids on the new shard.
+
+Read replicas (app.replicas) serve the main shard only. Without
+DATABASE_SHARD_URLS there is one shard, and the directory costs one indexed
+lookup at registration and login.
+"""
+import bisect
+import hashlib
+import os
+import re
+import time
+import click
+from flask import current_app, g
+from flask.cli import AppGroup
+from sqlalchemy import delete, func, insert, select, update
+from sqlalchemy.exc import IntegrityError
+from werkzeug.exceptions import ServiceUnavailable
+from .cache import LRUCache
+from .models import Base, User, UserDirectory
+
+MAIN = "main"
+VNODES = 64
+CACHE_TTL = float(os.getenv("SHARD_CACHE_TTL", "10"))
+RETRY_AFTER = 30
+
+shard_cache = LRUCache(maxsize=int(os.getenv("SHARD_CACHE_SIZE", "4096")), ttl=CACHE_TTL)
+
+
+def shard_urls() -> dict[str, str]:
+    """{name: url} from DATABASE_SHARD_URLS; the main database is not included."""
+    urls = {}
+    for item in os.getenv("DATABASE_SHARD_URLS", "").split(","):
+        item = item.strip()
+        if not item:
+            continue
+        name, sep, url = item.partition("=")
+        if not sep or not re.fullmatch(r"[A-Za-z0-9_-]{1,32}", name) or name == MAIN or name in urls:
+            raise RuntimeError(f"DATABASE_SHARD_URLS: expected unique name=url pairs, got {item!r}")
+        urls[name] = url
+    return urls
+
+
+class UserMoving(ServiceUnavailable):
+    description = "Your data is being moved to another server. Please try again in a minute."
+
+    def __init__(self):
+        super().__init__(retry_after=RETRY_AFTER)
+
+
+def _hash(value: str) -> int:
+    return int.from_bytes(hashlib.md5(value.encode()).digest()[:8], "big")
+
+
+class HashRing:
+    """Consistent hashing over shard names, VNODES points per shard."""
+
+    def __init__(self, names, vnodes: int = VNODES):
+        points = sorted((_hash(f"{name}#{i}"), name) for name in names for i in range(vnodes))
+        self._points = [p for p, _ in points]
+        self._names = [name for _, name in points]
+
+    def node(self, key: str) -> str:
+        return self._names[bisect.bisect(self._points, _hash(key)) % len(self._points)]
+
+
+class ShardMap:
+    def __init__(self, engines: dict, stats: dict | None = None):
+        self.engines = engines  # name -> Engine, MAIN included
+        self.stats = stats or {}  # name -> app.pool.PoolStats
+        self.main = engines[MAIN]
+        self.ring = HashRing(engines)
+
+    def others(self) -> dict:
+        """{name: engine} for every shard but main."""
+        return {name: engine for name, engine in self.engines.items() if name != MAIN}
+
+    def pool_status(self) -> dict:
+        """Per-shard pool snapshots for /stats/pool."""
+        return {
+            name: self.stats[name].snapshot(engine.pool) if name in self.stats else {}
+            for name, engine in self.engines.items()
+        }
+
+    def engine(self, name: str):
+        try:
+            return self.engines[name]
+        except KeyError:
+            raise RuntimeError(f"Shard {name!r} is not configured in DATABASE_SHARD_URLS.") from None
+
+    def place(self, email: str) -> str:
+        """Shard the ring assigns to an email."""
+        return self.ring.node(email.lower())
+
+    def lookup(self, user_id: int | None = None, email: str | None = None):
+        """Directory row (user_id, shard, moving) by id or email, or None."""
+        where = UserDirectory.user_id == user_id if email is None else UserDirectory.email == email
+        with self.main.connect() as conn:
+            return conn.execute(
+                select(UserDirectory.user_id, UserDirectory.shard, UserDirectory.moving).where(where)
+            ).first()
+
+    def shard_of(self, user_id: int) -> str | None:
+        """Name of the user's shard (cached); raises UserMoving during a move."""
+        name = shard_cache.get(user_id)
+        if name is None:
+            row = self.lookup(user_id=user_id)
+            if row is None:
+                return None
+            if row.moving:
+                raise UserMoving()
+            name = row.shard
+            shard_cache.set(user_id, name)
+        return name
+
+    def register(self, email: str) -> tuple[int, str] | None:
+        """Allocate a user id for a new email; None if the email is taken."""
+        shard = self.place(email)
+        self.engine(shard)
+        try:
+            with self.main.begin() as conn:
+                user_id = conn.execute(
+                    insert(UserDirectory).values(email=email, shard=shard)
+                ).inserted_primary_key[0]
+        except IntegrityError:
+            return None
+        return user_id, shard
+
+    def unregister(self, user_id: int):
+        with self.main.begin() as conn:
+            conn.execute(delete(UserDirectory).where(UserDirectory.user_id == user_id))
+        shard_cache.pop(user_id)
+
+    def status(self) -> list[dict]:
+        with self.main.connect() as conn:
+            counts = dict(conn.execute(
+                select(UserDirectory.shard, func.count()).group_by(UserDirectory.shard)
+            ).all())
+        return [
+            {"name": name, "url": engine.url.render_as_string(hide_password=True), "users": counts.get(name, 0)}
+            for name, engine in self.engines.items()
+        ]
+
+# -------------------- request routing --------------------
+
+
+def bind(engine):
+    """Send current_app.db_session's statements to `engine` for the rest of the app context."""
+    g.db_shard = None if engine is current_app.engine else engine
+
+
+def bind_user(user_id: int) -> bool:
+    """Route the session to the user's shard; False (main shard) when the id is unknown."""
+    shards = current_app.shards
+    name = shards.shard_of(int(user_id))
+    bind(shards.engine(name or MAIN))
+    return name is not None
+
+
+def bind_email(email: str) -> int | None:
+    """Login lookup: route the session to the email's shard and return the user id."""
+    shards = current_app.shards
+    row = shards.lookup(email=email)
+    if row is None:
+        return None
+    if row.moving:
+        raise UserMoving()
+    shard_cache.set(row.user_id, row.shard)
+    bind(shards.engine(row.shard))
+    return row.user_id
+
+
+def register_user(email: str) -> int | None:
+    """New user id for `email`, with the session routed to its shard; None if the email is taken."""
+    registered = current_app.shards.register(email)
+    if registered is None:
+        return None
+    user_id, shard = registered
+    shard_cache.set(user_id, shard)
+    bind(current_app.shards.engine(shard))
+    return user_id
+
+# -------------------- moving users --------------------
+
+
+def user_tables() -> list:
+    """Tables holding a user's rows, parents first."""
+    return [
+        t for t in Base.metadata.sorted_tables
+        if t is User.__table__ or ("user_id" in t.c and t is not UserDirectory.__table__)
+    ]
+
+
+def _owned(table, user_id: int):
+    return table.c.id == user_id if table is User.__table__ else table.c.user_id == user_id
+
+
+def copy_user(src, dst, user_id: int) -> dict:
+    """
+    Copy one user's rows between two connections; row ids other than the user
+    id are reassigned on `dst` and foreign keys remapped. Rows the user
+    already has on `dst` (an interrupted earlier move) are replaced. Returns
+    {table name: rows copied}.
+    """
+    tables = user_tables()
+    users = User.__table__
+    new_ids = {fk.column.table: {} for t in tables for fk in t.foreign_keys if fk.column.table is not users}
+    for table in reversed(tables):
+        dst.execute(delete(table).where(_owned(table, user_id)))
+
+    counts = {}
+    for table in tables:
+        rows = [dict(r) for r in src.execute(select(table).where(_owned(table, user_id))).mappings()]
+        counts[table.name] = len(rows)
+        if not rows:
+            continue
+        if table is users:
+            # Other ids change, so cached views (keyed by data_version) must not survive the move
+            for r in rows:
+                r["data_version"] = (r["data_version"] or 0) + 1
+            dst.execute(insert(table), rows)
+            continue
+        for r in rows:
+            for fk in table.foreign_keys:
+                if fk.column.table in new_ids:
+                    r[fk.parent.name] = new_ids[fk.column.table][r[fk.parent.name]]
+        if table in new_ids:
+            for r in rows:
+                old = r.pop("id")
+                new_ids[table][old] = dst.execute(insert(table).values(r)).inserted_primary_key[0]
+        else:
+            for r in rows:
+                r.pop("id")
+            dst.execute(insert(table), rows)
+    return counts
+
+
+def _set_moving(shards: ShardMap, user_ids, moving: bool):
+    with shards.main.begin() as conn:
+        conn.execute(
+            update(UserDirectory).where(UserDirectory.user_id.in_(list(user_ids))).values(moving=moving)
+        )
+
+
+def move_users(shards: ShardMap, moves: dict, log=print, wait: float = CACHE_TTL) -> int:
+    """
+    Move users to other shards ({user id: shard name}); returns how many moved.
+    All of them are locked out for the `wait` (cached routes expiring) plus
+    their own copy; a user whose copy fails stays on the old shard.
+    """
+    for name in set(moves.values()):
+        shards.engine(name)
+    with shards.main.connect() as conn:
+        current = dict(conn.execute(
+            select(UserDirectory.user_id, UserDirectory.shard).where(UserDirectory.user_id.in_(list(moves)))
+        ).all())
+    unknown = set(moves) - set(current)
+    if unknown:
+        raise ValueError(f"Unknown user id(s): {', '.join(map(str, sorted(unknown)))}")
+    current = {uid: shard for uid, shard in current.items() if moves[uid] != shard}
+    if not current:
+        return 0
+
+    _set_moving(shards, current, True)
+    moved = 0
+    try:
+        time.sleep(wait)
+        for user_id, source in current.items():
+            target = moves[user_id]
+            started = time.perf_counter()
+            src, dst = shards.engine(source), shards.engine(target)
+            with src.connect() as src_conn, dst.begin() as dst_conn:
+                counts = copy_user(src_conn, dst_conn, user_id)
+            with shards.main.begin() as conn:
+                conn.execute(
+                    update(UserDirectory).where(UserDirectory.user_id == user_id).values(shard=target, moving=False)
+                )
+            shard_cache.pop(user_id)
+            with src.begin() as conn:
+                for table in reversed(user_tables()):
+                    conn.execute(delete(table).where(_owned(table, user_id)))
+            moved += 1
+            log(f"  user {user_id}: {source} -> {target}, {sum(counts.values())} rows "
+                f"({time.perf_counter() - started:.2f}s)")
+    finally:
+        _set_moving(shards, current, False)
+    return moved
+
+
+def rebalance_plan(shards: ShardMap) -> dict:
+    """{user id: shard} for every user the ring places somewhere other than where they are."""
+    with shards.main.connect() as conn:
+        rows = conn.execute(select(UserDirectory.user_id, UserDirectory.email, UserDirectory.shard)).all()
+    plan = {}
+    for user_id, email, shard in rows:
+        target = shards.place(email)
+        if target != shard:
+            plan[user_id] = target
+    return plan
+
+# -------------------- CLI --------------------
+
+
+shards_cli = AppGroup("shards", help="Where user data lives.")
+
+
+@shards_cli.command("status")
+def status_command():
+    """Users per shard."""
+    for s in current_app.shards.status():
+        click.echo(f"{s['name']:<16}{s['users']:>10}  {s['url']}")
+
+
+@shards_cli.command("move")
+@click.argument("user_id", type=int)
+@click.argument("shard")
+def move_command(user_id, shard):
+    """Move one user's rows to SHARD."""
+    try:
+        moved = move_users(current_app.shards, {user_id: shard}, log=click.echo)
+    except (ValueError, RuntimeError) as e:
+        raise click.ClickException(str(e))
+    if not moved:
+        click.echo(f"User {user_id} is already on {shard}.")
+
+
+@shards_cli.command("rebalance")
+@click.option("--dry-run", is_flag=True, help="Only print what would move.")
+@click.option("--batch-size", type=int, default=100, show_default=True,
+              help="Users locked out together per round (each round waits SHARD_CACHE_TTL once).")
+def rebalance_command(dry_run, batch_size):
+    """Move every user the hash ring places on another shard (after adding a shard)."""
+    shards = current_app.shards
+    plan = rebalance_plan(shards)
+    routes = {}
+    for user_id, target in plan.items():
+        routes[target] = routes.get(target, 0) + 1
+    click.echo(f"{len(plan)} user(s) to move" + "".join(f", {n} to {name}" for name, n in sorted(routes.items())))
+    if dry_run or not plan:
+        return
+    items = list(plan.items())
+    moved = 0
+    for i in range(0, len(items), batch_size):
+        moved += move_users(shards, dict(items[i:i + batch_size]), log=click.echo)
+    click.echo(f"Moved {moved} user(s).")
@@ -0,0 +1,150 @@
+"""
+Development SQL inspector.
+
+Enabled when the app runs in debug mode (`flask run --debug`) or with
+SQL_INSPECTOR=1; never installed otherwise. For every request it records
+each statement with its parameters and timing, then:
+
+- logs the statements and a one-line summary through app.logger;
+- flags N+1 patterns: the same statement run SQL_INSPECTOR_REPEAT (default 3)
+  or more times with different parameters, typically a lazy relationship
+  (Transaction.category, ...) loaded once per row in a template loop;
+- runs EXPLAIN (EXPLAIN QUERY PLAN on SQLite) for SELECTs slower than
+  SQL_INSPECTOR_SLOW_MS (default 100) and logs the plan;
+- adds an X-SQL-Inspector header (queries, time, N+1 groups, slow queries)
+  and, on HTML pages, a small overlay listing the findings.
+"""
+import os
+import time
+from flask import current_app, g, has_request_context, request
+from markupsafe import escape
+from sqlalchemy import event
+
+REPEAT = int(os.getenv("SQL_INSPECTOR_REPEAT", "3"))
+SLOW_MS = float(os.getenv("SQL_INSPECTOR_SLOW_MS", "100"))
+HEADER = "X-SQL-Inspector"
+
+
+def enabled(app) -> bool:
+    return app.debug or os.getenv("SQL_INSPECTOR", "").lower() in ("1", "true", "yes", "on")
+
+
+def init_app(app):
+    if not enabled(app):
+        return
+    if not app.debug:
+        app.logger.setLevel("INFO")
+    _instrument(app.engine)
+    for replica in app.replicas.engines if app.replicas else []:
+        _instrument(replica)
+    for shard in app.shards.others().values():
+        _instrument(shard)
+    app.after_request(_report)
+
+# -------------------- recording --------------------
+
+
+def _instrument(engine):
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("inspector_started", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["inspector_started"].pop()
+        if not has_request_context() or g.get("sql_inspector_explaining"):
+            return
+        g.setdefault("sql_inspector", []).append({
+            "statement": statement,
+            "parameters": parameters,
+            "engine": conn.engine,
+            "executemany": executemany,
+            "ms": elapsed * 1000,
+        })
+
+    @event.listens_for(engine, "handle_error")
+    def _error(context):
+        stack = context.connection.info.get("inspector_started") if context.connection else None
+        if stack:
+            stack.pop()
+
+# -------------------- analysis --------------------
+
+
+def find_repeats(queries: list, threshold: int = REPEAT) -> list:
+    """[(statement, count, total_ms)] for statements run >= threshold times with differing parameters."""
+    groups = {}
+    for q in queries:
+        if q["executemany"]:
+            continue
+        groups.setdefault(q["statement"], []).append(q)
+    repeats = []
+    for statement, runs in groups.items():
+        distinct = {repr(q["parameters"]) for q in runs}
+        if len(runs) >= threshold and len(distinct) > 1:
+            repeats.append((statement, len(runs), sum(q["ms"] for q in runs)))
+    return sorted(repeats, key=lambda r: r[1], reverse=True)
+
+
+def explain(engine, statement: str, parameters) -> list[str]:
+    """Query plan rows for a SELECT, as strings."""
+    prefix = "EXPLAIN QUERY PLAN " if engine.dialect.name == "sqlite" else "EXPLAIN "
+    g.sql_inspector_explaining = True
+    try:
+        with engine.connect() as conn:
+            rows = conn.exec_driver_sql(prefix + statement, parameters).fetchall()
+    except Exception as e:  # the plan is best effort; never break the page
+        return [f"EXPLAIN failed: {e}"]
+    finally:
+        g.sql_inspector_explaining = False
+    return [" | ".join(str(v) for v in row) for row in rows]
+
+
+def _report(response):
+    queries = g.pop("sql_inspector", [])
+    total_ms = sum(q["ms"] for q in queries)
+    repeats = find_repeats(queries)
+    slow = [q for q in queries if q["ms"] >= SLOW_MS]
+
+    log = current_app.logger
+    log.info("SQL %s %s: %d queries, %.1f ms", request.method, request.full_path.rstrip("?"), len(queries), total_ms)
+    for q in queries:
+        log.info("  %7.2f ms  %s  %r", q["ms"], " ".join(q["statement"].split()), q["parameters"])
+    for statement, count, ms in repeats:
+        log.warning("Possible N+1: %d x (%.1f ms) %s", count, ms, " ".join(statement.split()))
+    plans = []
+    for q in slow:
+        plan = explain(q["engine"], q["statement"], q["parameters"]) \
+            if q["statement"].lstrip().upper().startswith("SELECT") else []
+        plans.append((q, plan))
+        log.warning("Slow query (%.1f ms): %s", q["ms"], " ".join(q["statement"].split()))
+        for line in plan:
+            log.warning("    %s", line)
+
+    response.headers[HEADER] = (
+        f"queries={len(queries)}; time_ms={total_ms:.1f}; n_plus_one={len(repeats)}; slow={len(slow)}"
+    )
+    if response.mimetype == "text/html" and not response.direct_passthrough and not response.is_streamed:
+        body = response.get_data(as_text=True)
+        if "</body>" in body:
+            response.set_data(body.replace("</body>", _overlay(queries, total_ms, repeats, plans) + "</body>", 1))
+    return response
+
+
+def _overlay(queries, total_ms, repeats, plans) -> str:
+    flagged = bool(repeats or plans)
+    items = []
+    for statement, count, ms in repeats:
+        items.append(f"<li><b>N+1</b> {count}&times; ({ms:.1f} ms) <code>{escape(statement)}</code></li>")
+    for q, plan in plans:
+        plan_html = "".join(f"<div><code>{escape(line)}</code></div>" for line in plan)
+        items.append(f"<li><b>Slow</b> {q['ms']:.1f} ms <code>{escape(q['statement'])}</code>{plan_html}</li>")
+    details = f"<ul class=\"mb-0 ps-3\">{''.join(items)}</ul>" if items else ""
+    return (
+        '<details id="sql-inspector" class="position-fixed bottom-0 end-0 m-2 p-2 small border rounded '
+        f'shadow-sm {"bg-warning-subtle" if flagged else "bg-body"}" style="z-index:2000;max-width:40rem;'
+        'max-height:50vh;overflow:auto">'
+        f"<summary>SQL: {len(queries)} queries, {total_ms:.1f} ms"
+        f"{f', {len(repeats)} N+1' if repeats else ''}{f', {len(plans)} slow' if plans else ''}</summary>"
+        f"{details}</details>"
+    )
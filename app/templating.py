@@ -0,0 +1,100 @@
+"""
+Template compilation and fragment caching.
+
+Compiled templates are written to a FileSystemBytecodeCache in
+JINJA_CACHE_DIR (default: <tmp>/intellidollar-jinja), shared by every worker
+on the host, so a restarted worker loads bytecode instead of re-parsing
+base.html and friends. Entries are keyed by the template source checksum, so
+a deploy never serves stale bytecode. The file names also carry a hash of this
+module, since the code compiled for `{% cache %}` changes with the extension.
+
+`{% cache "name", key, ... %}...{% endcache %}` keeps the rendered markup of
+a block in a per-process LRU. The key always includes, in addition to the
+arguments given:
+  - the template and line, so two blocks never collide;
+  - the user id and data_version, so any write by the user (every write route
+    bumps it) makes their fragments unreachable, like app.cache's view cache.
+    The version comes from app.cache.get_data_version(), which the view
+    cache has usually already read in this request.
+Entries also expire after FRAGMENT_CACHE_TTL seconds (default 600).
+
+CSRF tokens never go into the cache: before a fragment is stored, the
+request's token is swapped for a per-process marker, and the marker is
+swapped for the current request's token whenever the fragment is served. So
+forms (the delete buttons in row loops) can live inside cached blocks, and
+the key and TTL don't depend on the CSRF session or WTF_CSRF_TIME_LIMIT.
+
+`{% cache shared "name", key, ... %}` leaves the user/version part out of
+the key, for markup that holds no user data (the navbar): one entry per key
+serves everybody and costs no data_version query.
+Fragment caching is off in debug mode, where templates reload on change.
+"""
+import hashlib
+import os
+import secrets
+import tempfile
+from flask import current_app, g
+from flask_login import current_user
+from flask_wtf.csrf import generate_csrf
+from jinja2 import FileSystemBytecodeCache, nodes
+from jinja2.ext import Extension
+from .cache import LRUCache, get_data_version
+
+fragment_cache = LRUCache(
+    maxsize=int(os.getenv("FRAGMENT_CACHE_SIZE", "2048")),
+    ttl=float(os.getenv("FRAGMENT_CACHE_TTL", "600")),
+)
+
+# Stands in for the CSRF token in stored fragments; random so page content can't forge it
+_CSRF_MARK = f"csrf-{secrets.token_hex(16)}"
+
+
+def init_app(app):
+    cache_dir = os.getenv("JINJA_CACHE_DIR") or os.path.join(tempfile.gettempdir(), "intellidollar-jinja")
+    os.makedirs(cache_dir, exist_ok=True)
+    with open(__file__, "rb") as fh:
+        extension_hash = hashlib.sha1(fh.read()).hexdigest()[:8]
+    app.jinja_env.bytecode_cache = FileSystemBytecodeCache(cache_dir, f"__jinja2_{extension_hash}_%s.cache")
+    app.jinja_env.add_extension(FragmentCacheExtension)
+
+
+def fragment_scope() -> tuple:
+    """(user id, data_version) for the current request."""
+    if not current_user.is_authenticated:
+        return None, None
+    return current_user.id, get_data_version(current_app.db_session, current_user.id)
+
+
+def _without_csrf(html):
+    token = g.get(current_app.config.get("WTF_CSRF_FIELD_NAME", "csrf_token"))
+    return html.replace(token, _CSRF_MARK) if token and token in html else html
+
+
+def _with_csrf(html):
+    return html.replace(_CSRF_MARK, generate_csrf()) if _CSRF_MARK in html else html
+
+
+class FragmentCacheExtension(Extension):
+    tags = {"cache"}
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        shared = parser.stream.skip_if("name:shared")
+        args = [nodes.Const(f"{parser.name}:{lineno}"), parser.parse_expression()]
+        while parser.stream.skip_if("comma"):
+            args.append(parser.parse_expression())
+        body = parser.parse_statements(("name:endcache",), drop_needle=True)
+        return nodes.CallBlock(
+            self.call_method("_render", [nodes.List(args), nodes.Const(shared)]), [], [], body
+        ).set_lineno(lineno)
+
+    def _render(self, keys, shared, caller):
+        if current_app.debug or not fragment_cache.maxsize:
+            return caller()
+        key = tuple(keys) if shared else (*fragment_scope(), *keys)
+        html = fragment_cache.get(key)
+        if html is not None:
+            return _with_csrf(html)
+        html = caller()
+        fragment_cache.set(key, _without_csrf(html))
+        return html
@@ -1,5 +1,79 @@
+import re
 from datetime import date
+from sqlalchemy import and_
 
 def current_month_str():
     return date.today().strftime("%Y-%m")
 
+def normalize_month(m: str | None) -> str | None:
+    """
+    Normalize many representations into 'YYYY-MM':
+      - 'YYYY-M'
+      - 'YYYY-MM'
+      - 'YYYY-MM-DD' (or anything starting with YYYY-MM)
+    Returns None if blank/None.
+    """
+    if m is None:
+        return None
+    m = str(m).strip()
+    if not m:
+        return None
+
+    # If it starts with YYYY-MM, chop to first 7 chars
+    if re.match(r"^\d{4}-\d{2}", m):
+        return m[:7]
+
+    parts = m.split("-")
+    if len(parts) >= 2 and parts[0].isdigit() and parts[1].isdigit():
+        y = int(parts[0])
+        mm = int(parts[1])
+        return f"{y:04d}-{mm:02d}"
+    return m  # fallback (unusual formats)
+
+def parse_month(m: str | None) -> str | None:
+    """
+    normalize_month(m) when that is a real month ('YYYY-MM', year 0001+,
+    month 01-12), else None. Use it on months taken from the request before
+    doing date arithmetic on them.
+    """
+    m = normalize_month(m)
+    if not m or not re.fullmatch(r"\d{4}-\d{2}", m):
+        return None
+    if int(m[:4]) < 1 or not 1 <= int(m[5:7]) <= 12:
+        return None
+    return m
+
+def month_range(month: str) -> tuple[date, date]:
+    """
+    'YYYY-MM' -> (first day of that month, first day of the next month).
+    """
+    y, m = int(month[:4]), int(month[5:7])
+    first = date(y, m, 1)
+    nxt = date(y + 1, 1, 1) if m == 12 else date(y, m + 1, 1)
+    return first, nxt
+
+def next_month(ym: str) -> str:
+    yy, mm = int(ym[:4]), int(ym[5:7])
+    mm += 1
+    if mm == 13:
+        yy += 1
+        mm = 1
+    return f"{yy:04d}-{mm:02d}"
+
+def month_span(first: str, last: str) -> list[str]:
+    """Every 'YYYY-MM' from first through last, inclusive."""
+    months = []
+    cur = first
+    while cur <= last:
+        months.append(cur)
+        cur = next_month(cur)
+    return months
+
+def in_month(column, month: str):
+    """
+    Half-open range predicate `first_day <= column < next_month_first_day`.
+    Unlike date_format(column) == month this leaves the column bare, so the
+    (user_id, date) indexes can serve it as a range scan.
+    """
+    first, nxt = month_range(month)
+    return and_(column >= first, column < nxt)
@@ -0,0 +1,15 @@
+import os
+import tempfile
+
+
+def prepare_database():
+    """Throwaway SQLite file unless DATABASE_URL is set, migrated to the latest schema."""
+    if not os.getenv("DATABASE_URL"):
+        os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(tempfile.mkdtemp(), "bench.db")
+    from sqlalchemy import create_engine
+    from app.migrations import upgrade
+    from app.pool import database_url
+
+    engine = create_engine(database_url(), future=True)
+    upgrade(engine, log=lambda line: None)
+    engine.dispose()
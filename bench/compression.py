@@ -0,0 +1,77 @@
+"""
+Bytes on the wire and CPU per response for each compression level.
+
+    python -m bench.compression [--years 3] [--per-month 60] [--repeat 20]
+
+Seeds a throwaway SQLite database (or DATABASE_URL) with one synthetic user's
+history (bench.synthetic), renders the heaviest pages once with compression
+off, then compresses each body at every gzip level and a spread of brotli
+qualities. CPU is
+time.process_time() per response, averaged over --repeat runs. Use it to pick
+COMPRESS_LEVEL / COMPRESS_BR_LEVEL.
+"""
+import argparse
+import time
+import uuid
+from bench import prepare_database
+
+GZIP_LEVELS = (1, 4, 6, 9)
+BROTLI_LEVELS = (1, 4, 5, 6, 9, 11)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--years", type=int, default=3)
+    parser.add_argument("--per-month", type=int, default=60)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    prepare_database()
+
+    from app import create_app
+    from app.compression import compress, brotli
+
+    from bench.synthetic import generate, PASSWORD
+
+    app = create_app()
+    app.config["WTF_CSRF_ENABLED"] = False
+    client = app.test_client()
+    with app.app_context():
+        email = generate(app.db_session, 1, args.years, args.per_month,
+                         email_prefix=f"bench-{uuid.uuid4().hex[:8]}")[0]["email"]
+    client.post("/login", data={"email": email, "password": PASSWORD})
+    token = client.post("/api/v1/auth/token", json={"email": email, "password": PASSWORD}).get_json()["token"]
+
+    pages = [
+        ("/dashboard", {}),
+        ("/transactions", {}),
+        ("/analytics", {}),
+        ("/api/v1/transactions?limit=200", {"Authorization": f"Bearer {token}"}),
+        ("/api/v1/analytics", {"Authorization": f"Bearer {token}"}),
+        ("/transactions/export.csv", {}),
+    ]
+    codings = [("gzip", lvl) for lvl in GZIP_LEVELS]
+    if brotli is not None:
+        codings += [("br", lvl) for lvl in BROTLI_LEVELS]
+    else:
+        print("Brotli not installed; gzip only.")
+
+    print(f"{'path':<32}{'coding':<9}{'bytes':>10}{'ratio':>8}{'cpu ms':>9}")
+    for path, headers in pages:
+        resp = client.get(path, headers=headers)  # test client sends no Accept-Encoding
+        assert resp.status_code == 200, (path, resp.status_code)
+        body = resp.get_data()
+        print(f"{path:<32}{'identity':<9}{len(body):>10}{1:>8.2f}{0:>9.3f}")
+        for encoding, level in codings:
+            gzip_level = level if encoding == "gzip" else 6
+            br_level = level if encoding == "br" else 4
+            started = time.process_time()
+            for _ in range(args.repeat):
+                out = compress(body, encoding, gzip_level, br_level)
+            cpu_ms = (time.process_time() - started) * 1000 / args.repeat
+            label = f"{encoding}-{level}"
+            print(f"{'':<32}{label:<9}{len(out):>10}{len(body) / len(out):>8.2f}{cpu_ms:>9.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""
+Throughput and latency of the gunicorn worker classes under a slow database.
+
+    python -m bench.gunicorn_modes [--modes sync,gthread,gevent] [--clients 32]
+                                   [--seconds 10] [--workers 2] [--sql-delay-ms 20]
+
+Starts gunicorn with gunicorn.conf.py once per mode, serving
+bench.slow_wsgi:app (every SQL statement sleeps --sql-delay-ms first), and
+has --clients keep-alive connections fetch /dashboard (cache disabled, so
+each request runs its queries) for --seconds. Uses DATABASE_URL if set,
+otherwise a throwaway SQLite file.
+"""
+import argparse
+import http.client
+import os
+import signal
+import statistics
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from bench import prepare_database
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def login_cookie(email: str, password: str) -> str:
+    """Session cookie minted in-process; valid in gunicorn since the secret is shared."""
+    from app import create_app
+    app = create_app()
+    app.config["WTF_CSRF_ENABLED"] = False
+    client = app.test_client()
+    client.post("/register", data={"email": email, "password": password, "confirm": password})
+    client.post("/login", data={"email": email, "password": password})
+    return f"session={client.get_cookie('session').value}"
+
+
+def wait_ready(port: int, timeout: float = 60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=2)
+            conn.request("GET", "/login")
+            conn.getresponse().read()
+            return
+        except OSError:
+            time.sleep(0.25)
+    raise RuntimeError("gunicorn did not come up")
+
+
+def drive(port: int, cookie: str, clients: int, seconds: float):
+    latencies, errors = [], [0]
+    lock = threading.Lock()
+    stop_at = time.monotonic() + seconds
+
+    def client():
+        conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+        mine = []
+        while time.monotonic() < stop_at:
+            started = time.perf_counter()
+            try:
+                conn.request("GET", "/dashboard", headers={"Cookie": cookie})
+                resp = conn.getresponse()
+                resp.read()
+                ok = resp.status == 200
+            except (OSError, http.client.HTTPException):
+                ok = False
+                conn.close()
+                conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+            if ok:
+                mine.append(time.perf_counter() - started)
+            else:
+                with lock:
+                    errors[0] += 1
+        with lock:
+            latencies.extend(mine)
+
+    threads = [threading.Thread(target=client) for _ in range(clients)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return latencies, errors[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--modes", default="sync,gthread,gevent")
+    parser.add_argument("--clients", type=int, default=32)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--sql-delay-ms", type=float, default=20)
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    prepare_database()
+    os.environ.setdefault("FLASK_SECRET_KEY", uuid.uuid4().hex)
+    cookie = login_cookie(f"bench-{uuid.uuid4().hex[:8]}@example.com", "benchpass")
+
+    print(f"{args.workers} workers, {args.clients} clients, {args.sql_delay_ms:g} ms per SQL statement")
+    print(f"{'mode':<10}{'req/s':>8}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'errors':>8}")
+    for mode in args.modes.split(","):
+        env = {
+            **os.environ,
+            "GUNICORN_WORKER_CLASS": mode,
+            "WEB_CONCURRENCY": str(args.workers),
+            "GUNICORN_THREADS": str(args.threads),
+            "GUNICORN_BIND": f"127.0.0.1:{args.port}",
+            "BENCH_SQL_DELAY_MS": str(args.sql_delay_ms),
+            "DASHBOARD_CACHE_SIZE": "0",
+        }
+        proc = subprocess.Popen(
+            [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "bench.slow_wsgi:app"],
+            cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        try:
+            wait_ready(args.port)
+            latencies, errors = drive(args.port, cookie, args.clients, args.seconds)
+        finally:
+            proc.send_signal(signal.SIGTERM)
+            proc.wait(30)
+        if not latencies:
+            print(f"{mode:<10}{'-':>8}{'-':>9}{'-':>9}{'-':>9}{errors:>8}")
+            continue
+        q = statistics.quantiles(latencies, n=100)
+        print(f"{mode:<10}{len(latencies) / args.seconds:>8.1f}{q[49] * 1000:>9.1f}"
+              f"{q[94] * 1000:>9.1f}{q[98] * 1000:>9.1f}{errors:>8}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,463 @@
+"""
+End-to-end load test: many logged-in users replaying a realistic mix against
+a running stack, with throughput, latency percentiles, errors and DB pool
+saturation.
+
+    python -m bench.loadtest [--users 50] [--seconds 30] [--warmup 5]
+                             [--workers 4] [--worker-class gthread] [--threads 4]
+                             [--pool-size N] [--max-overflow N] [--output report.json]
+    python -m bench.loadtest --url http://127.0.0.1:8000 ...
+
+By default it seeds DATABASE_URL (or a throwaway SQLite file) with
+bench.synthetic users, migrates it and starts gunicorn.conf.py locally with
+the given worker/pool settings. With --url it drives an already running
+stack instead; DATABASE_URL must then point at that stack's database so the
+synthetic users exist there. Use MySQL for numbers that matter: SQLite
+serializes writers across processes.
+
+Every virtual user is an asyncio task with its own keep-alive connection
+and session cookie. It logs in through the real /login form, then loops
+over MIX (dashboard, quick-add POSTs to /transactions, analytics, budget
+edits, ...) with no think time unless --think-ms is set. Requests during
+--warmup are not counted.
+
+Pool saturation comes from the app itself. /metrics gives the in-use and
+configured pool connections summed over live workers, and the report shows
+the share of samples where every pooled connection was busy. /stats/pool,
+sampled over time, gives each worker's checkout waits, timeouts and peak
+overflow. The HTTP client is a small asyncio HTTP/1.1 client, so nothing
+beyond the app's own requirements is needed.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import re
+import signal
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from datetime import date
+from urllib.parse import urlencode, urlsplit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CSRF_RE = re.compile(rb'name="csrf_token" type="hidden" value="([^"]+)"')
+
+# operation -> weight; roughly what a budgeting session looks like
+MIX = {
+    "dashboard": 45,
+    "analytics": 15,
+    "quick_add": 15,
+    "transactions": 10,
+    "budget_edit": 10,
+    "budgets": 5,
+}
+
+# -------------------- HTTP --------------------
+
+
+class HTTPError(Exception):
+    pass
+
+
+class Connection:
+    """One keep-alive HTTP/1.1 connection with a cookie jar; reconnects when the server closes it."""
+
+    def __init__(self, host: str, port: int, timeout: float = 30):
+        self.host, self.port, self.timeout = host, port, timeout
+        self.cookies: dict[str, str] = {}
+        self._reader = self._writer = None
+
+    async def close(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._reader = self._writer = None
+
+    async def request(self, method: str, path: str, form: dict | None = None,
+                      headers: dict | None = None) -> tuple[int, dict, bytes]:
+        body = urlencode(form).encode() if form is not None else b""
+        lines = [f"{method} {path} HTTP/1.1", f"Host: {self.host}:{self.port}", "Accept-Encoding: identity"]
+        if self.cookies:
+            lines.append("Cookie: " + "; ".join(f"{k}={v}" for k, v in self.cookies.items()))
+        if form is not None:
+            lines += ["Content-Type: application/x-www-form-urlencoded", f"Content-Length: {len(body)}"]
+        lines += [f"{k}: {v}" for k, v in (headers or {}).items()]
+        raw = ("\r\n".join(lines) + "\r\n\r\n").encode() + body
+
+        for attempt in (1, 2):
+            fresh = self._writer is None
+            if fresh:
+                self._reader, self._writer = await asyncio.wait_for(
+                    asyncio.open_connection(self.host, self.port), self.timeout)
+            try:
+                self._writer.write(raw)
+                await self._writer.drain()
+                return await asyncio.wait_for(self._read_response(), self.timeout)
+            except (ConnectionError, asyncio.IncompleteReadError):
+                await self.close()
+                if fresh or attempt == 2:  # a reused keep-alive socket may have been closed by the server
+                    raise
+            except BaseException:
+                await self.close()
+                raise
+
+    async def _read_response(self):
+        status_line = await self._reader.readuntil(b"\r\n")
+        status = int(status_line.split(b" ", 2)[1])
+        headers = {}
+        while True:
+            line = await self._reader.readuntil(b"\r\n")
+            if line == b"\r\n":
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            name, value = name.strip().lower(), value.strip()
+            if name == "set-cookie":
+                cookie, _, _ = value.partition(";")
+                k, _, v = cookie.partition("=")
+                self.cookies[k.strip()] = v.strip()
+            headers[name] = value
+
+        if headers.get("transfer-encoding", "").lower() == "chunked":
+            chunks = []
+            while True:
+                size = int((await self._reader.readuntil(b"\r\n")).split(b";")[0], 16)
+                if size == 0:
+                    await self._reader.readuntil(b"\r\n")
+                    break
+                chunks.append(await self._reader.readexactly(size))
+                await self._reader.readexactly(2)
+            data = b"".join(chunks)
+        elif "content-length" in headers:
+            data = await self._reader.readexactly(int(headers["content-length"]))
+        else:
+            data = await self._reader.read()
+            await self.close()
+        if headers.get("connection", "").lower() == "close":
+            await self.close()
+        return status, headers, data
+
+# -------------------- workload --------------------
+
+
+class VirtualUser:
+    def __init__(self, host: str, port: int, account: dict, password: str, rnd: random.Random):
+        self.conn = Connection(host, port)
+        self.account = account
+        self.password = password
+        self.rnd = rnd
+        self.csrf = None
+
+    async def login(self):
+        status, _, page = await self.conn.request("GET", "/login")
+        match = CSRF_RE.search(page)
+        if status != 200 or not match:
+            raise HTTPError(f"login page: {status}")
+        self.csrf = match.group(1).decode()
+        status, headers, _ = await self.conn.request("POST", "/login", form={
+            "csrf_token": self.csrf, "email": self.account["email"], "password": self.password,
+        })
+        if status != 302 or "/login" in headers.get("location", ""):
+            raise HTTPError(f"login failed for {self.account['email']}: {status}")
+
+    async def run(self, op: str) -> int:
+        """Perform one operation; returns the status, raises HTTPError when the result is wrong."""
+        if op == "quick_add":
+            status, headers, _ = await self.conn.request("POST", "/transactions", form={
+                "csrf_token": self.csrf,
+                "type": "expense",
+                "category_id": self.rnd.choice(self.account["categories"][2:]),
+                "amount": f"{self.rnd.randint(100, 15000) / 100:.2f}",
+                "date": date.today().isoformat(),
+                "description": "load test",
+            }, headers={"Referer": "/dashboard"})
+            return self._expect_redirect(status, headers)
+        if op == "budget_edit":
+            budget_id, category_id = self.rnd.choice(self.account["budgets"])
+            status, headers, _ = await self.conn.request("POST", f"/budgets/edit/{budget_id}", form={
+                "csrf_token": self.csrf,
+                "category_id": category_id,
+                "month": date.today().strftime("%Y-%m"),
+                "amount": f"{self.rnd.randint(100, 900)}.00",
+                "recurrence": "monthly",
+            })
+            return self._expect_redirect(status, headers)
+
+        path = {"dashboard": "/dashboard", "analytics": "/analytics",
+                "transactions": "/transactions", "budgets": "/budgets"}[op]
+        status, _, _ = await self.conn.request("GET", path)
+        if status != 200:
+            raise HTTPError(str(status))
+        return status
+
+    @staticmethod
+    def _expect_redirect(status: int, headers: dict) -> int:
+        # 200 means the form was re-rendered with errors; a redirect to /login means the session is gone
+        if status != 302 or "/login" in headers.get("location", ""):
+            raise HTTPError(f"{status} form rejected" if status == 200 else str(status))
+        return status
+
+
+class Recorder:
+    def __init__(self):
+        self.measuring = False
+        self.latencies: dict[str, list[float]] = {op: [] for op in MIX}
+        self.errors: dict[str, dict[str, int]] = {op: {} for op in MIX}
+
+    def ok(self, op: str, seconds: float):
+        if self.measuring:
+            self.latencies[op].append(seconds)
+
+    def error(self, op: str, kind: str):
+        if self.measuring:
+            self.errors[op][kind] = self.errors[op].get(kind, 0) + 1
+
+
+async def user_loop(user: VirtualUser, recorder: Recorder, stop_at: float, think: float):
+    ops, weights = list(MIX), list(MIX.values())
+    while time.monotonic() < stop_at:
+        op = user.rnd.choices(ops, weights)[0]
+        started = time.perf_counter()
+        try:
+            await user.run(op)
+            recorder.ok(op, time.perf_counter() - started)
+        except HTTPError as e:
+            recorder.error(op, str(e))
+        except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError, ValueError) as e:
+            recorder.error(op, type(e).__name__)
+        if think:
+            await asyncio.sleep(user.rnd.expovariate(1 / think))
+    await user.conn.close()
+
+# -------------------- pool sampling --------------------
+
+
+def parse_metric(text: str, name: str) -> float | None:
+    for line in text.splitlines():
+        if line.startswith(name + " ") or line.startswith(name + "{"):
+            return float(line.rsplit(" ", 1)[1])
+    return None
+
+
+async def sample_pool(monitor: VirtualUser, recorder: Recorder, stop_at: float, interval: float, samples: list,
+                      workers: dict):
+    headers = {"Authorization": f"Bearer {os.environ['METRICS_TOKEN']}"} if os.getenv("METRICS_TOKEN") else {}
+    while time.monotonic() < stop_at:
+        try:
+            status, _, body = await monitor.conn.request("GET", "/metrics", headers=headers)
+            if status == 200 and recorder.measuring:
+                text = body.decode()
+                in_use = parse_metric(text, 'db_pool_connections_in_use{engine="primary"}')
+                size = parse_metric(text, 'db_pool_size{engine="primary"}')
+                if in_use is not None and size is not None:
+                    samples.append((in_use, size))
+            # New connection each time so the samples spread over the workers
+            status, _, body = await monitor.conn.request("GET", "/stats/pool", headers={"Connection": "close"})
+            if status == 200:
+                snap = json.loads(body)
+                workers[snap["pid"]] = snap  # counters are cumulative; keep each worker's latest
+        except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError, ValueError):
+            pass
+        await asyncio.sleep(interval)
+    await monitor.conn.close()
+
+# -------------------- driver --------------------
+
+
+async def drive(host: str, port: int, accounts: list, password: str, args) -> dict:
+    rnd = random.Random(args.seed)
+    users = [VirtualUser(host, port, accounts[i % len(accounts)], password, random.Random(rnd.random()))
+             for i in range(args.users)]
+    monitor = VirtualUser(host, port, accounts[0], password, random.Random(0))
+    login_started = time.perf_counter()
+    await asyncio.gather(*(u.login() for u in users + [monitor]))
+    login_seconds = time.perf_counter() - login_started
+
+    recorder = Recorder()
+    samples, workers = [], {}
+    stop_at = time.monotonic() + args.warmup + args.seconds
+
+    async def start_measuring():
+        await asyncio.sleep(args.warmup)
+        recorder.measuring = True
+
+    await asyncio.gather(
+        start_measuring(),
+        sample_pool(monitor, recorder, stop_at, args.sample_interval, samples, workers),
+        *(user_loop(u, recorder, stop_at, args.think_ms / 1000) for u in users),
+    )
+    return report(recorder, samples, workers, login_seconds, args)
+
+
+def summarize(latencies: list[float], errors: int, seconds: float) -> dict:
+    total = len(latencies) + errors
+    out = {
+        "requests": total,
+        "ok": len(latencies),
+        "errors": errors,
+        "error_rate": round(errors / total, 4) if total else 0.0,
+        "rps": round(len(latencies) / seconds, 2),
+    }
+    if len(latencies) >= 2:
+        q = statistics.quantiles(latencies, n=100)
+        out.update({"p50_ms": round(q[49] * 1000, 2), "p95_ms": round(q[94] * 1000, 2),
+                    "p99_ms": round(q[98] * 1000, 2), "max_ms": round(max(latencies) * 1000, 2)})
+    return out
+
+
+def report(recorder: Recorder, samples: list, workers: dict, login_seconds: float, args) -> dict:
+    operations = {
+        op: {**summarize(recorder.latencies[op], sum(recorder.errors[op].values()), args.seconds),
+             "error_kinds": recorder.errors[op]}
+        for op in MIX
+    }
+    all_latencies = [s for op in MIX for s in recorder.latencies[op]]
+    all_errors = sum(sum(e.values()) for e in recorder.errors.values())
+    pool = {
+        "samples": len(samples),
+        "max_in_use": max((s[0] for s in samples), default=None),
+        "size": samples[-1][1] if samples else None,
+        "saturated_share": round(sum(1 for in_use, size in samples if size and in_use >= size) / len(samples), 3)
+        if samples else None,
+        "workers": {
+            str(pid): {
+                "checkout_wait_p95_ms": snap["checkout_wait"]["p95_ms"],
+                "checkout_wait_max_ms": snap["checkout_wait"]["max_ms"],
+                "query_p95_ms": snap["queries"]["p95_ms"],
+                "timeouts": snap["timeouts"],
+                "peak_in_use": snap["peak_in_use"],
+                "peak_overflow": snap["peak_overflow"],
+                "size": snap.get("size"),
+                "max_overflow": snap.get("max_overflow"),
+            }
+            for pid, snap in sorted(workers.items())
+        },
+    }
+    return {
+        "config": {k: getattr(args, k) for k in ("users", "seconds", "warmup", "think_ms", "workers",
+                                                 "worker_class", "threads", "pool_size", "max_overflow", "url")},
+        "login_seconds": round(login_seconds, 2),
+        "total": summarize(all_latencies, all_errors, args.seconds),
+        "operations": operations,
+        "pool": pool,
+    }
+
+
+def print_report(data: dict):
+    def row(name, s):
+        return (f"{name:<14}{s['requests']:>9}{s['rps']:>9.1f}{s.get('p50_ms', 0):>9.1f}{s.get('p95_ms', 0):>9.1f}"
+                f"{s.get('p99_ms', 0):>9.1f}{s['error_rate'] * 100:>8.2f}%")
+
+    print(f"{'operation':<14}{'requests':>9}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'errors':>9}")
+    for op, s in data["operations"].items():
+        print(row(op, s))
+        for kind, n in sorted(s["error_kinds"].items(), key=lambda kv: -kv[1])[:3]:
+            print(f"{'':<16}{n} x {kind}")
+    print(row("total", data["total"]))
+
+    pool = data["pool"]
+    if pool["samples"]:
+        print(f"\npool (all workers): max in use {pool['max_in_use']:g} of {pool['size']:g}, "
+              f"saturated in {pool['saturated_share'] * 100:.0f}% of {pool['samples']} samples")
+    for pid, w in pool["workers"].items():
+        print(f"  worker {pid}: checkout wait p95 {w['checkout_wait_p95_ms']:.1f} ms "
+              f"(max {w['checkout_wait_max_ms']:.1f}), query p95 {w['query_p95_ms']:.1f} ms, "
+              f"peak {w['peak_in_use']}/{w['size']} +{w['peak_overflow']} overflow, {w['timeouts']} timeouts")
+
+
+def start_stack(args, port: int):
+    env = {
+        **os.environ,
+        "GUNICORN_WORKER_CLASS": args.worker_class,
+        "WEB_CONCURRENCY": str(args.workers),
+        "GUNICORN_THREADS": str(args.threads),
+        "GUNICORN_BIND": f"127.0.0.1:{port}",
+        "PROMETHEUS_MULTIPROC_DIR": tempfile.mkdtemp(prefix="loadtest-metrics-"),
+    }
+    if args.pool_size is not None:
+        env["DB_POOL_SIZE"] = str(args.pool_size)
+    if args.max_overflow is not None:
+        env["DB_MAX_OVERFLOW"] = str(args.max_overflow)
+    return subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "wsgi:app"],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+
+
+async def wait_ready(host: str, port: int, timeout: float = 60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        conn = Connection(host, port, timeout=2)
+        try:
+            status, _, _ = await conn.request("GET", "/login")
+            if status == 200:
+                return
+        except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            await conn.close()
+        await asyncio.sleep(0.25)
+    raise RuntimeError("the app did not come up")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--url", help="Drive a running stack instead of starting gunicorn.")
+    parser.add_argument("--users", type=int, default=50, help="Concurrent virtual users.")
+    parser.add_argument("--accounts", type=int, default=10, help="Distinct synthetic accounts to spread them over.")
+    parser.add_argument("--years", type=int, default=2)
+    parser.add_argument("--seconds", type=float, default=30)
+    parser.add_argument("--warmup", type=float, default=5)
+    parser.add_argument("--think-ms", type=float, default=0)
+    parser.add_argument("--sample-interval", type=float, default=0.5)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--worker-class", default="gthread", choices=("gthread", "gevent", "sync"))
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--pool-size", type=int)
+    parser.add_argument("--max-overflow", type=int)
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="Also write the report as JSON here.")
+    args = parser.parse_args()
+
+    from bench import prepare_database
+    prepare_database()
+    os.environ.setdefault("FLASK_SECRET_KEY", uuid.uuid4().hex)
+
+    from app import create_app
+    from bench.synthetic import generate, PASSWORD
+
+    app = create_app()
+    with app.app_context():
+        accounts = generate(app.db_session, args.accounts, args.years, 40, args.seed,
+                            email_prefix=f"load-{uuid.uuid4().hex[:6]}")
+    app.engine.dispose()
+
+    proc = None
+    if args.url:
+        target = urlsplit(args.url)
+        host, port = target.hostname, target.port or 80
+    else:
+        host, port = "127.0.0.1", args.port
+        proc = start_stack(args, port)
+    try:
+        asyncio.run(wait_ready(host, port))
+        print(f"{args.users} users over {len(accounts)} accounts, {args.warmup:g}s warmup + {args.seconds:g}s"
+              + ("" if args.url else f", {args.workers} {args.worker_class} workers"), file=sys.stderr)
+        data = asyncio.run(drive(host, port, accounts, PASSWORD, args))
+    finally:
+        if proc is not None:
+            proc.send_signal(signal.SIGTERM)
+            proc.wait(30)
+
+    print_report(data)
+    if args.output:
+        with open(args.output, "w") as fh:
+            json.dump(data, fh, indent=2)
+
+
+if __name__ == "__main__":
+    main()
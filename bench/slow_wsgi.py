@@ -0,0 +1,15 @@
+"""
+wsgi:app with an artificial delay before every SQL statement, standing in
+for a slow MySQL. time.sleep is cooperative under gevent, like a socket wait.
+"""
+import os
+import time
+from sqlalchemy import event
+from wsgi import app
+
+DELAY = float(os.getenv("BENCH_SQL_DELAY_MS", "20")) / 1000
+
+
+@event.listens_for(app.engine, "before_cursor_execute")
+def _slow(conn, cursor, statement, parameters, context, executemany):
+    time.sleep(DELAY)
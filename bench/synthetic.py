@@ -0,0 +1,147 @@
+"""
+Seeded synthetic data: N users x M years of history.
+
+    python -m bench.synthetic [--users 10] [--years 3] [--per-month 60] [--seed 42]
+
+Each user gets a fixed set of categories, a monthly salary, rent and a
+spread of random expenses up to the current month, monthly budgets (raised
+once halfway through, as people do), a few one-time budgets and a starting
+savings seed. The same seed always produces the same rows, so benchmark runs
+against fresh databases are comparable. Inserts go through
+importer.insert_batch, so rollups and the savings series are populated the
+same way a real import does. Uses DATABASE_URL if set, otherwise a
+throwaway SQLite file (printed).
+"""
+import argparse
+import os
+import random
+import time
+from datetime import date
+from decimal import Decimal
+from bench import prepare_database
+
+PASSWORD = "benchpass"
+# (name, icon, monthly budget, typical spend range in cents); None budget = income
+CATEGORIES = [
+    ("Salary", "cash-coin", None, (600000, 900000)),
+    ("Rent", "house", Decimal("1500"), (150000, 150000)),
+    ("Groceries", "cart", Decimal("600"), (1500, 18000)),
+    ("Dining", "cup-hot", Decimal("250"), (800, 9000)),
+    ("Fuel", "fuel-pump", Decimal("200"), (2500, 7500)),
+    ("Utilities", "lightning", Decimal("180"), (4000, 16000)),
+    ("Fun", "controller", Decimal("150"), (500, 12000)),
+    ("Travel", "airplane", None, (5000, 40000)),
+]
+DESCRIPTIONS = ["Weekly shop", "Coffee", "Gas station", "Netflix", "Dinner out", "Pharmacy", "Hardware", ""]
+
+
+def months_back(years: int) -> list[tuple[int, int]]:
+    """(year, month) pairs for `years` years, oldest first, ending with the current month."""
+    today = date.today()
+    last = today.year * 12 + today.month - 1
+    return [divmod(n, 12) for n in range(last - years * 12 + 1, last + 1)]
+
+
+def generate(db, users: int = 10, years: int = 3, per_month: int = 60, seed: int = 42,
+             email_prefix: str = "synthetic", password: str = PASSWORD) -> list[dict]:
+    """
+    Create the users and their history; commits per user. Users are registered
+    in the shard directory like the register view does, so this needs an app
+    context (with app.app_context(): ...). Returns
+    [{"id", "email", "categories": [ids], "budgets": [(id, category_id) of monthly budgets], "transactions"}].
+    """
+    from werkzeug.security import generate_password_hash
+    from app.models import User, Category, Budget, SavingsStart
+    from app.importer import insert_batch
+    from app.shards import register_user
+
+    rnd = random.Random(seed)
+    password_hash = generate_password_hash(password)  # hashing is slow; every user shares it
+    months = months_back(years)
+    first_month = f"{months[0][0]:04d}-{months[0][1] + 1:02d}"
+    midpoint = months[len(months) // 2]
+    mid_month = f"{midpoint[0]:04d}-{midpoint[1] + 1:02d}"
+    created = []
+
+    for n in range(users):
+        email = f"{email_prefix}-{seed}-{n}@example.com"
+        user_id = register_user(email)  # routes db to the user's shard
+        if user_id is None:
+            raise ValueError(f"{email} already exists; use another seed or email prefix.")
+        user = User(id=user_id, email=email, password_hash=password_hash)
+        db.add(user)
+        db.flush()
+        cats = []
+        for name, icon, _, _ in CATEGORIES:
+            cat = Category(name=name, icon=icon, user_id=user.id)
+            db.add(cat)
+            cats.append(cat)
+        db.flush()
+
+        fixed = [(c, spec) for c, spec in zip(cats, CATEGORIES) if spec[0] in ("Salary", "Rent")]
+        spend_cats = [(c, spec) for c, spec in zip(cats, CATEGORIES) if spec[0] not in ("Salary", "Rent")]
+        rows = []
+        for y, m in months:
+            month_rows = [(cat, rnd.randint(low, high), name) for cat, (name, _, _, (low, high)) in fixed]
+            for _ in range(max(per_month - len(month_rows), 0)):
+                cat, (name, _, _, (low, high)) = rnd.choice(spend_cats)
+                month_rows.append((cat, rnd.randint(low, high), rnd.choice(DESCRIPTIONS)))
+            for cat, cents, description in month_rows:
+                rows.append({
+                    "user_id": user.id,
+                    "category_id": cat.id,
+                    "amount": Decimal(cents) / 100,
+                    "date": date(y, m + 1, rnd.randint(1, 28)),
+                    "description": description,
+                    "type": "income" if cat.name == "Salary" else "expense",
+                })
+        rows.sort(key=lambda r: r["date"])
+
+        monthly_budgets = []
+        for cat, (name, _, monthly, _) in zip(cats, CATEGORIES):
+            if monthly is None:
+                continue
+            monthly_budgets.append(Budget(user_id=user.id, category_id=cat.id, month=first_month,
+                                          amount=monthly, recurrence="monthly"))
+            monthly_budgets.append(Budget(user_id=user.id, category_id=cat.id, month=mid_month,
+                                          amount=monthly * Decimal("1.1"), recurrence="monthly"))
+        db.add_all(monthly_budgets)
+        travel = cats[[c[0] for c in CATEGORIES].index("Travel")]
+        for y, m in rnd.sample(months, min(3, len(months))):
+            db.add(Budget(user_id=user.id, category_id=travel.id, month=f"{y:04d}-{m + 1:02d}",
+                          amount=Decimal(rnd.randint(500, 3000)), recurrence="one_time"))
+        db.add(SavingsStart(user_id=user.id, month=first_month, amount=Decimal(rnd.randint(1000, 20000))))
+        db.flush()
+
+        insert_batch(db, user.id, rows)  # savings series refreshed from the seed month on
+        created.append({"id": user.id, "email": user.email, "categories": [c.id for c in cats],
+                        "budgets": [(b.id, b.category_id) for b in monthly_budgets], "transactions": len(rows)})
+        db.commit()
+        db.close()  # row ids repeat across shards; start the next user with an empty identity map
+    return created
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--users", type=int, default=10)
+    parser.add_argument("--years", type=int, default=3)
+    parser.add_argument("--per-month", type=int, default=60)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--email-prefix", default="synthetic")
+    args = parser.parse_args()
+
+    prepare_database()
+    from app import create_app
+
+    app = create_app()
+    started = time.perf_counter()
+    with app.app_context():
+        users = generate(app.db_session, args.users, args.years, args.per_month, args.seed, args.email_prefix)
+    total = sum(u["transactions"] for u in users)
+    print(f"{len(users)} users, {total} transactions in {time.perf_counter() - started:.1f}s "
+          f"({os.environ['DATABASE_URL']}); password {PASSWORD!r}")
+    print(f"first login: {users[0]['email']}" if users else "")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""
+Queries per authenticated request, with and without the login identity cache.
+
+    python -m bench.user_loader [--requests 200] [--path /dashboard]
+
+Uses DATABASE_URL if set, otherwise a throwaway SQLite file. "cold" clears
+the identity cache before every request, which is what the old
+db_session.get(User, ...) loader cost; "warm" is the steady state.
+"""
+import argparse
+import time
+import uuid
+from bench import prepare_database
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--path", action="append", help="Page to request (repeatable).")
+    args = parser.parse_args()
+    paths = args.path or ["/dashboard", "/transactions", "/budgets"]
+
+    prepare_database()
+
+    from sqlalchemy import event
+    from app import create_app
+    from app.cache import user_cache
+
+    app = create_app()
+    app.config["WTF_CSRF_ENABLED"] = False
+    client = app.test_client()
+    email = f"bench-{uuid.uuid4().hex[:8]}@example.com"
+    client.post("/register", data={"email": email, "password": "benchpass", "confirm": "benchpass"})
+    client.post("/login", data={"email": email, "password": "benchpass"})
+
+    statements = []
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(app.engine, "before_cursor_execute", count)
+    print(f"{'path':<16}{'mode':<6}{'queries/req':>12}{'users q/req':>12}{'ms/req':>9}")
+    for path in paths:
+        for mode in ("cold", "warm"):
+            client.get(path)  # warm template/statement caches so only the loader differs
+            statements.clear()
+            started = time.perf_counter()
+            for _ in range(args.requests):
+                if mode == "cold":
+                    user_cache.clear()
+                resp = client.get(path)
+                assert resp.status_code == 200, (path, resp.status_code)
+            elapsed = time.perf_counter() - started
+            users_q = sum(1 for s in statements if "FROM users" in s)
+            print(f"{path:<16}{mode:<6}{len(statements) / args.requests:>12.2f}"
+                  f"{users_q / args.requests:>12.2f}{elapsed * 1000 / args.requests:>9.2f}")
+    event.remove(app.engine, "before_cursor_execute", count)
+    print("user cache:", user_cache.stats())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""
+Gunicorn settings, driven by environment variables.
+
+    GUNICORN_WORKER_CLASS        gthread (default), gevent or sync
+    WEB_CONCURRENCY              worker processes (default: 2 x CPUs + 1, capped by GUNICORN_MAX_WORKERS)
+    GUNICORN_MAX_WORKERS         cap for the derived worker count (default 8)
+    GUNICORN_THREADS             threads per gthread worker (default 4)
+    GUNICORN_WORKER_CONNECTIONS  concurrent greenlets per gevent worker (default 100)
+    GUNICORN_MAX_REQUESTS        recycle a worker after this many requests (default 1000, 0 = never)
+    GUNICORN_MAX_REQUESTS_JITTER random extra requests so workers don't recycle together (default 100)
+    GUNICORN_KEEPALIVE           seconds to hold idle keep-alive connections (default 5)
+    GUNICORN_TIMEOUT             seconds before a silent worker is killed (default 30)
+    GUNICORN_BIND                default 0.0.0.0:8000
+    PROMETHEUS_MULTIPROC_DIR     where workers write /metrics samples (default: a fresh temp dir)
+
+The resolved worker class / threads / connections are written back to the
+environment, which workers inherit; app.pool sizes the SQLAlchemy pool
+from them, so the pool always matches the concurrency of one worker.
+"""
+import os
+import shutil
+import tempfile
+
+
+def _int(name: str, default: int) -> int:
+    return int(os.getenv(name) or default)
+
+
+def _cpu_count() -> int:
+    try:
+        return len(os.sched_getaffinity(0))  # respects CPU pinning/cpusets
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+worker_class = os.getenv("GUNICORN_WORKER_CLASS", "gthread")
+if worker_class not in ("gthread", "gevent", "sync"):
+    raise RuntimeError(f"Unsupported GUNICORN_WORKER_CLASS {worker_class!r} (use gthread, gevent or sync)")
+
+workers = _int("WEB_CONCURRENCY", min(2 * _cpu_count() + 1, _int("GUNICORN_MAX_WORKERS", 8)))
+threads = _int("GUNICORN_THREADS", 4) if worker_class == "gthread" else 1
+worker_connections = _int("GUNICORN_WORKER_CONNECTIONS", 100)
+
+max_requests = _int("GUNICORN_MAX_REQUESTS", 1000)
+max_requests_jitter = _int("GUNICORN_MAX_REQUESTS_JITTER", 100)
+keepalive = _int("GUNICORN_KEEPALIVE", 5)
+timeout = _int("GUNICORN_TIMEOUT", 30)
+graceful_timeout = _int("GUNICORN_GRACEFUL_TIMEOUT", 30)
+
+bind = os.getenv("GUNICORN_BIND", "0.0.0.0:8000")
+accesslog = os.getenv("GUNICORN_ACCESSLOG") or None
+errorlog = "-"
+
+# Workers inherit these; see app.pool.worker_pool_size() for the pool sizing that reads them
+os.environ["GUNICORN_WORKER_CLASS"] = worker_class
+os.environ["GUNICORN_THREADS"] = str(threads)
+os.environ["GUNICORN_WORKER_CONNECTIONS"] = str(worker_connections)
+
+# Per-worker metric files, aggregated by /metrics (see app.metrics). Must be set
+# before the workers import prometheus_client.
+os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", os.path.join(tempfile.gettempdir(), "intellidollar-metrics"))
+
+
+def on_starting(server):
+    # Files left by a previous run would be summed into this one's counters
+    path = os.environ["PROMETHEUS_MULTIPROC_DIR"]
+    shutil.rmtree(path, ignore_errors=True)
+    os.makedirs(path, exist_ok=True)
+
+
+def child_exit(server, worker):
+    # Drop the dead worker's live gauges (pool connections); its counters are kept
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
@@ -0,0 +1,72 @@
+import pytest
+from sqlalchemy import create_engine, event, select
+from app import create_app
+from app.cache import dashboard_cache, user_cache
+from app.migrations import upgrade
+from app.models import Category
+from app.templating import fragment_cache
+
+PASSWORD = "secret1"
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    url = f"sqlite:///{tmp_path / 'test.db'}"
+    monkeypatch.setenv("DATABASE_URL", url)
+    monkeypatch.setenv("JINJA_CACHE_DIR", str(tmp_path / "jinja"))
+    monkeypatch.delenv("DATABASE_REPLICA_URLS", raising=False)
+    monkeypatch.delenv("DATABASE_SHARD_URLS", raising=False)
+    engine = create_engine(url)
+    upgrade(engine, log=lambda *a: None)
+    engine.dispose()
+    for cache in (dashboard_cache, user_cache, fragment_cache):
+        cache.clear()
+
+    app = create_app()
+    app.config.update(TESTING=True, WTF_CSRF_ENABLED=False)
+    yield app
+    app.engine.dispose()
+
+
+@pytest.fixture
+def client(app):
+    """Test client logged in as a freshly registered user."""
+    client = app.test_client()
+    client.post("/register", data={"email": "user@example.com", "password": PASSWORD, "confirm": PASSWORD})
+    client.post("/login", data={"email": "user@example.com", "password": PASSWORD})
+    return client
+
+
+@pytest.fixture
+def other_client(app, client):
+    """A second client logged in as the same user: its own session and CSRF token."""
+    other = app.test_client()
+    other.post("/login", data={"email": "user@example.com", "password": PASSWORD})
+    return other
+
+
+@pytest.fixture
+def category_id(app, client):
+    """Id of the logged-in user's default category."""
+    with app.app_context():
+        return app.db_session.scalar(select(Category.id).where(Category.user_id == 1))
+
+
+@pytest.fixture
+def statements(app):
+    """Every SQL statement (text, parameters) the app's engine runs during the test."""
+    seen = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        seen.append((statement, parameters))
+
+    event.listen(app.engine, "before_cursor_execute", record)
+    yield seen
+    event.remove(app.engine, "before_cursor_execute", record)
+
+
+@pytest.fixture
+def api_headers(client):
+    """Bearer-token headers for the logged-in user, for /api/v1 calls."""
+    resp = client.post("/api/v1/auth/token", json={"email": "user@example.com", "password": PASSWORD})
+    return {"Authorization": f"Bearer {resp.json['token']}"}
@@ -0,0 +1,37 @@
+import pytest
+from app.api import MAX_PAGE_SIZE
+
+
+@pytest.fixture(autouse=True)
+def three_transactions(client, category_id):
+    for day in range(1, 4):
+        client.post("/transactions", data={
+            "category_id": category_id, "amount": "1.00", "date": f"2025-06-0{day}",
+            "description": "", "type": "expense",
+        })
+
+
+@pytest.mark.parametrize("limit, rows, has_next", [
+    ("-1", 1, True),
+    ("-5", 1, True),
+    ("0", 3, False),
+    ("2", 2, True),
+    (str(MAX_PAGE_SIZE + 1), 3, False),
+])
+def test_transactions_limit_is_clamped(client, api_headers, limit, rows, has_next):
+    resp = client.get(f"/api/v1/transactions?limit={limit}", headers=api_headers)
+
+    assert resp.status_code == 200
+    assert len(resp.json["transactions"]) == rows
+    assert (resp.json["next"] is not None) == has_next
+
+
+def test_transactions_pages_by_one_cover_every_row(client, api_headers):
+    dates, after = [], ""
+    while True:
+        page = client.get(f"/api/v1/transactions?limit=-1{after}", headers=api_headers).json
+        dates += [t["date"] for t in page["transactions"]]
+        if not page["next"]:
+            break
+        after = f"&after={page['next']}"
+    assert dates == ["2025-06-03", "2025-06-02", "2025-06-01"]
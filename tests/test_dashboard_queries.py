@@ -0,0 +1,73 @@
+from decimal import Decimal
+from app.budgeting import budgets_for_month
+from app.cache import dashboard_cache
+from app.dashboard import dashboard_summary
+from app.models import Budget, Category
+from app.utils import current_month_str
+
+
+def _add_transaction(client, category_id, amount, type_="expense"):
+    client.post("/transactions", data={
+        "category_id": category_id, "amount": amount, "date": f"{current_month_str()}-01", "description": "",
+        "type": type_,
+    })
+
+
+def test_dashboard_summary_is_two_statements(app, client, category_id, statements):
+    _add_transaction(client, category_id, "12.50")
+    statements.clear()
+
+    with app.app_context():
+        data = dashboard_summary(app.db_session, 1, current_month_str())
+
+    # 1. categories with their effective budget and month totals, 2. recent transactions
+    assert len(statements) == 2, [s for s, _ in statements]
+    summary, recent = (s for s, _ in statements)
+    assert "FROM categories" in summary and "budgets" in summary and "monthly_category_totals" in summary
+    assert "FROM transactions" in recent
+    assert len(data["txns"]) == 1
+
+
+def test_dashboard_budgets_match_the_budgeting_engine(app, client):
+    # One category per precedence case; "2025-06" is the month shown
+    budgets = {
+        "dated beats undated": [("one_time", None, "5"), ("one_time", "2025-06", "10")],
+        "one-time beats monthly": [("monthly", "2025-01", "20"), ("one_time", "2025-06", "30")],
+        "undated beats monthly": [("monthly", "2025-01", "20"), ("one_time", "", "40")],
+        "latest monthly start": [("monthly", None, "1"), ("monthly", "2025-03", "50"), ("monthly", "2025-07", "60")],
+        "monthly not started": [("monthly", "2025-07", "70")],
+        "other month only": [("one_time", "2025-05", "80")],
+    }
+    with app.app_context():
+        db = app.db_session
+        for name, rows in budgets.items():
+            cat = Category(user_id=1, name=name)
+            db.add(cat)
+            db.flush()
+            db.add_all(Budget(user_id=1, category_id=cat.id, recurrence=r, month=m, amount=a) for r, m, a in rows)
+        db.commit()
+
+        expected = budgets_for_month(db, 1, "2025-06")
+        cards = dashboard_summary(db, 1, "2025-06")["cards"]
+
+    assert {c["category_id"]: Decimal(c["amount"]) for c in cards} == expected
+    assert sorted(expected.values()) == [Decimal(v) for v in ("10", "30", "40", "50")]
+
+
+def test_dashboard_statement_count_on_cache_miss_and_hit(client, category_id, statements):
+    _add_transaction(client, category_id, "12.50")
+    _add_transaction(client, category_id, "100", "income")
+    client.get("/dashboard")  # warm the login identity and shard route caches
+
+    dashboard_cache.clear()
+    statements.clear()
+    resp = client.get("/dashboard")
+    assert resp.status_code == 200
+    # data_version for the cache key, then the two summary statements
+    assert len(statements) == 3, [s for s, _ in statements]
+
+    statements.clear()
+    resp = client.get("/dashboard")
+    assert resp.status_code == 200
+    assert len(statements) == 1, [s for s, _ in statements]
+    assert "users.data_version" in statements[0][0]
@@ -0,0 +1,39 @@
+import re
+from itsdangerous import URLSafeTimedSerializer
+from app.cache import bump_data_version, get_data_version
+from app.templating import fragment_cache
+
+CSRF_VALUE = re.compile(r'name="csrf_token" value="([^"]+)"')
+
+
+def _page_token(app, client, url):
+    """The CSRF token a page's forms carry, and whether it belongs to client's session."""
+    (token,) = set(CSRF_VALUE.findall(client.get(url).get_data(as_text=True)))
+    with client.session_transaction() as session:
+        raw = session["csrf_token"]
+    signer = URLSafeTimedSerializer(app.secret_key, salt="wtf-csrf-token")
+    return token, signer.loads(token) == raw
+
+
+def test_cached_fragments_carry_the_current_sessions_csrf_token(app, client, other_client):
+    first, first_valid = _page_token(app, client, "/categories")
+    hits = fragment_cache.hits
+    second, second_valid = _page_token(app, other_client, "/categories")
+
+    assert fragment_cache.hits > hits  # same user and data version: served from the cache
+    assert first != second
+    assert first_valid and second_valid
+    assert not any(first in html or second in html for html, _ in fragment_cache._data.values())
+
+
+def test_data_version_is_read_once_per_request(app, client, statements):
+    with app.test_request_context():
+        db = app.db_session
+        statements.clear()
+        assert get_data_version(db, 1) == get_data_version(db, 1)  # view cache, then fragment scope
+        assert len(statements) == 1
+
+        version = get_data_version(db, 1)
+        bump_data_version(db, 1)
+        assert get_data_version(db, 1) == version + 1
+        db.rollback()
@@ -0,0 +1,55 @@
+import io
+import json
+from sqlalchemy import select
+from app.models import Transaction
+
+
+def _upload(client, category_id, data: bytes, **extra):
+    return client.post("/transactions/import", data={
+        "file": (io.BytesIO(data), "export.csv"),
+        "format": "auto",
+        "default_category_id": category_id,
+        **extra,
+    }, content_type="multipart/form-data")
+
+
+def test_import_windows_1252_export(app, client, category_id):
+    data = "Date,Amount,Description\n2025-06-01,-4.50,Café\n2025-06-02,-3.00,Bäckerei\n".encode("cp1252")
+
+    resp = _upload(client, category_id, data)
+
+    assert resp.status_code == 302
+    with app.app_context():
+        descriptions = app.db_session.scalars(select(Transaction.description).order_by(Transaction.date)).all()
+    assert descriptions == ["Café", "Bäckerei"]
+
+
+def test_import_unreadable_csv_is_reported_with_its_row(client, category_id):
+    data = b"Date,Amount,Description\n2025-06-01,-4.50,ok\n2025-06-02,-3.00," + b"x" * 200_000 + b"\n"
+
+    resp = _upload(client, category_id, data)
+
+    assert resp.status_code == 200
+    assert b"Unreadable CSV at row 3" in resp.data
+
+
+def test_import_streams_progress_as_ndjson(client, category_id):
+    data = b"Date,Amount,Description\n2025-06-01,-4.50,a\n2025-06-02,-3.00,b\nnot a date,1,c\n"
+
+    resp = client.post("/transactions/import", data={
+        "file": (io.BytesIO(data), "export.csv"),
+        "format": "auto",
+        "default_category_id": category_id,
+    }, content_type="multipart/form-data", headers={"Accept": "application/x-ndjson"})
+
+    assert resp.mimetype == "application/x-ndjson"
+    lines = [json.loads(line) for line in resp.get_data(as_text=True).splitlines()]
+    assert [line.get("done", False) for line in lines] == [False, True]
+    assert {k: lines[-1][k] for k in ("rows", "inserted", "duplicates", "invalid")} == {
+        "rows": 3, "inserted": 2, "duplicates": 0, "invalid": 1,
+    }
+
+    resp = client.post("/transactions/import", data={"default_category_id": category_id},
+                       headers={"Accept": "application/x-ndjson"})
+    assert resp.status_code == 400
+    assert "error" in json.loads(resp.get_data(as_text=True))
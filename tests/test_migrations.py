@@ -0,0 +1,37 @@
+from sqlalchemy import create_engine, inspect
+from app.migrations import HEAD, current_version, upgrade
+from app.models import Base
+
+
+def _schema(engine) -> dict:
+    """Tables with their columns, indexes, unique constraints and foreign keys, comparably."""
+    insp = inspect(engine)
+    return {
+        table: {
+            "columns": {(c["name"], str(c["type"]), c["nullable"]) for c in insp.get_columns(table)},
+            "indexes": {(ix["name"], tuple(ix["column_names"]), bool(ix["unique"])) for ix in insp.get_indexes(table)},
+            "unique": {tuple(uc["column_names"]) for uc in insp.get_unique_constraints(table)},
+            "foreign_keys": {
+                (tuple(fk["constrained_columns"]), fk["referred_table"], tuple(fk["referred_columns"]))
+                for fk in insp.get_foreign_keys(table)
+            },
+        }
+        for table in insp.get_table_names()
+    }
+
+
+def test_migrations_build_the_models_schema(tmp_path):
+    migrated = create_engine(f"sqlite:///{tmp_path / 'migrated.db'}")
+    modelled = create_engine(f"sqlite:///{tmp_path / 'modelled.db'}")
+    try:
+        assert upgrade(migrated, log=lambda *a: None) == HEAD
+        Base.metadata.create_all(modelled)
+
+        # A model change without a migration step (or the reverse) shows up here
+        assert _schema(migrated) == _schema(modelled)
+        assert upgrade(migrated, log=lambda *a: None) == 0
+        with migrated.connect() as conn:
+            assert current_version(conn) == HEAD
+    finally:
+        migrated.dispose()
+        modelled.dispose()
@@ -0,0 +1,44 @@
+import pytest
+from sqlalchemy import select, and_
+from app.models import Transaction
+from app.utils import in_month
+
+
+def _plan(app, statement, parameters):
+    with app.engine.connect() as conn:
+        rows = conn.exec_driver_sql("EXPLAIN QUERY PLAN " + statement, parameters).fetchall()
+    return " | ".join(row[-1] for row in rows)
+
+
+def test_category_transactions_month_is_an_index_range_scan(app, client, category_id, statements):
+    client.post("/transactions", data={
+        "category_id": category_id, "amount": "12.50", "date": "2025-03-14", "description": "", "type": "expense",
+    })
+    statements.clear()
+
+    resp = client.get(f"/categories/{category_id}/transactions?month=2025-03")
+
+    assert resp.status_code == 200
+    assert "12.50" in resp.get_data(as_text=True)
+    month_query = [(s, p) for s, p in statements if "FROM transactions" in s and "transactions.date >=" in s]
+    assert len(month_query) == 1
+    plan = _plan(app, *month_query[0])
+    # The bare column lets SQLite seek (user_id, category_id) and range-scan the date
+    assert "USING INDEX ix_transactions_user_cat_date (user_id=? AND category_id=? AND date>? AND date<?)" in plan
+    assert "SCAN transactions" not in plan
+
+
+def test_user_month_range_uses_user_date_index(app):
+    stmt = select(Transaction.id).where(and_(Transaction.user_id == 1, in_month(Transaction.date, "2025-03")))
+    compiled = stmt.compile(dialect=app.engine.dialect)
+    params = tuple(str(compiled.params[k]) for k in compiled.positiontup)
+
+    plan = _plan(app, str(compiled), params)
+
+    assert "INDEX ix_transactions_user_date (user_id=? AND date>? AND date<?)" in plan
+
+
+@pytest.mark.parametrize("month", ["abc", "2025", "2025-13", "2025-00"])
+def test_category_transactions_bad_month_falls_back(client, category_id, month):
+    resp = client.get(f"/categories/{category_id}/transactions?month={month}")
+    assert resp.status_code == 200
@@ -0,0 +1,21 @@
+from sqlalchemy import update
+from app.models import MonthlyCategoryTotal
+from app.rollups import rollups_cli
+from app.utils import current_month_str
+
+
+def test_rebuild_invalidates_cached_dashboards(app, client, category_id):
+    client.post("/transactions", data={
+        "category_id": category_id, "amount": "12.50", "date": f"{current_month_str()}-01",
+        "description": "", "type": "expense",
+    })
+    with app.app_context():
+        # Drift the rollup, then let the dashboard cache the wrong total
+        app.db_session.execute(update(MonthlyCategoryTotal).values(total=99))
+        app.db_session.commit()
+    assert b"Expenses: $99.00" in client.get("/dashboard").data
+
+    result = app.test_cli_runner().invoke(rollups_cli, ["rebuild"])
+
+    assert result.exit_code == 0, result.output
+    assert b"Expenses: $12.50" in client.get("/dashboard").data